@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apptrace", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="operation",
+            name="cache_hit",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apptrace", "0002_operation_cache_hit"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="operation",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-17 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apptrace", "0003_alter_operation_created_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="operation",
+            name="duration_ms",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="operation",
+            name="bytes_in",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="operation",
+            name="bytes_out",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="operation",
+            name="page_count",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="operation",
+            name="stages",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apptrace", "0004_operation_timing"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="operation",
+            name="bytes_saved",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 16:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apptrace", "0005_operation_bytes_saved"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="operation",
+            name="out_hashes",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
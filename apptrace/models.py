@@ -1,13 +1,22 @@
 from django.db import models
+from django.utils import timezone
 
 class Operation(models.Model):
     tool       = models.CharField(max_length=50)  # Increased max_length for tool name
     args       = models.JSONField()               # Arguments used for the tool
     in_hash    = models.CharField(max_length=64, null=True, blank=True) # SHA-256 hash of input file
-    out_hash   = models.CharField(max_length=64, null=True, blank=True) # SHA-256 hash of output file
+    out_hash   = models.CharField(max_length=64, null=True, blank=True) # SHA-256 hash of output file (the first one for multi-output tools)
+    out_hashes = models.JSONField(null=True, blank=True) # SHA-256 of every output, in output order (tools that return several files)
     status     = models.CharField(max_length=20, default="success") # e.g., success, error
     error_message = models.TextField(null=True, blank=True) # Details if an error occurred
-    created_at = models.DateTimeField(auto_now_add=True) # Timestamp of the operation
+    cache_hit  = models.BooleanField(default=False) # True if the output was served from the result cache
+    duration_ms = models.FloatField(null=True, blank=True) # Wall time of the whole run_tool call
+    bytes_in   = models.BigIntegerField(null=True, blank=True) # Total size of the input files
+    bytes_out  = models.BigIntegerField(null=True, blank=True) # Total size of the files written
+    page_count = models.IntegerField(null=True, blank=True) # Pages written (PDF outputs only)
+    bytes_saved = models.BigIntegerField(null=True, blank=True) # Bytes not written thanks to deduplication (merge)
+    stages     = models.JSONField(null=True, blank=True) # Per-stage milliseconds, e.g. {"hash_inputs": 1.2, "tool": 35.0}
+    created_at = models.DateTimeField(default=timezone.now) # Timestamp of the operation (set when it happened, not when the buffered row was inserted)
 
     def __str__(self):
         return f"{self.tool} - {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
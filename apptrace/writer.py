@@ -0,0 +1,285 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections
+from django.utils import timezone
+from .models import Operation
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# Errors that say a row itself is bad (rejected by the DB, or not valid Operation fields): retrying it cannot help.
+_ROW_ERRORS = (IntegrityError, DataError, TypeError, ValueError)
+
+def _to_json(fields: dict, **extra) -> str:
+    row = dict(fields, **extra)
+    row['created_at'] = row['created_at'].isoformat()
+    return json.dumps(row, ensure_ascii=False)
+
+def _from_json(line: str) -> dict:
+    row = json.loads(line)
+    row['created_at'] = datetime.fromisoformat(row['created_at'])
+    return row
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError: # Exists, owned by another user
+        return True
+    return True
+
+class TraceWriter:
+    """
+    Buffers Operation rows and inserts them from a background thread with bulk_create.
+    The request path only does a non-blocking queue put. A batch is written when it reaches
+    flush_size rows or when the oldest row has waited flush_interval seconds.
+    Rows that cannot be inserted (DB down, queue full) are appended to a local JSONL spill file,
+    which is replayed after the next successful insert. When a batch fails, its rows are retried one
+    by one, and a row the database rejects is moved to a quarantine file (JSONL, with the error) so it
+    cannot hold back the rest of its batch or every later replay. close() (run at exit) drains everything.
+    A replay left unfinished by a process that died (its .replaying file) is picked up when a writer starts.
+    """
+    def __init__(self, max_queue: int, flush_size: int, flush_interval: float, spill_path: Path, quarantine_path: Path | None = None):
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.spill_path = Path(spill_path)
+        self.quarantine_path = Path(quarantine_path) if quarantine_path is not None else self.spill_path.with_suffix(".quarantine.jsonl")
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock() # Guards the spill and quarantine files, and _stats
+        self._last_failure = 0.0
+        self._stats = {"queued": 0, "written": 0, "spilled": 0, "replayed": 0, "flushes": 0, "quarantined": 0}
+        self._thread = threading.Thread(target=self._run, name="pdfshell-trace-writer", daemon=True)
+        self._thread.start()
+
+    def stats(self) -> dict:
+        with self._spill_lock:
+            return dict(self._stats, pending=self._queue.qsize())
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._spill_lock:
+            self._stats[counter] += amount
+
+    def submit(self, fields: dict):
+        """Queues one row (Operation field values). Never blocks; spills to disk if the queue is full."""
+        try:
+            self._queue.put_nowait(fields)
+            self._count("queued")
+        except queue.Full:
+            logger.warning("Trace writer: queue full, spilling row to disk.")
+            self._spill([fields])
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Blocks until every row queued so far has been written (or spilled). Returns False on timeout."""
+        if not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float | None = 10.0):
+        """Writes everything still queued and stops the background thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _run(self):
+        self._recover_replays()
+        batch = []
+        deadline = None
+        while True:
+            wait = self.flush_interval if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._write(batch)
+                return
+            if isinstance(item, threading.Event):
+                self._write(batch)
+                batch, deadline = [], None
+                item.set()
+                continue
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+
+            if batch and (len(batch) >= self.flush_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch, deadline = [], None
+            elif not batch and item is None:
+                self._replay_spill() # Idle: retry rows left over from a DB outage
+
+    def _insert(self, rows: list[dict]):
+        close_old_connections() # Drop a connection the DB closed under us
+        Operation.objects.bulk_create([Operation(**row) for row in rows], batch_size=self.flush_size)
+
+    def _write(self, rows: list[dict]):
+        if not rows:
+            return
+        try:
+            self._insert(rows)
+        except Exception as e:
+            logger.error(f"Trace writer: could not insert {len(rows)} rows, retrying them one by one: {e}")
+            failed = self._insert_each(rows, "written")
+            if failed:
+                logger.error(f"Trace writer: spilling {len(failed)} rows to {self.spill_path}.")
+                self._last_failure = time.monotonic()
+                self._spill(failed)
+                return
+        else:
+            self._count("written", len(rows))
+        self._count("flushes")
+        self._replay_spill()
+
+    def _insert_each(self, rows: list[dict], counter: str) -> list[dict]:
+        """
+        Inserts rows one at a time after their batch failed, counting them under counter. Rows the
+        database rejects are quarantined. Returns the rows left to retry later: the first row that
+        failed for any other reason (the DB itself is failing) and every row after it.
+        """
+        for index, row in enumerate(rows):
+            try:
+                self._insert([row])
+            except _ROW_ERRORS as e:
+                self._quarantine(row, e)
+            except Exception:
+                return rows[index:]
+            else:
+                self._count(counter)
+        return []
+
+    def _quarantine(self, row: dict, error: Exception):
+        logger.error(f"Trace writer: row rejected by the database, moving it to {self.quarantine_path}: {error}")
+        with self._spill_lock:
+            try:
+                self.quarantine_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.quarantine_path, "a", encoding="utf-8") as f:
+                    f.write(_to_json(row, quarantine_error=f"{type(error).__name__}: {error}") + "\n")
+                self._stats["quarantined"] += 1
+            except Exception as e:
+                logger.critical(f"Trace writer: could not quarantine a trace row to {self.quarantine_path}: {e}", exc_info=True)
+
+    def _spill(self, rows: list[dict]):
+        with self._spill_lock:
+            try:
+                self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    f.write("".join(_to_json(row) + "\n" for row in rows))
+                self._stats["spilled"] += len(rows)
+            except Exception as e:
+                logger.critical(f"Trace writer: could not spill {len(rows)} trace rows to {self.spill_path}: {e}", exc_info=True)
+
+    def _replay_spill(self):
+        """Re-inserts spilled rows. The file is renamed first, so concurrent processes never replay it twice."""
+        if not self.spill_path.exists() or time.monotonic() - self._last_failure < self.flush_interval:
+            return
+        replaying = self.spill_path.with_name(f"{self.spill_path.name}.{os.getpid()}.replaying")
+        with self._spill_lock:
+            try:
+                os.replace(self.spill_path, replaying)
+            except FileNotFoundError:
+                return
+        self._replay_file(replaying)
+
+    def _recover_replays(self):
+        """
+        Replays the .replaying files of processes that died mid-replay; their rows are in no other file.
+        Files named after a running process other than this one are still being replayed and are left alone.
+        Each file is claimed by a rename first, so two writers starting together never replay it twice.
+        """
+        prefix = f"{self.spill_path.name}."
+        for leftover in sorted(self.spill_path.parent.glob(f"{prefix}*.replaying")):
+            owner = leftover.name[len(prefix):].split(".", 1)[0]
+            if not owner.isdigit() or (int(owner) != os.getpid() and _is_running(int(owner))):
+                continue
+            claimed = self.spill_path.with_name(f"{prefix}{os.getpid()}.from-{owner}.replaying")
+            try:
+                os.replace(leftover, claimed)
+            except FileNotFoundError: # Claimed by another writer
+                continue
+            logger.warning(f"Trace writer: replaying {leftover.name}, left over from process {owner}.")
+            self._replay_file(claimed)
+
+    def _replay_file(self, replaying: Path):
+        try:
+            with open(replaying, encoding="utf-8") as f:
+                rows = [_from_json(line) for line in f if line.strip()]
+        except (OSError, ValueError) as e:
+            logger.critical(f"Trace writer: unreadable spill file {replaying}, leaving it in place: {e}")
+            return
+        try:
+            self._insert(rows)
+        except Exception as e:
+            logger.error(f"Trace writer: replay of {len(rows)} spilled rows failed, retrying them one by one: {e}")
+            failed = self._insert_each(rows, "replayed")
+            if failed:
+                logger.error(f"Trace writer: keeping {len(failed)} spilled rows for a later replay.")
+                self._last_failure = time.monotonic()
+                self._spill(failed)
+        else:
+            self._count("replayed", len(rows))
+            logger.info(f"Trace writer: replayed {len(rows)} spilled trace rows.")
+        replaying.unlink(missing_ok=True)
+
+_writer: TraceWriter | None = None
+_writer_pid: int | None = None
+_writer_lock = threading.Lock()
+
+def get_writer() -> TraceWriter:
+    """Returns this process's writer, starting it on first use (and again after a fork)."""
+    global _writer, _writer_pid
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            _writer = TraceWriter(
+                max_queue=getattr(settings, 'PDF_TRACE_QUEUE_SIZE', 10000),
+                flush_size=getattr(settings, 'PDF_TRACE_FLUSH_SIZE', 200),
+                flush_interval=getattr(settings, 'PDF_TRACE_FLUSH_INTERVAL_SECONDS', 1.0),
+                spill_path=getattr(settings, 'PDF_TRACE_SPILL_PATH', settings.BASE_DIR / "cache" / "trace_spill.jsonl"),
+                quarantine_path=getattr(settings, 'PDF_TRACE_QUARANTINE_PATH', settings.BASE_DIR / "cache" / "trace_quarantine.jsonl"),
+            )
+            _writer_pid = os.getpid()
+        return _writer
+
+def _is_buffered() -> bool:
+    return getattr(settings, 'PDF_TRACE_BUFFERED', True)
+
+def record(**fields):
+    """Records one Operation. Buffered by default; with PDF_TRACE_BUFFERED = False it is inserted right away."""
+    fields.setdefault('created_at', timezone.now())
+    if _is_buffered():
+        get_writer().submit(fields)
+    else:
+        Operation.objects.create(**fields)
+
+def record_many(rows: list[dict]):
+    """Records several Operations at once (e.g. the rows of a batch)."""
+    for row in rows:
+        row.setdefault('created_at', timezone.now())
+    if _is_buffered():
+        writer = get_writer()
+        for row in rows:
+            writer.submit(row)
+    else:
+        Operation.objects.bulk_create([Operation(**row) for row in rows])
+
+def flush(timeout: float | None = None) -> bool:
+    """Waits until the buffered rows are in the database (or spilled). No-op when nothing was buffered."""
+    return _writer.flush(timeout) if _writer is not None and _writer_pid == os.getpid() else True
+
+@atexit.register
+def _close_on_exit():
+    if _writer is not None and _writer_pid == os.getpid():
+        _writer.close()
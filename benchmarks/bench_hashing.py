@@ -0,0 +1,79 @@
+"""
+Micro-benchmark: legacy 4 KB hash_file loop vs. the current hashing engine.
+
+Usage (from the project root):
+    python -m benchmarks.bench_hashing [--sizes 1,8,32] [--files 8] [--repeat 3]
+
+Runs without Django settings, so the persistent digest cache is disabled and every
+measurement reflects raw hashing throughput.
+"""
+import os
+import time
+import argparse
+import hashlib
+import tempfile
+from pathlib import Path
+
+from core.secure import hash_file, hash_files, fast_digest_algorithm
+
+def legacy_hash_file(path: str) -> str:
+    """The original implementation: 4 KB reads, one file at a time."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(4096)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _throughput(num_bytes: int, seconds: float) -> str:
+    return f"{num_bytes / seconds / (1024 * 1024):8.1f} MB/s"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="0.0625,1,8,32", help="Comma separated file sizes in MB.")
+    parser.add_argument("--files", type=int, default=8, help="Number of files per multi-file round (like a merge).")
+    parser.add_argument("--repeat", type=int, default=3, help="Best-of-N timing.")
+    opts = parser.parse_args()
+
+    sizes_mb = [float(s) for s in opts.sizes.split(",")]
+    fast_algorithm = fast_digest_algorithm()
+
+    with tempfile.TemporaryDirectory(prefix="pdfshell-bench-") as tmp:
+        print(f"{'size':>9} | {'legacy 4KB':>12} | {'hash_file':>12} | {fast_algorithm:>12} | {'legacy x' + str(opts.files):>12} | {'hash_files x' + str(opts.files):>14}")
+        print("-" * 88)
+        for size_mb in sizes_mb:
+            num_bytes = int(size_mb * 1024 * 1024)
+            paths = []
+            for i in range(opts.files):
+                p = Path(tmp) / f"input_{size_mb}_{i}.bin"
+                p.write_bytes(os.urandom(num_bytes))
+                paths.append(str(p))
+
+            assert legacy_hash_file(paths[0]) == hash_file(paths[0])
+
+            t_legacy = _best_of(opts.repeat, lambda: legacy_hash_file(paths[0]))
+            t_new = _best_of(opts.repeat, lambda: hash_file(paths[0]))
+            t_fast = _best_of(opts.repeat, lambda: hash_file(paths[0], algorithm=fast_algorithm))
+            t_legacy_multi = _best_of(opts.repeat, lambda: [legacy_hash_file(p) for p in paths])
+            t_new_multi = _best_of(opts.repeat, lambda: hash_files(paths))
+
+            total = num_bytes * opts.files
+            print(
+                f"{size_mb:>7g}MB | {_throughput(num_bytes, t_legacy):>12} | {_throughput(num_bytes, t_new):>12} | "
+                f"{_throughput(num_bytes, t_fast):>12} | {_throughput(total, t_legacy_multi):>12} | {_throughput(total, t_new_multi):>14}"
+            )
+            for p in paths:
+                os.remove(p)
+
+if __name__ == "__main__":
+    main()
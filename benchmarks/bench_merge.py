@@ -0,0 +1,78 @@
+"""
+Benchmark: merge wall-clock time with 1..N input-parsing processes.
+
+Usage (from the project root):
+    python -m benchmarks.bench_merge [--files 100] [--pages 10] [--max-workers 8] [--repeat 3]
+
+Generates --files text PDFs of --pages pages each, then merges them with both the default
+in-memory path (tools.merge.transform, pypdf's PdfWriter) and tools.merge.run_streaming, using
+1, 2, 4, ... up to --max-workers parse workers. Runs without Django settings.
+"""
+import os
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+from reportlab.pdfgen import canvas
+
+from core.sink import OutputSinks
+from tools import merge
+
+def _make_inputs(directory: Path, files: int, pages: int) -> list[str]:
+    paths = []
+    for i in range(files):
+        path = directory / f"input_{i:03d}.pdf"
+        c = canvas.Canvas(str(path), pagesize=(595, 842))
+        for page in range(pages):
+            for line in range(40):
+                c.drawString(40, 800 - line * 19, f"Document {i} page {page + 1} line {line + 1}: lorem ipsum dolor sit amet")
+            c.showPage()
+        c.save()
+        paths.append(str(path))
+    return paths
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _worker_counts(max_workers: int) -> list[int]:
+    counts, n = [], 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    return counts + [max_workers]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100, help="Number of input PDFs.")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per input PDF.")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1, help="Largest number of parse workers.")
+    parser.add_argument("--repeat", type=int, default=3, help="Best-of-N timing.")
+    opts = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pdfshell-bench-") as tmp:
+        tmp = Path(tmp)
+        paths = _make_inputs(tmp, opts.files, opts.pages)
+        total_mb = sum(os.path.getsize(p) for p in paths) / (1024 * 1024)
+        print(f"{opts.files} files x {opts.pages} pages ({total_mb:.1f} MB), {os.cpu_count()} CPUs")
+        print(f"{'mode':>22} | {'seconds':>8} | {'speedup':>7}")
+        print("-" * 44)
+
+        for label, merge_with in (
+            ("in-memory", lambda args, workers: merge.transform(args, workers=workers).write(args["output"])),
+            ("streaming", lambda args, workers: merge.run_streaming(args, OutputSinks(), workers=workers)),
+        ):
+            baseline = None
+            for workers in _worker_counts(opts.max_workers):
+                args = {"files": paths, "output": str(tmp / f"{label}_{workers}.pdf"), "dedup": True}
+                seconds = _best_of(opts.repeat, lambda: merge_with(args, workers))
+                baseline = baseline or seconds
+                print(f"{f'{label}, {workers} workers':>22} | {seconds:8.3f} | {baseline / seconds:6.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark: add_stamp on every page (page=0), one overlay per page vs. the shared stamp form.
+
+Usage (from the project root):
+    python -m benchmarks.bench_stamp [--pages 10,100,500] [--repeat 3]
+
+For each page count, generates a document of that many A4 pages and stamps all of them:
+  - "per page": the original behavior, rendering the ReportLab canvas, re-decoding the image,
+    re-parsing the overlay PDF and merging it into the page content for every page;
+  - "shared": tools.add_stamp.transform, which renders the stamp once, embeds it as one Form
+    XObject and only adds references to each page (the in-process stamp cache is cleared before
+    each run, so this includes one render).
+Output sizes are shown too: the per-page overlays embed the image once per page.
+A second table stamps only the last page, rewriting the whole document vs. an incremental update
+(incremental=True), with the bytes each one produces beyond the original file.
+Runs without Django settings.
+"""
+import os
+import time
+import argparse
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+from pypdf import PageObject, PdfReader, PdfWriter
+from reportlab.pdfgen import canvas
+
+from tools import add_stamp
+
+def _make_document(path: Path, pages: int):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=595, height=842)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+def legacy_overlay(stamp_path: str, width: float, height: float) -> PageObject:
+    """The original overlay: a page-sized canvas with the stamp drawn bottom-right, parsed back with PdfReader."""
+    packet = BytesIO()
+    c = canvas.Canvas(packet, pagesize=(width, height))
+    c.drawImage(stamp_path, width - 150 - 20, 20, width=150, height=75, mask='auto')
+    c.save()
+    packet.seek(0)
+    return PdfReader(packet).pages[0]
+
+def per_page_overlays(args: dict) -> PdfWriter:
+    """The original all-pages loop: a fresh overlay for every page, merged into its content."""
+    reader = PdfReader(args['file'])
+    writer = PdfWriter()
+    for page in reader.pages:
+        page.merge_page(legacy_overlay(args['stamp_path'], float(page.mediabox.width), float(page.mediabox.height)))
+        writer.add_page(page)
+    return writer
+
+def shared_stamp(args: dict) -> PdfWriter:
+    add_stamp._stamp_cache.clear()
+    return add_stamp.transform(args)
+
+def _written_size(writer: PdfWriter) -> int:
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.tell()
+
+def _run_to(args: dict, output: Path) -> int:
+    add_stamp.run(dict(args, output=str(output)))
+    return output.stat().st_size
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="10,100,500", help="Comma-separated page counts.")
+    parser.add_argument("--repeat", type=int, default=3, help="Best-of-N timing.")
+    opts = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pdfshell-bench-") as tmp:
+        tmp = Path(tmp)
+        stamp = tmp / "stamp.png"
+        Image.frombytes("RGB", (300, 150), os.urandom(300 * 150 * 3)).save(stamp) # Noise: does not compress
+
+        print(f"{'pages':>6} | {'per page':>9} | {'shared':>9} | {'speedup':>7} | {'per page size':>13} | {'shared size':>11}")
+        print("-" * 72)
+        for pages in (int(p) for p in opts.pages.split(",")):
+            document = tmp / f"doc_{pages}.pdf"
+            _make_document(document, pages)
+            args = {"file": str(document), "stamp_path": str(stamp), "page": 0, "pos": "br", "scale": 1.0}
+            t_per_page = _best_of(opts.repeat, lambda: per_page_overlays(args))
+            t_shared = _best_of(opts.repeat, lambda: shared_stamp(args))
+            size_per_page = _written_size(per_page_overlays(args)) / (1024 * 1024)
+            size_shared = _written_size(shared_stamp(args)) / (1024 * 1024)
+            print(f"{pages:>6} | {t_per_page:8.3f}s | {t_shared:8.3f}s | {t_per_page / t_shared:6.1f}x | {size_per_page:10.2f} MB | {size_shared:8.2f} MB")
+
+        print()
+        print(f"{'pages':>6} | {'rewrite':>9} | {'incremental':>11} | {'rewrite +bytes':>14} | {'incr. +bytes':>12}")
+        print("-" * 66)
+        for pages in (int(p) for p in opts.pages.split(",")):
+            document = tmp / f"doc_{pages}.pdf"
+            args = {"file": str(document), "stamp_path": str(stamp), "page": -1, "pos": "br", "scale": 1.0}
+            t_rewrite = _best_of(opts.repeat, lambda: _run_to(args, tmp / "rewrite.pdf"))
+            t_incremental = _best_of(opts.repeat, lambda: _run_to(dict(args, incremental=True), tmp / "incremental.pdf"))
+            base = document.stat().st_size
+            grown_rewrite = _run_to(args, tmp / "rewrite.pdf") - base
+            grown_incremental = _run_to(dict(args, incremental=True), tmp / "incremental.pdf") - base
+            print(f"{pages:>6} | {t_rewrite:8.3f}s | {t_incremental:10.3f}s | {grown_rewrite:14,d} | {grown_incremental:12,d}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,29 @@
 import click
-from core.engine import run_tool
+from core.engine import run_tool, run_pipeline
 from tools.loader import load_tools # Added for dynamic command loading
+from tools.registry import get_tool
 import os # For history command
 import django # For history command
 from typing import Union, get_args, List, Optional, Any, get_origin # Ensure this is present
 import sys # Added for debug prints
+import json # For pipeline steps
+from pathlib import Path
+from pydantic import BaseModel
+
+class JsonObjectParamType(click.ParamType):
+    """Option value given as a JSON object, for schema fields that are models (e.g. add_stamp --stamps '{"stamp_path": "a.png", "pages": "1-3"}')."""
+    name = "json"
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, dict):
+            return value
+        try:
+            parsed = json.loads(value)
+        except json.JSONDecodeError as e:
+            self.fail(f"不是有效的 JSON: {e}", param, ctx)
+        if not isinstance(parsed, dict):
+            self.fail("必須是 JSON 物件。", param, ctx)
+        return parsed
 
 # Helper function to convert YAML type to Click type
 # This function might need adjustment if types are now actual Python types from Pydantic
@@ -18,6 +37,8 @@ def get_click_type(type_obj):
         return float
     elif type_obj == bool:
         return bool
+    elif isinstance(type_obj, type) and issubclass(type_obj, BaseModel):
+        return JsonObjectParamType()
     if hasattr(type_obj, '__origin__') and hasattr(type_obj, '__args__'): # Checks for generic types like List[str]
         if type_obj.__origin__ == list and type_obj.__args__:
             return get_click_type(type_obj.__args__[0]) # Recursive call for inner type
@@ -56,7 +77,7 @@ for tool_spec in tool_specs:
         for param_name, field_info in reversed(list(pydantic_model.model_fields.items())):
             original_help = field_info.description
             
-            known_path_keys = ['file', 'files', 'stamp_path', 'output', 'output_dir']
+            known_path_keys = get_tool(tool_spec.name).path_keys
             param_help = original_help
             if param_name in known_path_keys:
                 warning_text = " (此路徑相對於預設的 'files/' 目錄。請勿嘗試存取 'uploads/' 或其他系統目錄)"
@@ -81,6 +102,7 @@ for tool_spec in tool_specs:
                     non_none_args = [arg for arg in param_type_annotation.__args__ if type(None) not in get_args(arg) and arg is not type(None)]
                     if non_none_args:
                         actual_click_type = get_click_type(non_none_args[0])
+                        is_multiple = get_origin(non_none_args[0]) == list # Optional[List[...]]
             else:
                 actual_click_type = get_click_type(param_type_annotation)
 
@@ -144,6 +166,24 @@ for tool_spec in tool_specs:
     cli.add_command(cmd)
 
 
+@cli.command("pipeline")
+@click.argument('steps')
+def pipeline_cmd(steps):
+    """依序執行多個工具，只寫出最後一步的結果。
+
+    STEPS 為 JSON 字串或 .json 檔案路徑，例如:
+    '[{"tool": "merge", "args": {"files": ["a.pdf", "b.pdf"]}}, {"tool": "split", "args": {"pages": "1-3"}}]'
+    """
+    try:
+        steps_text = Path(steps).read_text(encoding="utf-8") if steps.endswith(".json") else steps
+        steps_list = json.loads(steps_text)
+        if isinstance(steps_list, dict):
+            steps_list = steps_list.get("steps")
+        result = run_pipeline(steps_list)
+        click.echo(f"已成功執行 pipeline ({len(steps_list)} 個步驟). 結果: {result}")
+    except Exception as e:
+        click.echo(f"執行 pipeline 時發生錯誤 ({type(e).__name__}): {e}", err=True)
+
 # The manually defined history command remains as is for now,
 # as it's not loaded from a YAML tool spec.
 @cli.command("history")
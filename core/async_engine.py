@@ -0,0 +1,114 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .engine import run_tool
+from . import sandbox
+from .worker import pool_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOOL_CONCURRENCY = 4
+
+@dataclass(frozen=True)
+class ToolTiming:
+    """How long a call waited for its tool's concurrency slot, and how long the tool then took."""
+    queue_wait_ms: float
+    exec_ms: float
+
+# The per-tool limits are process-wide. Sync WSGI workers (gunicorn, see the Dockerfile) run each async
+# view on an event loop of its own, so an asyncio.Semaphore would only limit calls sharing one loop.
+_semaphores: dict[tuple[str, int], threading.BoundedSemaphore] = {}
+_semaphores_lock = threading.Lock()
+# Waiting for a slot blocks a thread: waiters get a pool of their own, so they can never hold the
+# default executor threads that the running calls need (sync_to_async below).
+_slot_waiters = ThreadPoolExecutor(max_workers=32, thread_name_prefix="pdfshell-tool-slot")
+_process_pool: ProcessPoolExecutor | None = None
+_process_pool_lock = threading.Lock()
+
+def _tool_limit(tool_name: str) -> int:
+    limits = getattr(settings, 'PDF_TOOL_CONCURRENCY', {})
+    return max(1, int(limits.get(tool_name, limits.get('default', DEFAULT_TOOL_CONCURRENCY))))
+
+def _semaphore(tool_name: str) -> threading.BoundedSemaphore:
+    limit = _tool_limit(tool_name)
+    with _semaphores_lock:
+        return _semaphores.setdefault((tool_name, limit), threading.BoundedSemaphore(limit))
+
+async def _acquire(semaphore: threading.BoundedSemaphore):
+    """Waits for a slot without blocking the event loop. A caller cancelled while waiting hands the slot back once it gets it."""
+    if semaphore.acquire(blocking=False):
+        return
+    waiting = asyncio.get_running_loop().run_in_executor(_slot_waiters, semaphore.acquire)
+    try:
+        await asyncio.shield(waiting)
+    except asyncio.CancelledError:
+        waiting.add_done_callback(lambda _: semaphore.release())
+        raise
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            workers = getattr(settings, 'PDF_ASYNC_PROCESS_WORKERS', os.cpu_count() or 1)
+            _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+        return _process_pool
+
+def _reset_process_pool():
+    """Drops a pool whose worker died, so the next call starts a fresh one."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+
+def _tool_executor(tool_name: str):
+    """
+    pypdf/reportlab tools are pure-Python CPU work and go to the process pool; tools configured
+    as 'thread' in PDF_TOOL_EXECUTOR (redact: Docling releases the GIL in native code) run in the
+    worker thread itself. With PDF_SANDBOX_ENABLED every tool runs in the sandbox pool instead.
+    """
+    if sandbox.is_enabled():
+        return sandbox.executor_for(tool_name)
+    kind = getattr(settings, 'PDF_TOOL_EXECUTOR', {}).get(tool_name, 'process')
+    return None if kind == 'thread' else _get_process_pool()
+
+async def arun_tool_timed(tool_name: str, original_args: dict, session_id: str | None = None, use_cache: bool = True):
+    """
+    Async counterpart of core.engine.run_tool. Returns (output, ToolTiming).
+    At most PDF_TOOL_CONCURRENCY[tool_name] calls of a tool run at once in this process, whichever
+    event loop they come from; further calls wait without blocking their loop. Path handling, tracing and the DB run in a thread, the tool itself
+    in the process pool (see _tool_executor). Errors are those of run_tool.
+    """
+    queued_at = time.perf_counter()
+    semaphore = _semaphore(tool_name)
+    await _acquire(semaphore)
+    started_at = time.perf_counter()
+    try:
+        output = await sync_to_async(run_tool, thread_sensitive=False)(
+            tool_name, original_args, session_id=session_id, use_cache=use_cache, tool_executor=_tool_executor(tool_name)
+        )
+    except BrokenProcessPool:
+        _reset_process_pool()
+        raise
+    finally:
+        semaphore.release()
+    finished_at = time.perf_counter()
+
+    timing = ToolTiming(
+        queue_wait_ms=round((started_at - queued_at) * 1000, 2),
+        exec_ms=round((finished_at - started_at) * 1000, 2),
+    )
+    logger.info(f"arun_tool: {tool_name} queue_wait_ms={timing.queue_wait_ms} exec_ms={timing.exec_ms} (Session: {session_id})")
+    return output, timing
+
+async def arun_tool(tool_name: str, original_args: dict, session_id: str | None = None, use_cache: bool = True):
+    """Async counterpart of core.engine.run_tool; same arguments, return value and errors."""
+    output, _ = await arun_tool_timed(tool_name, original_args, session_id=session_id, use_cache=use_cache)
+    return output
@@ -0,0 +1,104 @@
+import os
+import logging
+from dataclasses import dataclass
+from typing import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.conf import settings
+from django.utils import timezone
+from apptrace import writer as trace_writer
+from .engine import _prepare_path_args, _present_output
+from .worker import execute_batch_item, pool_context, set_cpu_share
+from tools.registry import get_tool
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class BatchItemResult:
+    """Outcome of one item of a batch. index is the item's position in list_of_args."""
+    index: int
+    args: dict
+    status: str # "success" or "error"
+    output: str | list | None = None
+    error: str | None = None
+    in_hash: str | None = None
+    out_hash: str | None = None
+    out_hashes: list | None = None # Every output's hash, for items that wrote several files
+
+def _trace_row(tool_name: str, result: BatchItemResult, logged_args: dict) -> dict:
+    return dict(
+        tool=tool_name,
+        args=logged_args,
+        in_hash=result.in_hash,
+        out_hash=result.out_hash,
+        out_hashes=result.out_hashes,
+        status=result.status,
+        error_message=result.error,
+        created_at=timezone.now(),
+    )
+
+def _write_trace_rows(tool_name: str, rows: list[dict]):
+    """Hands all trace rows of a batch to the trace writer at once. Like log_trace, failures are logged, never raised."""
+    if not rows:
+        return
+    try:
+        trace_writer.record_many(rows)
+        logger.info(f"Batch {tool_name}: logged {len(rows)} trace rows.")
+    except Exception as e:
+        logger.critical(f"Failed to log batch trace to database for tool {tool_name}: {e}", exc_info=True)
+
+def run_tool_batch(tool_name: str, list_of_args: list[dict], workers: int | None = None, session_id: str | None = None) -> Iterator[BatchItemResult]:
+    """
+    Runs the same tool over many argument sets on a process pool.
+    Path resolution and validation happen up front in this process (same rules as run_tool);
+    the PDF work is fanned out to worker processes. Results are yielded as items finish, not in
+    input order. A failing item yields an error result and never aborts the rest of the batch.
+    Trace rows are bulk-written once the batch is done (or the caller stops iterating).
+    """
+    tool_spec = get_tool(tool_name)
+    if workers is None:
+        workers = getattr(settings, 'PDF_BATCH_WORKERS', os.cpu_count() or 1)
+
+    trace_rows = []
+    try:
+        prepared = []
+        for index, original_args in enumerate(list_of_args):
+            args = dict(original_args)
+            try:
+                input_paths = _prepare_path_args(tool_spec, args, session_id)
+                final_args = tool_spec.validate(args)
+            except (FileNotFoundError, ValueError) as e: # pydantic.ValidationError is a ValueError
+                logger.error(f"Batch {tool_name}: item {index} rejected: {e}")
+                result = BatchItemResult(index, original_args, "error", error=str(e))
+                trace_rows.append(_trace_row(tool_name, result, original_args))
+                yield result
+                continue
+            prepared.append((index, original_args, args, final_args, input_paths))
+
+        if not prepared:
+            return
+
+        pool_size = max(1, min(workers, len(prepared)))
+        executor = ProcessPoolExecutor(max_workers=pool_size, mp_context=pool_context(),
+                                       initializer=set_cpu_share, initargs=((os.cpu_count() or 1) // pool_size,))
+        try:
+            futures = {
+                executor.submit(execute_batch_item, tool_name, final_args, input_paths): (index, original_args, args)
+                for index, original_args, args, final_args, input_paths in prepared
+            }
+            for future in as_completed(futures):
+                index, original_args, args = futures[future]
+                try:
+                    tool_output, in_hash, out_hashes = future.result()
+                except Exception as e:
+                    logger.error(f"Batch {tool_name}: item {index} failed: {e}")
+                    result = BatchItemResult(index, original_args, "error", error=str(e))
+                    trace_rows.append(_trace_row(tool_name, result, original_args))
+                else:
+                    result = BatchItemResult(index, original_args, "success", output=_present_output(tool_output, session_id), in_hash=in_hash,
+                                             out_hash=out_hashes[0] if out_hashes else None, out_hashes=out_hashes if isinstance(tool_output, list) else None)
+                    trace_rows.append(_trace_row(tool_name, result, args))
+                yield result
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    finally:
+        _write_trace_rows(tool_name, trace_rows)
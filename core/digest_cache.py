@@ -0,0 +1,175 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# A file whose mtime is this close to "now" may still be written to within the same mtime tick,
+# so its digest is not memoized yet (the classic "racy timestamp" problem).
+_RACY_WINDOW_NS = 1_000_000_000
+# How often (in stores per process) the table is trimmed to PDF_DIGEST_CACHE_MAX_ENTRIES.
+_PRUNE_EVERY = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    dev       INTEGER NOT NULL,
+    ino       INTEGER NOT NULL,
+    algorithm TEXT    NOT NULL,
+    size      INTEGER NOT NULL,
+    mtime_ns  INTEGER NOT NULL,
+    digest    TEXT    NOT NULL,
+    path      TEXT,
+    last_used REAL    NOT NULL,
+    PRIMARY KEY (dev, ino, algorithm)
+)
+"""
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "invalidated": 0,
+    "bytes_hashed": 0,
+    "bytes_skipped": 0,
+}
+_stores_since_prune = 0
+
+def _bump(counter: str, amount: int = 1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+def stats() -> dict:
+    """
+    Returns a snapshot of the in-process digest cache counters.
+    bytes_hashed is what was actually read and hashed; bytes_skipped is what a cache hit saved.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+def record_hashed(num_bytes: int):
+    _bump("bytes_hashed", num_bytes)
+
+def is_enabled() -> bool:
+    if not settings.configured:
+        return False
+    return bool(getattr(settings, 'PDF_DIGEST_CACHE_ENABLED', False))
+
+def _db_path() -> Path:
+    return Path(getattr(settings, 'PDF_DIGEST_CACHE_PATH', settings.BASE_DIR / "cache" / "digests.sqlite3"))
+
+def _connection() -> sqlite3.Connection:
+    """
+    One connection per thread and per process (a forked child must not reuse its parent's handle).
+    The same database file is shared by every worker process on the host.
+    """
+    db_path = _db_path()
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid() and _local.db_path == db_path:
+        return conn
+
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=5.0, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(_SCHEMA)
+    _local.conn = conn
+    _local.pid = os.getpid()
+    _local.db_path = db_path
+    return conn
+
+def lookup(st: os.stat_result, algorithm: str = "sha256") -> str | None:
+    """
+    Returns the memoized digest for the file identified by st, or None.
+    A row whose size or mtime no longer matches the file is treated as stale and removed.
+    """
+    if not is_enabled():
+        return None
+    try:
+        conn = _connection()
+        row = conn.execute(
+            "SELECT size, mtime_ns, digest FROM digests WHERE dev = ? AND ino = ? AND algorithm = ?",
+            (st.st_dev, st.st_ino, algorithm),
+        ).fetchone()
+        if row is None:
+            _bump("misses")
+            return None
+        size, mtime_ns, digest = row
+        if size != st.st_size or mtime_ns != st.st_mtime_ns:
+            conn.execute(
+                "DELETE FROM digests WHERE dev = ? AND ino = ? AND algorithm = ?",
+                (st.st_dev, st.st_ino, algorithm),
+            )
+            _bump("invalidated")
+            _bump("misses")
+            return None
+        conn.execute(
+            "UPDATE digests SET last_used = ? WHERE dev = ? AND ino = ? AND algorithm = ?",
+            (time.time(), st.st_dev, st.st_ino, algorithm),
+        )
+        _bump("hits")
+        _bump("bytes_skipped", st.st_size)
+        return digest
+    except sqlite3.Error as e:
+        logger.warning(f"Digest cache lookup failed, hashing instead: {e}")
+        return None
+
+def store(path: str, st_before: os.stat_result, digest: str, algorithm: str = "sha256"):
+    """
+    Memoizes digest for path, provided the file did not change while it was being hashed
+    and its mtime is old enough to be trusted.
+    """
+    global _stores_since_prune
+    if not is_enabled():
+        return
+    try:
+        st_after = os.stat(path)
+    except OSError:
+        return
+    unchanged = (
+        st_after.st_dev == st_before.st_dev
+        and st_after.st_ino == st_before.st_ino
+        and st_after.st_size == st_before.st_size
+        and st_after.st_mtime_ns == st_before.st_mtime_ns
+    )
+    if not unchanged:
+        logger.info(f"Digest cache: {path} changed while being hashed, not memoizing.")
+        return
+    if time.time_ns() - st_after.st_mtime_ns < _RACY_WINDOW_NS:
+        return
+    try:
+        conn = _connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO digests (dev, ino, algorithm, size, mtime_ns, digest, path, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (st_after.st_dev, st_after.st_ino, algorithm, st_after.st_size, st_after.st_mtime_ns, digest, str(path), time.time()),
+        )
+        _stores_since_prune += 1
+        if _stores_since_prune >= _PRUNE_EVERY:
+            _stores_since_prune = 0
+            prune()
+    except sqlite3.Error as e:
+        logger.warning(f"Digest cache store failed for {path}: {e}")
+
+def prune(max_entries: int | None = None) -> int:
+    """
+    Drops the least recently used rows beyond max_entries (PDF_DIGEST_CACHE_MAX_ENTRIES by default).
+    Returns the number of rows removed.
+    """
+    if max_entries is None:
+        max_entries = getattr(settings, 'PDF_DIGEST_CACHE_MAX_ENTRIES', 100_000)
+    try:
+        conn = _connection()
+        cursor = conn.execute(
+            "DELETE FROM digests WHERE rowid IN ("
+            "SELECT rowid FROM digests ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (max_entries,),
+        )
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.warning(f"Digest cache prune failed: {e}")
+        return 0
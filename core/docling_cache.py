@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from importlib import metadata
+from pathlib import Path
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# On-disk cache of Docling conversions: the Markdown (and serialized DoclingDocument, when the converter
+# provides one) of a document, keyed by its content hash and the converter version. Redacting the same
+# document again with other patterns then skips the conversion. Same layout and LRU rules as result_cache.
+
+# Bump this whenever the on-disk layout or the key recipe changes, so old entries are never reused.
+DOCLING_CACHE_VERSION = 1
+
+META_FILENAME = "meta.json"
+MARKDOWN_FILENAME = "document.md"
+DOCUMENT_FILENAME = "document.json"
+
+_stats_lock = threading.Lock()
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "stores": 0,
+    "evictions": 0,
+}
+
+def _bump(counter: str, amount: int = 1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+def stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+def is_enabled() -> bool:
+    return bool(getattr(settings, 'PDF_DOCLING_CACHE_ENABLED', False))
+
+def _cache_root() -> Path:
+    return Path(getattr(settings, 'PDF_DOCLING_CACHE_ROOT', settings.BASE_DIR / "cache" / "docling"))
+
+def _entry_dir(key: str) -> Path:
+    return _cache_root() / key[:2] / key
+
+@lru_cache(maxsize=1)
+def converter_version() -> str:
+    """Installed Docling version; a different version may convert differently, so it is part of the key."""
+    try:
+        return metadata.version("docling")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+def make_key(input_hash: str) -> str:
+    payload = {"v": DOCLING_CACHE_VERSION, "converter": converter_version(), "input": input_hash}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+def fetch_markdown(key: str) -> str | None:
+    """The cached Markdown for key, or None on a miss. A hit refreshes the entry's LRU clock."""
+    entry_dir = _entry_dir(key)
+    meta_path = entry_dir / META_FILENAME
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        markdown = (entry_dir / MARKDOWN_FILENAME).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        _bump("misses")
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Docling cache: unreadable entry {key}, discarding it: {e}")
+        _remove_entry(entry_dir)
+        _bump("misses")
+        return None
+    if len(markdown.encode("utf-8")) != meta.get("markdown_size"):
+        logger.warning(f"Docling cache: entry {key} is damaged, discarding it.")
+        _remove_entry(entry_dir)
+        _bump("misses")
+        return None
+
+    # Touch the metadata file: its mtime is the LRU clock used by eviction.
+    try:
+        os.utime(meta_path, None)
+    except OSError:
+        pass
+    _bump("hits")
+    return markdown
+
+def store(key: str, markdown: str, document_json: str | None = None):
+    """Stores a conversion under key. Failures are logged and never propagate to the caller."""
+    entry_dir = _entry_dir(key)
+    if (entry_dir / META_FILENAME).exists():
+        return
+
+    staging_dir = entry_dir.parent / f".{key}.{os.getpid()}.{threading.get_ident()}.staging"
+    try:
+        staging_dir.mkdir(parents=True, exist_ok=True)
+        markdown_bytes = markdown.encode("utf-8")
+        (staging_dir / MARKDOWN_FILENAME).write_bytes(markdown_bytes)
+        size = len(markdown_bytes)
+        if document_json is not None:
+            document_bytes = document_json.encode("utf-8")
+            (staging_dir / DOCUMENT_FILENAME).write_bytes(document_bytes)
+            size += len(document_bytes)
+        meta = {
+            "version": DOCLING_CACHE_VERSION,
+            "converter": converter_version(),
+            "markdown_size": len(markdown_bytes),
+            "size": size,
+            "created_at": time.time(),
+        }
+        (staging_dir / META_FILENAME).write_text(json.dumps(meta), encoding="utf-8")
+        try:
+            os.rename(staging_dir, entry_dir)
+        except OSError:
+            # Another worker stored the same key first; keep theirs.
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return
+        _bump("stores")
+        logger.info(f"Docling cache: stored conversion under {key} ({size} bytes)")
+    except Exception as e:
+        logger.warning(f"Docling cache: failed to store conversion {key}: {e}", exc_info=True)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return
+
+    evict()
+
+def _remove_entry(entry_dir: Path):
+    shutil.rmtree(entry_dir, ignore_errors=True)
+
+def evict() -> int:
+    """Removes least-recently-used entries until the cache fits PDF_DOCLING_CACHE_MAX_BYTES. Returns the number removed."""
+    root = _cache_root()
+    max_bytes = getattr(settings, 'PDF_DOCLING_CACHE_MAX_BYTES', None)
+    if not max_bytes or not root.is_dir():
+        return 0
+
+    entries = []
+    for meta_path in root.glob(f"*/*/{META_FILENAME}"):
+        try:
+            entries.append((meta_path.stat().st_mtime, json.loads(meta_path.read_text(encoding="utf-8")).get("size", 0), meta_path.parent))
+        except (OSError, ValueError):
+            continue
+
+    removed = 0
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry_dir in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        _remove_entry(entry_dir)
+        total -= size
+        removed += 1
+
+    if removed:
+        _bump("evictions", removed)
+        logger.info(f"Docling cache: evicted {removed} entries.")
+    return removed
@@ -0,0 +1,345 @@
+import os
+import json
+import time
+import socket
+import hashlib
+import logging
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from django.conf import settings
+from . import docling_cache
+from .secure import hash_file
+
+logger = logging.getLogger(__name__)
+
+# A long-lived Docling conversion service shared by every web worker on the host.
+# `python manage.py docling_service` starts a few converter processes that load the layout models once
+# and keep them warm; tools (redact) send conversion jobs over a Unix socket with convert_to_markdown().
+# If no service is listening, the conversion runs in the calling process with one converter kept per process.
+# Either way, conversions are cached on disk by input hash (core.docling_cache).
+
+DEFAULT_TIMEOUT_SECONDS = 300
+
+def default_converter():
+    from docling.document_converter import DocumentConverter # Heavy import, only where a converter is built
+    return DocumentConverter()
+
+def _convert(converter, path: str) -> tuple[str, str | None]:
+    """(Markdown, serialized DoclingDocument or None if the document cannot be exported) of one conversion."""
+    document = converter.convert(path).document
+    document_json = json.dumps(document.export_to_dict(), ensure_ascii=False) if hasattr(document, "export_to_dict") else None
+    return document.export_to_markdown(), document_json
+
+# --- Worker side (spawned process; no Django access) ---
+
+def _worker_main(converter_factory, conn):
+    """Builds one converter, reports how long that took, then converts the paths sent over conn until None."""
+    start = time.perf_counter()
+    try:
+        converter = converter_factory()
+    except Exception as e:
+        conn.send(("failed", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", time.perf_counter() - start))
+    while True:
+        try:
+            path = conn.recv()
+        except (EOFError, OSError):
+            return
+        if path is None:
+            return
+        try:
+            conn.send(("ok", _convert(converter, path)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+# --- Service side ---
+
+class DoclingService:
+    """
+    A pool of converter processes behind a Unix socket. Each worker builds its converter once (the
+    model-load time is reported in stats()) and then takes jobs from one shared queue, so a job goes to
+    whichever worker is free. A worker that dies is replaced and only the job it was running fails;
+    if a converter cannot be built at all, queued and later jobs fail with that error. A job that runs
+    past timeout is stopped: dropped if it is still queued, otherwise its worker is killed and replaced.
+    Requests are handled on one thread per connection; see convert_to_markdown() for the client side.
+    """
+    def __init__(self, socket_path: str, workers: int = 1, converter_factory=default_converter, timeout: float = DEFAULT_TIMEOUT_SECONDS):
+        self.socket_path = str(socket_path)
+        self.timeout = timeout
+        self._factory = converter_factory
+        self._ctx = multiprocessing.get_context("spawn") # Model libraries do not survive fork well
+        self._jobs: queue.Queue = queue.Queue()
+        self._workers = max(1, workers)
+        self._threads: list[threading.Thread] = []
+        self._load_seconds: dict[int, float] = {} # Worker pid -> seconds spent building its converter
+        self._running = 0
+        self._assigned: dict[Future, multiprocessing.Process] = {} # Running job -> its worker
+        self._lock = threading.Lock()
+        self._closed = False
+        self._load_error: str | None = None
+        self._stats = {"completed": 0, "failed": 0, "restarts": 0, "timeouts": 0}
+        self._listener: Listener | None = None
+
+    def start(self):
+        self._listen() # Before any worker is spawned: they must not inherit the socket's umask
+        for i in range(self._workers):
+            thread = threading.Thread(target=self._drive_worker, name=f"pdfshell-docling-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        """Waits until every worker has loaded its converter."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(self._load_seconds) < self._workers:
+            if self._load_error is not None or (deadline is not None and time.monotonic() > deadline):
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._stats,
+                workers=self._workers,
+                ready=len(self._load_seconds),
+                queue_depth=self._jobs.qsize(),
+                running=self._running,
+                model_load_seconds=sorted(round(seconds, 3) for seconds in self._load_seconds.values()),
+                load_error=self._load_error,
+            )
+
+    def submit(self, path: str) -> Future:
+        if self._closed:
+            raise RuntimeError("Docling service is shut down.")
+        if self._load_error is not None:
+            raise RuntimeError(f"Docling service has no converter: {self._load_error}")
+        future = Future()
+        self._jobs.put((str(path), future))
+        return future
+
+    def _abandon(self, future: Future):
+        """Stops a job whose caller gave up waiting: dropped if still queued, otherwise its worker is killed."""
+        self._count("timeouts")
+        if future.cancel():
+            return
+        with self._lock: # _feed unassigns under the same lock, so the worker cannot have moved on to another job
+            process = self._assigned.get(future)
+            if process is not None:
+                process.kill()
+                logger.warning(f"Docling service: killed worker {process.pid}, its job ran past {self.timeout}s.")
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _drive_worker(self):
+        """Keeps one worker process running and feeds it jobs, one at a time."""
+        while not self._closed:
+            parent_conn, child_conn = self._ctx.Pipe()
+            process = self._ctx.Process(target=_worker_main, args=(self._factory, child_conn), name="pdfshell-docling", daemon=True)
+            process.start()
+            child_conn.close()
+            try:
+                status, value = parent_conn.recv()
+            except (EOFError, OSError):
+                status, value = "failed", f"worker exited while loading (exit code {process.exitcode})"
+            if status == "failed":
+                logger.error(f"Docling service: worker could not build a converter: {value}")
+                self._load_error = value
+                self._drain(f"Docling service has no converter: {value}")
+                process.join(5)
+                return
+            with self._lock:
+                self._load_seconds[process.pid] = value
+            logger.info(f"Docling service: worker {process.pid} loaded its converter in {value:.1f}s.")
+
+            died = self._feed(process, parent_conn)
+            with self._lock:
+                self._load_seconds.pop(process.pid, None)
+            parent_conn.close()
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+            if died:
+                self._count("restarts")
+                logger.warning(f"Docling service: replacing worker {process.pid} (exit code {process.exitcode}).")
+
+    def _feed(self, process, conn) -> bool:
+        """Sends jobs to one worker until shutdown (returns False) or until the worker dies (returns True)."""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                try:
+                    conn.send(None)
+                except OSError:
+                    pass
+                return False
+            path, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self._lock:
+                self._running += 1
+                self._assigned[future] = process
+            try:
+                conn.send(path)
+                status, value = conn.recv()
+            except (EOFError, OSError):
+                process.join(1)
+                self._count("failed")
+                future.set_exception(RuntimeError(f"Docling worker exited unexpectedly (exit code {process.exitcode})."))
+                return True
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    del self._assigned[future]
+            if status == "ok":
+                self._count("completed")
+                future.set_result(value)
+            else:
+                self._count("failed")
+                future.set_exception(RuntimeError(value))
+
+    def _drain(self, message: str):
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None and job[1].set_running_or_notify_cancel(): # Skips jobs dropped after a timeout
+                job[1].set_exception(RuntimeError(message))
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if request.get("op") == "stats":
+                        reply = ("ok", self.stats())
+                    elif request.get("op") == "convert":
+                        future = self.submit(request["path"])
+                        try:
+                            reply = ("ok", future.result(timeout=self.timeout))
+                        except TimeoutError:
+                            self._abandon(future)
+                            raise
+                    else:
+                        reply = ("error", f"Unknown request: {request.get('op')!r}")
+                except TimeoutError:
+                    reply = ("error", f"Conversion did not finish within {self.timeout}s.")
+                except Exception as e:
+                    reply = ("error", str(e))
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+
+    def _listen(self):
+        if self._listener is not None:
+            return
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path) # Left over from a previous run
+        # The socket is created owner-only: with a chmod after bind, others could connect in between
+        umask = os.umask(0o177)
+        try:
+            self._listener = Listener(self.socket_path, family="AF_UNIX", authkey=_authkey())
+        finally:
+            os.umask(umask)
+
+    def serve_forever(self):
+        """Accepts client connections on the socket until close()."""
+        self._listen()
+        logger.info(f"Docling service: listening on {self.socket_path} with {self._workers} worker(s).")
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError): # Listener closed, or a client failed the handshake
+                continue
+            threading.Thread(target=self._handle, args=(conn,), name="pdfshell-docling-client", daemon=True).start()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._listener is not None:
+            with socket.socket(socket.AF_UNIX) as wake: # Unblocks accept() in serve_forever
+                try:
+                    wake.connect(self.socket_path)
+                except OSError:
+                    pass
+            self._listener.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        self._drain("Docling service is shut down.")
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join(10) # Running conversions finish first
+
+# --- Client side ---
+
+def _authkey() -> bytes:
+    return hashlib.sha256(f"pdfshell-docling:{settings.SECRET_KEY}".encode()).digest()
+
+def _request(socket_path: str, request: dict, timeout: float):
+    with Client(socket_path, family="AF_UNIX", authkey=_authkey()) as conn:
+        conn.send(request)
+        if not conn.poll(timeout):
+            raise RuntimeError(f"Docling service did not answer within {timeout}s.")
+        status, value = conn.recv()
+    if status != "ok":
+        raise RuntimeError(value)
+    return value
+
+_local_converter = None
+_local_lock = threading.Lock()
+
+def _local_convert(path: str) -> tuple[str, str | None]:
+    global _local_converter
+    with _local_lock:
+        if _local_converter is None:
+            start = time.perf_counter()
+            _local_converter = default_converter()
+            logger.info(f"Docling: loaded an in-process converter in {time.perf_counter() - start:.1f}s.")
+        converter = _local_converter
+    return _convert(converter, path)
+
+def _convert_path(path: str) -> tuple[str, str | None]:
+    socket_path = getattr(settings, 'PDF_DOCLING_SOCKET', None)
+    if socket_path and os.path.exists(socket_path):
+        try:
+            return tuple(_request(str(socket_path), {"op": "convert", "path": path}, getattr(settings, 'PDF_DOCLING_TIMEOUT_SECONDS', DEFAULT_TIMEOUT_SECONDS)))
+        except (OSError, EOFError) as e: # Not listening (stale socket file) or went away mid-request
+            logger.warning(f"Docling service at {socket_path} is unavailable ({e}); converting in-process.")
+    return _local_convert(path)
+
+def convert_to_markdown(path: str) -> str:
+    """
+    Converts a document to Markdown with Docling, through the shared service at PDF_DOCLING_SOCKET when
+    one is listening, otherwise in this process. Conversion errors from the service raise RuntimeError.
+    With PDF_DOCLING_CACHE_ENABLED, a document converted before (same content, same Docling version)
+    is served from the disk cache without converting.
+    """
+    path = str(path)
+    key = docling_cache.make_key(hash_file(path)) if docling_cache.is_enabled() else None
+    if key is not None:
+        markdown = docling_cache.fetch_markdown(key)
+        if markdown is not None:
+            logger.info(f"Docling cache: hit for {path}")
+            return markdown
+    markdown, document_json = _convert_path(path)
+    if key is not None:
+        docling_cache.store(key, markdown, document_json)
+    return markdown
+
+def service_stats(socket_path: str | None = None) -> dict:
+    """Queue depth, running jobs and model-load times of the service at socket_path (default PDF_DOCLING_SOCKET)."""
+    socket_path = str(socket_path or getattr(settings, 'PDF_DOCLING_SOCKET'))
+    return _request(socket_path, {"op": "stats"}, timeout=10)
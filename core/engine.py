@@ -1,39 +1,59 @@
-import importlib
-import yaml
+import uuid
 import logging
 from pathlib import Path # Added Path
-from typing import get_args # Added import for get_args
-from .secure import validate, hash_file
+from concurrent.futures import Executor
+from .secure import validate, hash_file, hash_files, fast_digest_algorithm
+from . import result_cache
+from .sink import OutputSinks
+from .inputs import open_inputs
+from .worker import execute_tool
+from .timing import StageTimer
+from . import sandbox
+from .sandbox import ToolRunKilled
+from tools.registry import ToolSpec, get_tool
 # from .alert import notify_slack # Commented out for now
-from apptrace.models import Operation # Import the Operation model
+from apptrace import writer as trace_writer # Buffered writer for apptrace.Operation rows
 from django.conf import settings # Import settings to access PDF_FILES_ROOT, PDF_UPLOADS_ROOT
 from pydantic import ValidationError
 
 # Placeholder for log_trace, will be implemented later with Trace model
 # from trace.models import Operation # This will be used when trace is set up
-def log_trace(tool_name: str, args: dict, in_hash: str | None, out_hash: str | None, status: str = "success", error_message: str | None = None):
+def log_trace(tool_name: str, args: dict, in_hash: str | None, out_hash: str | None, status: str = "success", error_message: str | None = None, cache_hit: bool = False, timer: StageTimer | None = None, session_id: str | None = None, out_hashes: list[str] | None = None):
     """
     Logs the operation details to the Operation model in the database.
     Args should contain the full physical paths used.
+    out_hashes is given for tools that return several output files (e.g. split with several groups).
+    Rows are queued and bulk-inserted in the background by apptrace.writer (see PDF_TRACE_BUFFERED).
+    With a timer, its duration, byte counts and stage breakdown are stored on the row as well and
+    emitted as one structured line on the 'pdfshell.metrics' logger (only that line includes the
+    "trace" stage, since the row is built before it is recorded).
     """
+    metrics = timer.fields() if timer is not None else {}
+    if out_hashes is not None:
+        metrics['out_hashes'] = out_hashes
     try:
-        Operation.objects.create(
-            tool=tool_name,
-            args=args, # These args should now contain full paths
-            in_hash=in_hash,
-            out_hash=out_hash,
-            status=status,
-            error_message=error_message
-        )
-        logging.info(f"Successfully logged trace for tool: {tool_name}, status: {status}")
+        if timer is not None:
+            with timer.stage("trace"):
+                trace_writer.record(tool=tool_name, args=args, in_hash=in_hash, out_hash=out_hash, status=status, error_message=error_message, cache_hit=cache_hit, **metrics)
+        else:
+            trace_writer.record(
+                tool=tool_name,
+                args=args, # These args should now contain full paths
+                in_hash=in_hash,
+                out_hash=out_hash,
+                status=status,
+                error_message=error_message,
+                cache_hit=cache_hit,
+                **metrics
+            )
+        logging.info(f"Successfully logged trace for tool: {tool_name}, status: {status}, cache_hit: {cache_hit}")
     except Exception as e:
         # If logging to DB fails, log this critical error to system logs
         logging.critical(f"Failed to log trace to database for tool {tool_name}: {e}", exc_info=True)
+    if timer is not None:
+        timer.log(tool_name, status, cache_hit=cache_hit, session_id=session_id)
 
-# Define known path keys for input and output
-# This is a simplification. A more robust solution might involve tool-specific metadata.
-INPUT_PATH_KEYS = ['file', 'files', 'stamp_path'] # 'files' can be a list
-OUTPUT_PATH_KEYS = ['output', 'output_dir']
+# Which arguments are input/output paths is declared per tool in tools/<name>.yml (see tools.registry).
 
 def _resolve_and_validate_path(
     filename: str, 
@@ -174,93 +194,186 @@ def process_path_arg(arg_value, base_path_for_cli: Path, session_id: str | None,
     else:
         raise ValueError(f"Invalid path argument type for '{arg_key}': {type(arg_value)}")
 
-def run_tool(tool_name: str, original_args: dict, session_id: str | None = None):
+def _cache_key_hashes(input_paths: list[str], sha256_hashes: list[str]) -> list[str]:
+    """
+    Returns the input digests used for the result cache key.
+    PDF_RESULT_CACHE_KEY_DIGEST = "fast" switches to a non-cryptographic digest; the default
+    reuses the SHA-256 digests that are computed for the audit trail anyway.
+    """
+    key_digest = getattr(settings, 'PDF_RESULT_CACHE_KEY_DIGEST', 'sha256')
+    if key_digest == 'sha256':
+        return sha256_hashes
+    algorithm = fast_digest_algorithm() if key_digest == 'fast' else key_digest
+    return [f"{algorithm}:{h}" for h in hash_files(input_paths, algorithm=algorithm)]
+
+def _present_output(tool_output, session_id: str | None):
+    """
+    Converts a tool output path (or list of paths) into what callers see.
+    Session outputs are returned as bare filenames so they can be used in later session requests.
+    """
+    if isinstance(tool_output, list):
+        return [_present_output(item, session_id) for item in tool_output]
+    if session_id and tool_output and isinstance(tool_output, str):
+        try:
+            tool_output_path = Path(tool_output)
+            # Check if the output path is within the session's upload directory
+            session_upload_dir = settings.PDF_UPLOADS_ROOT / session_id
+            if tool_output_path.is_relative_to(session_upload_dir.resolve()):
+                logging.info(f"run_tool: Returning basename '{tool_output_path.name}' for session output file '{tool_output}'")
+                return tool_output_path.name # Return only the filename
+        except Exception as e:
+            # Log if there's an issue with path comparison, but proceed to return original tool_output
+            logging.warning(f"run_tool: Could not determine if '{tool_output}' is a session file, returning full path. Error: {e}")
+    return tool_output
+
+def _total_size(paths: list[str]) -> int:
+    """Sum of the sizes of the given files; a file listed twice is counted once."""
+    return sum(Path(p).stat().st_size for p in set(paths))
+
+def _prepare_path_args(tool_spec: ToolSpec, args: dict, session_id: str | None, source_path: str | None = None) -> list[str]:
+    """
+    Resolves and validates every input/output path argument in args (in place).
+    Missing outputs get a default location under BASE_DIR/output/, named after source_path when given
+    (the document a pipeline step receives in memory) or else after the first input file.
+    Returns the processed input paths, in processing order, for hashing.
+    """
+    input_paths = []
+    # Process input paths
+    for key in tool_spec.input_keys:
+        list_key, _, item_key = key.partition("[].")
+        if item_key: # A path inside each item of a list argument, e.g. "stamps[].stamp_path"
+            if not isinstance(args.get(list_key), list):
+                continue
+            args[list_key] = [dict(item) if isinstance(item, dict) else item for item in args[list_key]] # Keep original_args untouched
+            for item in args[list_key]:
+                if isinstance(item, dict) and item.get(item_key) is not None:
+                    item[item_key] = process_path_arg(item[item_key], settings.PDF_FILES_ROOT, session_id, is_input=True, arg_key=item_key)
+                    input_paths.append(item[item_key])
+            continue
+        if key in args:
+            # base_path_for_cli is only used if session_id is None
+            args[key] = process_path_arg(args[key], settings.PDF_FILES_ROOT, session_id, is_input=True, arg_key=key)
+
+            # Update input_paths after successful processing
+            current_processed_val = args[key]
+            if isinstance(current_processed_val, list):
+                input_paths.extend(current_processed_val)
+            else:
+                input_paths.append(current_processed_val)
+
+    # Process output paths (before tool execution, to validate target location)
+    for key in tool_spec.output_keys:
+        user_provided_value = args.get(key)
+        default_output_root = settings.BASE_DIR / "output"
+        default_output_root.mkdir(parents=True, exist_ok=True)
+
+        if user_provided_value is None:
+            # User did not provide the output path/dir, generate a default one in PROJECT_ROOT/output/
+            input_file_for_default_name = source_path or args.get('file') or (args.get('files')[0] if isinstance(args.get('files'), list) and args.get('files') else "default")
+            stem = Path(input_file_for_default_name).stem
+
+            if key == 'output':
+                args[key] = str(default_output_root / tool_spec.default_output_name(stem))
+            elif key == 'output_dir': # For tools like split
+                args[key] = str(default_output_root) 
+        else:
+            # User provided an output path/dir. Process it relative to PDF_FILES_ROOT (files/)
+            # process_path_arg ensures the path is validated and made absolute (within files/ or user-provided absolute)
+            args[key] = process_path_arg(user_provided_value, settings.PDF_FILES_ROOT, session_id, is_input=False, arg_key=key)
+
+    return input_paths
+
+def run_tool(tool_name: str, original_args: dict, session_id: str | None = None, use_cache: bool = True, tool_executor: Executor | None = None):
     """
     Dynamically loads and runs a tool module.
     Manages path validation and construction based on session or CLI context.
+    Results are served from the content-addressed result cache when the same tool, arguments
+    and input bytes were processed before; pass use_cache=False to force a fresh run.
+    With tool_executor (e.g. a ProcessPoolExecutor), only the tool itself runs there; path handling,
+    hashing, caching and tracing stay in the calling thread. Without one, PDF_SANDBOX_ENABLED runs the
+    tool in the pre-forked sandbox pool under its memory/CPU/time limits (see core.sandbox); a run
+    that is stopped there raises ToolRunKilled.
+    Every call is timed per stage (resolve, hash_inputs, validate, cache_lookup, tool, hash_output,
+    cache_store, trace); the timings end up on the Operation row and in the 'pdfshell.metrics' log.
+    Inputs are read through short-lived read-only mappings (core.inputs), not one mapping per call:
+    validation reads only each file's header, hashing maps each file while it hashes it, and the tool
+    maps its inputs again (in the sandbox or executor process when there is one) for as long as it
+    reads them. Only buffers the tool opens with inputs.buffer_for (e.g. a stamp image it reads
+    several times) are shared, within the process that opened them, until the call ends.
     """
-    args = original_args.copy() # Work on a copy to modify paths
+    with open_inputs():
+        return _run_tool(tool_name, original_args, session_id, use_cache, tool_executor)
 
-    # Determine base paths
-    pdf_files_root = settings.PDF_FILES_ROOT
-    pdf_uploads_root = settings.PDF_UPLOADS_ROOT
+def _run_tool(tool_name: str, original_args: dict, session_id: str | None, use_cache: bool, tool_executor: Executor | None):
+    args = original_args.copy() # Work on a copy to modify paths
+    timer = StageTimer()
 
     processed_input_paths_for_hash = []
     primary_in_hash = None # Initialize primary_in_hash
 
     try:
-        # Process input paths
-        for key in INPUT_PATH_KEYS:
-            if key in args:
-                # base_path_for_cli is only used if session_id is None
-                args[key] = process_path_arg(args[key], settings.PDF_FILES_ROOT, session_id, is_input=True, arg_key=key)
-                
-                # Update processed_input_paths_for_hash after successful processing
-                current_processed_val = args[key]
-                if isinstance(current_processed_val, list):
-                    processed_input_paths_for_hash.extend(current_processed_val)
-        else:
-                    processed_input_paths_for_hash.append(current_processed_val)
-
-        # Process output paths (before tool execution, to validate target location)
-        for key in OUTPUT_PATH_KEYS:
-            user_provided_value = args.get(key)
-            default_output_root = settings.BASE_DIR / "output"
-            default_output_root.mkdir(parents=True, exist_ok=True)
-
-            if user_provided_value is None:
-                # User did not provide the output path/dir, generate a default one in PROJECT_ROOT/output/
-                input_file_for_default_name = args.get('file') or (args.get('files')[0] if isinstance(args.get('files'), list) and args.get('files') else "default")
-                stem = Path(input_file_for_default_name).stem
-
-                if key == 'output':
-                    if tool_name == "merge": default_filename = f"{stem}_merged.pdf"
-                    elif tool_name == "add_stamp": default_filename = f"{stem}_stamped.pdf"
-                    elif tool_name == "redact": default_filename = f"{stem}_redacted.md"
-                    else: default_filename = f"{stem}_output.pdf" # Fallback default
-                    args[key] = str(default_output_root / default_filename)
-                elif key == 'output_dir': # For tools like split
-                    args[key] = str(default_output_root) 
-            else:
-                # User provided an output path/dir. Process it relative to PDF_FILES_ROOT (files/)
-                # process_path_arg ensures the path is validated and made absolute (within files/ or user-provided absolute)
-                args[key] = process_path_arg(user_provided_value, settings.PDF_FILES_ROOT, session_id, is_input=False, arg_key=key)
-        
+        with timer.stage("resolve"):
+            tool_spec = get_tool(tool_name) # Raises ImportError for unknown tools
+            processed_input_paths_for_hash = _prepare_path_args(tool_spec, args, session_id)
+
         # Ensure all paths in args (now potentially modified) are absolute and validated before Pydantic
         # The Pydantic models themselves expect strings, not Path objects, as per current tool schemas.
         # process_path_arg returns strings.
 
-        in_hash_map = {}
-        if processed_input_paths_for_hash:
-            if isinstance(args.get('files'), list) and all(isinstance(p, str) for p in args.get('files', [])):
-                 for p_path_str in args['files']:
-                      in_hash_map[p_path_str] = hash_file(p_path_str)
-            elif isinstance(args.get('file'), str):
-                 in_hash_map[args['file']] = hash_file(args['file'])
-            
-            if processed_input_paths_for_hash: # Check again if list is not empty
-                primary_in_hash = hash_file(processed_input_paths_for_hash[0])
-
-        tool_module = importlib.import_module(f"tools.{tool_name}")
+        # Every input (including stamp images) is hashed exactly once, in processing order,
+        # with the files of one operation hashed in parallel. The SHA-256 digests feed the audit trail.
+        with timer.stage("hash_inputs"):
+            input_hashes = hash_files(processed_input_paths_for_hash)
+            timer.bytes_in = _total_size(processed_input_paths_for_hash)
+        if input_hashes:
+            primary_in_hash = input_hashes[0]
+
         logging.info(f"Executing tool: {tool_name} with processed args: {args} (Session: {session_id})")
         
-        # Validate with Pydantic model instance
+        # The only validation pass: the tool's ArgsSchema, compiled once in the registry
         try:
-            # Args passed to Pydantic model should already have paths processed by the first pass
-            tool_args_model = tool_module.ArgsSchema(**args)
-            # The model dump now contains the validated and potentially type-coerced arguments
-            processed_final_args = tool_args_model.model_dump()
+            # Args passed to the schema already have their paths processed by the first pass
+            # The dump contains the validated and potentially type-coerced arguments
+            with timer.stage("validate"):
+                processed_final_args = tool_spec.validate(args)
 
-            tool_output = tool_module.run(processed_final_args) # Pass the validated args to the tool's run function
+            cache_key = None
+            if use_cache and result_cache.is_enabled():
+                with timer.stage("cache_lookup"):
+                    cache_key = result_cache.make_key(tool_name, processed_final_args, _cache_key_hashes(processed_input_paths_for_hash, input_hashes), tool_spec.path_keys)
+                    cached = result_cache.fetch(cache_key, processed_final_args)
+                if cached is not None:
+                    tool_output, cached_hashes = cached
+                    logging.info(f"run_tool: Cache hit for {tool_name} (key {cache_key[:12]}), tool not executed.")
+                    cached_paths = tool_output if isinstance(tool_output, list) else [tool_output]
+                    if all(isinstance(p, str) and Path(p).is_file() for p in cached_paths):
+                        timer.bytes_out = _total_size(cached_paths)
+                    log_trace(tool_name, args, primary_in_hash, cached_hashes[0] if cached_hashes else None, status="success", cache_hit=True, timer=timer, session_id=session_id,
+                              out_hashes=cached_hashes if isinstance(tool_output, list) else None)
+                    return _present_output(tool_output, session_id)
+            elif not use_cache:
+                result_cache.record_bypass()
+
+            outputs = OutputSinks() # Tools write through these sinks, which hash the bytes on the way to disk
+            if tool_executor is None and sandbox.is_enabled():
+                tool_executor = sandbox.executor_for(tool_name)
+            with timer.stage("tool"):
+                if tool_executor is None:
+                    tool_output = tool_spec.module.run(processed_final_args, outputs=outputs) # Pass the validated args to the tool's run function
+                else:
+                    tool_output, written = tool_executor.submit(execute_tool, tool_name, processed_final_args).result()
+                    for w in written:
+                        outputs.record(w.path, w.sha256, w.size, w.page_count, w.bytes_saved)
 
         except ValidationError as e:
             error_message = f"Error in run_tool ({tool_name}, Session: {session_id}): Validation error - {e}"
             logging.error(error_message)
             # notify_slack(f"❌ PDFShell Engine Error: {error_message}")
-            log_trace(tool_name, original_args, primary_in_hash, None, status="error", error_message=str(e))
+            log_trace(tool_name, original_args, primary_in_hash, None, status="error", error_message=str(e), timer=timer, session_id=session_id)
             raise
 
         output_path_to_hash = None
+        output_paths_to_hash = []
         if tool_output and isinstance(tool_output, str): # Assuming tool returns a single output file path
             # The tool_output path should already be an absolute, validated path (constructed by the tool or passed through args)
             # If the tool constructs its own output path, it must adhere to the session/CLI logic
@@ -275,49 +388,164 @@ def run_tool(tool_name: str, original_args: dict, session_id: str | None = None)
                 # Re-validate if it wasn't from args, assuming session context if available for uploads.
                 # This part needs careful thought on contracts with tools.
                 # validate(output_path_to_hash, pdf_uploads_root / session_id if session_id else pdf_files_root, session_id)
+        elif tool_output and isinstance(tool_output, list) and all(isinstance(p, str) for p in tool_output):
+            output_paths_to_hash = tool_output # Multi-output tools (split with several groups) return every file they wrote
+        if output_path_to_hash:
+            output_paths_to_hash = [output_path_to_hash]
+
+        out_hashes = []
+        with timer.stage("hash_output"):
+            for path in output_paths_to_hash:
+                written = outputs.get(path)
+                if written is not None:
+                    out_hashes.append(written.sha256)
+                elif Path(path).exists(): # Tool wrote the file without a sink; fall back to re-reading it
+                    out_hashes.append(hash_file(path))
+                else:
+                    out_hashes.append(None)
+            out_hash = out_hashes[0] if out_hashes else None
+            results = outputs.results
+            if results:
+                timer.bytes_out = sum(r.size for r in results)
+                page_counts = [r.page_count for r in results if r.page_count is not None]
+                timer.page_count = sum(page_counts) if page_counts else None
+                savings = [r.bytes_saved for r in results if r.bytes_saved is not None]
+                timer.bytes_saved = sum(savings) if savings else None
+            elif output_path_to_hash and Path(output_path_to_hash).is_file():
+                timer.bytes_out = Path(output_path_to_hash).stat().st_size
 
-        out_hash = hash_file(output_path_to_hash) if output_path_to_hash and Path(output_path_to_hash).exists() else None
+        if cache_key and output_paths_to_hash:
+            with timer.stage("cache_store"):
+                result_cache.store(cache_key, tool_name, tool_output, processed_final_args, dict(zip(output_paths_to_hash, out_hashes)))
         
         # Log with original_args to see what user provided, but engine used 'args'
-        log_trace(tool_name, args, primary_in_hash, out_hash, status="success")
+        log_trace(tool_name, args, primary_in_hash, out_hash, status="success", timer=timer, session_id=session_id,
+                  out_hashes=out_hashes if isinstance(tool_output, list) else None)
         
-        # --- BEGIN MODIFICATION: Return only basename for session files ---
-        if session_id and tool_output and isinstance(tool_output, str):
-            try:
-                tool_output_path = Path(tool_output)
-                # Check if the output path is within the session's upload directory
-                session_upload_dir = settings.PDF_UPLOADS_ROOT / session_id
-                if tool_output_path.is_relative_to(session_upload_dir.resolve()):
-                    logging.info(f"run_tool: Returning basename '{tool_output_path.name}' for session output file '{tool_output}'")
-                    return tool_output_path.name # Return only the filename
-            except Exception as e:
-                # Log if there's an issue with path comparison, but proceed to return original tool_output
-                logging.warning(f"run_tool: Could not determine if '{tool_output}' is a session file, returning full path. Error: {e}")
-        # --- END MODIFICATION ---
-        
-        return tool_output
+        return _present_output(tool_output, session_id)
 
     except FileNotFoundError as e:
         error_message = f"Error in run_tool ({tool_name}, Session: {session_id}): File not found - {e}"
         logging.error(error_message)
         # notify_slack(f"❌ PDFShell Engine Error: {error_message}")
-        log_trace(tool_name, original_args, primary_in_hash, None, status="error", error_message=str(e))
+        log_trace(tool_name, original_args, primary_in_hash, None, status="error", error_message=str(e), timer=timer, session_id=session_id)
         raise
+    except ValidationError:
+        raise # Already logged (once) where the schema was checked
     except ValueError as e: # Catches validation errors and other value errors
         error_message = f"Error in run_tool ({tool_name}, Session: {session_id}): Validation error or invalid arguments - {e}"
         logging.error(error_message)
         # notify_slack(f"❌ PDFShell Engine Error: {error_message}")
-        log_trace(tool_name, original_args, primary_in_hash, None, status="error", error_message=str(e))
+        log_trace(tool_name, original_args, primary_in_hash, None, status="error", error_message=str(e), timer=timer, session_id=session_id)
         raise
     except ImportError as e:
         error_message = f"Error in run_tool ({tool_name}, Session: {session_id}): Tool module not found - {e}"
         logging.error(error_message)
         # notify_slack(f"❌ PDFShell Engine Error: {error_message}")
-        log_trace(tool_name, original_args, None, None, status="error", error_message=str(e))
+        log_trace(tool_name, original_args, None, None, status="error", error_message=str(e), timer=timer, session_id=session_id)
+        raise
+    except ToolRunKilled as e:
+        error_message = f"Error in run_tool ({tool_name}, Session: {session_id}): Tool run killed - {e}"
+        logging.error(error_message)
+        log_trace(tool_name, original_args, primary_in_hash, None, status="error", error_message=str(e), timer=timer, session_id=session_id)
         raise
     except Exception as e:
         error_message = f"An unexpected error occurred in run_tool ({tool_name}, Session: {session_id}): {e}"
         logging.error(error_message, exc_info=True)
         # notify_slack(f"❌ PDFShell Engine Error (Unexpected): {error_message}")
-        log_trace(tool_name, original_args, primary_in_hash, None, status="error", error_message=str(e)) 
+        log_trace(tool_name, original_args, primary_in_hash, None, status="error", error_message=str(e), timer=timer, session_id=session_id) 
         raise
+
+def _output_target(tool_spec: ToolSpec, args: dict) -> str:
+    """Where a tool writes its single output for args (split derives the filename inside output_dir)."""
+    if hasattr(tool_spec.module, 'output_path'):
+        return tool_spec.module.output_path(args)
+    return args['output']
+
+def run_pipeline(steps: list[dict], session_id: str | None = None):
+    """
+    Runs several tools back to back, handing the parsed document from one step to the next in memory.
+    steps is a list of {"tool": name, "args": {...}}. Every step after the first takes the previous
+    step's document as its primary input, so it must not pass 'file' (split, add_stamp); merge appends
+    its own 'files' after it. Only the last step's output is written to disk.
+    Path handling, validation and error semantics match run_tool, and every step gets its own trace row
+    (linked through args["pipeline"]). Tools without a transform() (redact) cannot be used in a pipeline.
+    Each input is mapped only while its step reads it (core.inputs); the document handed from step
+    to step is an in-memory PdfWriter holding copies of the pages.
+    """
+    with open_inputs():
+        return _run_pipeline(steps, session_id)
+
+def _run_pipeline(steps: list[dict], session_id: str | None):
+    if not steps:
+        raise ValueError("A pipeline needs at least one step.")
+
+    pipeline_id = uuid.uuid4().hex
+    document = None # PdfWriter handed from step to step
+    source_path = None # The input file the in-memory document descends from; names default outputs
+    final_output = None
+
+    for index, step in enumerate(steps):
+        tool_name = step.get('tool')
+        original_args = dict(step.get('args') or {})
+        args = original_args.copy()
+        step_info = {"id": pipeline_id, "step": index + 1, "of": len(steps)}
+        is_last_step = index == len(steps) - 1
+        primary_in_hash = None
+
+        try:
+            tool_spec = get_tool(tool_name)
+            if not tool_spec.supports_pipeline:
+                raise ValueError(f"Tool '{tool_name}' cannot be used in a pipeline.")
+            if document is not None and 'file' in args:
+                raise ValueError(f"Pipeline step {index + 1} ({tool_name}): 'file' is taken from the previous step and must not be given.")
+
+            input_paths = _prepare_path_args(tool_spec, args, session_id, source_path=source_path)
+            if document is not None and 'file' in tool_spec.schema.model_fields:
+                args['file'] = source_path # Already validated by the first step; only used for naming
+            input_hashes = hash_files(input_paths)
+            if document is None and input_hashes:
+                primary_in_hash = input_hashes[0]
+            if source_path is None:
+                source_path = args.get('file') or (args.get('files') or [None])[0]
+
+            logging.info(f"Pipeline {pipeline_id} step {index + 1}/{len(steps)}: {tool_name} with processed args: {args} (Session: {session_id})")
+            try:
+                processed_final_args = tool_spec.validate(args)
+                document = tool_spec.module.transform(processed_final_args, source=document)
+            except ValidationError as e:
+                error_message = f"Error in run_pipeline ({tool_name}, step {index + 1}, Session: {session_id}): Validation error - {e}"
+                logging.error(error_message)
+                log_trace(tool_name, dict(original_args, pipeline=step_info), primary_in_hash, None, status="error", error_message=str(e))
+                raise
+
+            out_hash = None
+            if is_last_step:
+                final_output = _output_target(tool_spec, processed_final_args)
+                outputs = OutputSinks()
+                with outputs.open(final_output, page_count=len(document.pages)) as fp:
+                    document.write(fp)
+                out_hash = outputs.get(final_output).sha256
+
+            log_trace(tool_name, dict(args, pipeline=step_info), primary_in_hash, out_hash, status="success")
+
+        except ValidationError:
+            raise # Already logged above
+        except FileNotFoundError as e:
+            logging.error(f"Error in run_pipeline ({tool_name}, step {index + 1}, Session: {session_id}): File not found - {e}")
+            log_trace(tool_name, dict(original_args, pipeline=step_info), primary_in_hash, None, status="error", error_message=str(e))
+            raise
+        except ValueError as e:
+            logging.error(f"Error in run_pipeline ({tool_name}, step {index + 1}, Session: {session_id}): Validation error or invalid arguments - {e}")
+            log_trace(tool_name, dict(original_args, pipeline=step_info), primary_in_hash, None, status="error", error_message=str(e))
+            raise
+        except ImportError as e:
+            logging.error(f"Error in run_pipeline ({tool_name}, step {index + 1}, Session: {session_id}): Tool module not found - {e}")
+            log_trace(tool_name, dict(original_args, pipeline=step_info), None, None, status="error", error_message=str(e))
+            raise
+        except Exception as e:
+            logging.error(f"An unexpected error occurred in run_pipeline ({tool_name}, step {index + 1}, Session: {session_id}): {e}", exc_info=True)
+            log_trace(tool_name, dict(original_args, pipeline=step_info), primary_in_hash, None, status="error", error_message=str(e))
+            raise
+
+    return _present_output(final_output, session_id)
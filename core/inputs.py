@@ -0,0 +1,174 @@
+import io
+import os
+import mmap
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+# Input layer: input files are read through read-only mmaps, so hashing (core.secure.hash_file) and the
+# tools' PdfReaders (mapped_reader) read straight from the page cache; nothing is copied
+# into a per-consumer buffer the way PdfReader(path) copies the whole file.
+# Each consumer maps the file only for as long as it needs it (the hash, one merge input), so a request
+# over many large inputs never holds them all mapped at once; that would not fit under the sandbox's
+# address-space limit (core.sandbox). A buffer opened into the request's InputSet (buffer_for, for
+# inputs a tool reads several times, e.g. a stamp image) is shared by every consumer until the request ends.
+# Outputs are always written to a new file and renamed into place (core.sink), so a mapped input
+# is never truncated under a reader, even when a tool writes over its own input path.
+# Keep this module free of Django imports: tools use it inside worker processes too.
+
+class InputBuffer:
+    """One input file mapped read-only. Empty files (which cannot be mapped) are served from b""."""
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.stat.st_size else b""
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def stream(self) -> "MappedStream":
+        """A new file-like view with its own position, so several readers can share the mapping."""
+        return MappedStream(self.data)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self) -> "InputBuffer":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class MappedStream(io.RawIOBase):
+    """Seekable, read-only binary stream over a mapping (or bytes). Each read copies only the bytes asked for."""
+    def __init__(self, data):
+        self._data = data
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._data) if size is None or size < 0 else min(self._pos + size, len(self._data))
+        chunk = self._data[self._pos:end]
+        self._pos = max(self._pos, end)
+        return chunk
+
+    def readinto(self, b) -> int:
+        chunk = self.read(len(b))
+        b[:len(chunk)] = chunk
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = len(self._data) + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if self._pos < 0:
+            raise ValueError("Negative seek position")
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+class InputSet:
+    """
+    The shared mapped inputs of one request, keyed by resolved path. Buffers are opened by buffer_for()
+    on first use and all closed together by close(). A file that changed on disk since it was mapped is mapped again.
+    """
+    def __init__(self):
+        self._buffers: dict[str, InputBuffer] = {}
+        self._stale: list[InputBuffer] = [] # Replaced mappings may still back a reader; closed with the set
+
+    def open(self, path: str) -> InputBuffer:
+        key = str(Path(path).resolve())
+        buffer = self._buffers.get(key)
+        if buffer is not None:
+            st = os.stat(key)
+            if (st.st_ino, st.st_size, st.st_mtime_ns) == (buffer.stat.st_ino, buffer.stat.st_size, buffer.stat.st_mtime_ns):
+                return buffer
+            self._stale.append(buffer)
+        buffer = self._buffers[key] = InputBuffer(key)
+        return buffer
+
+    def get(self, path: str) -> InputBuffer | None:
+        """The buffer of path if it is already open in this set (never opens a new one)."""
+        return self._buffers.get(str(Path(path).resolve()))
+
+    def close(self):
+        for buffer in [*self._buffers.values(), *self._stale]:
+            buffer.close()
+        self._buffers.clear()
+        self._stale.clear()
+
+_current: ContextVar[InputSet | None] = ContextVar("pdfshell_inputs", default=None)
+
+@contextmanager
+def open_inputs():
+    """
+    Makes a fresh InputSet current for the enclosed block (one engine request) and closes it afterwards.
+    Nested uses share the outer set.
+    """
+    if _current.get() is not None:
+        yield _current.get()
+        return
+    inputs = InputSet()
+    token = _current.set(inputs)
+    try:
+        yield inputs
+    finally:
+        _current.reset(token)
+        inputs.close()
+
+def current() -> InputSet | None:
+    return _current.get()
+
+def buffer_for(path: str) -> InputBuffer | None:
+    """The mapped buffer of path shared for the rest of the request, opening it if needed; None outside a request."""
+    inputs = _current.get()
+    return inputs.open(path) if inputs is not None else None
+
+def _shared(path: str) -> InputBuffer | None:
+    inputs = _current.get()
+    return inputs.get(path) if inputs is not None else None
+
+@contextmanager
+def mapped(path: str):
+    """
+    The buffer of path for the enclosed block: the request's shared buffer when one is already open,
+    otherwise a mapping of its own that is closed on exit.
+    """
+    buffer = _shared(path)
+    if buffer is not None:
+        yield buffer
+        return
+    with InputBuffer(path) as buffer:
+        yield buffer
+
+def read_head(path: str, size: int) -> bytes:
+    """The first size bytes of path (for magic-number checks); reads the file unless it is already mapped."""
+    buffer = _shared(path)
+    if buffer is not None:
+        return buffer.data[:size]
+    with open(path, "rb") as f:
+        return f.read(size)
+
+@contextmanager
+def mapped_reader(path: str):
+    """
+    A PdfReader over path for the enclosed block, on the request's shared buffer when one is already
+    open; a mapping opened for it is closed on exit. PdfWriter.add_page copies what it takes, so a
+    writer built in the block stays valid afterwards.
+    """
+    from pypdf import PdfReader
+    with mapped(path) as buffer:
+        yield PdfReader(buffer.stream())
@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever the on-disk layout or the key recipe changes, so old entries are never reused.
+RESULT_CACHE_VERSION = 2
+
+META_FILENAME = "meta.json"
+ARTIFACTS_DIRNAME = "artifacts"
+
+# Linux FICLONE ioctl (copy-on-write clone on btrfs/xfs). Falls back to a plain copy elsewhere.
+_FICLONE = 0x40049409
+
+_stats_lock = threading.Lock()
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "stores": 0,
+    "evictions": 0,
+    "bypassed": 0,
+}
+
+def _bump(counter: str, amount: int = 1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+def stats() -> dict:
+    """
+    Returns a snapshot of the in-process cache counters (hits, misses, stores, evictions, bypassed).
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+def record_bypass():
+    """Counts a run_tool call that explicitly opted out of the cache."""
+    _bump("bypassed")
+
+def is_enabled() -> bool:
+    return bool(getattr(settings, 'PDF_RESULT_CACHE_ENABLED', False))
+
+def _cache_root() -> Path:
+    return Path(getattr(settings, 'PDF_RESULT_CACHE_ROOT', settings.BASE_DIR / "cache" / "results"))
+
+def _entry_dir(key: str) -> Path:
+    return _cache_root() / key[:2] / key
+
+def make_key(tool_name: str, args: dict, input_hashes: list[str], path_keys: list[str]) -> str:
+    """
+    Builds the content address of a tool run.
+    Path arguments are dropped (they only say *where* the bytes live); their content is represented
+    by input_hashes, in the same order the engine processed them. All other arguments are
+    canonicalized with sorted keys so that equivalent calls map to the same key.
+    Artifacts written into an output_dir are named after the inputs (split writes <stem>_split.pdf)
+    and fetch() places them under their stored names, so for those runs the input file names are
+    part of the key too.
+    """
+    non_path_args = {k: v for k, v in args.items() if k not in path_keys}
+    for key in path_keys:
+        list_key, _, item_key = key.partition("[].")
+        if item_key and isinstance(non_path_args.get(list_key), list): # e.g. "stamps[].stamp_path"
+            non_path_args[list_key] = [{k: v for k, v in item.items() if k != item_key} if isinstance(item, dict) else item for item in non_path_args[list_key]]
+    payload = {
+        "v": RESULT_CACHE_VERSION,
+        "tool": tool_name,
+        "args": non_path_args,
+        "inputs": list(input_hashes),
+    }
+    if args.get('output_dir'):
+        payload["names"] = _input_names(args, path_keys)
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def _input_names(args: dict, path_keys: list[str]) -> list[str]:
+    """File names of the top-level input path arguments, in path_keys order."""
+    names = []
+    for key in path_keys:
+        value = args.get(key)
+        if key == 'output_dir' or "[]." in key or not value:
+            continue
+        names.extend(Path(v).name for v in (value if isinstance(value, list) else [value]))
+    return names
+
+def _output_key_for(result, args: dict) -> str | None:
+    """
+    Determines which output argument the tool result is anchored to.
+    Only results written exactly to args['output'] or inside args['output_dir'] can be re-materialized later.
+    """
+    paths = result if isinstance(result, list) else [result]
+    if not paths or not all(isinstance(p, str) for p in paths):
+        return None
+    if args.get('output') and len(paths) == 1 and Path(paths[0]) == Path(args['output']):
+        return 'output'
+    if args.get('output_dir'):
+        output_dir = Path(args['output_dir']).resolve()
+        if all(Path(p).resolve().parent == output_dir for p in paths):
+            return 'output_dir'
+    return None
+
+def _clone_file(src: Path, dst: Path) -> str:
+    """
+    Places a copy of src at dst using the cheapest safe mechanism: reflink, then copy.
+    Never a hardlink: the cache entry and the user's file must not share an inode, since either
+    could be edited in place later. dst is replaced atomically. Returns the mechanism used (for logging).
+    """
+    tmp_dst = dst.with_name(f".{dst.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    if tmp_dst.exists():
+        tmp_dst.unlink()
+    method = None
+    try:
+        import fcntl
+        with open(src, "rb") as fsrc, open(tmp_dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        method = "reflink"
+    except (ImportError, OSError):
+        if tmp_dst.exists():
+            tmp_dst.unlink()
+    if method is None:
+        shutil.copyfile(src, tmp_dst)
+        method = "copy"
+    os.replace(tmp_dst, dst)
+    return method
+
+def fetch(key: str, args: dict):
+    """
+    Looks up a cached result and materializes its artifact(s) at the locations requested in args.
+    Returns (tool_output, out_hashes) on a hit, or None on a miss; out_hashes lists the sha256 of
+    every artifact in output order.
+    """
+    entry_dir = _entry_dir(key)
+    meta_path = entry_dir / META_FILENAME
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        _bump("misses")
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Result cache: unreadable entry {key}, discarding it: {e}")
+        _remove_entry(entry_dir)
+        _bump("misses")
+        return None
+
+    output_key = meta.get("output_key")
+    if not args.get(output_key):
+        _bump("misses")
+        return None
+
+    max_age = getattr(settings, 'PDF_RESULT_CACHE_MAX_AGE_SECONDS', None)
+    if max_age and time.time() - meta.get("created_at", 0) > max_age:
+        logger.info(f"Result cache: entry {key} expired, discarding it.")
+        _remove_entry(entry_dir)
+        _bump("misses")
+        return None
+
+    artifacts = meta.get("artifacts", [])
+    materialized = []
+    try:
+        for artifact in artifacts:
+            src = entry_dir / ARTIFACTS_DIRNAME / artifact["name"]
+            if src.stat().st_size != artifact["size"]:
+                raise ValueError(f"size mismatch for artifact {artifact['name']}")
+            if output_key == 'output':
+                dst = Path(args['output'])
+            else:
+                dst = Path(args['output_dir']) / artifact["name"]
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            method = _clone_file(src, dst)
+            logger.info(f"Result cache: materialized {artifact['name']} at {dst} via {method}")
+            materialized.append(str(dst))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Result cache: entry {key} is damaged ({e}), discarding it.")
+        _remove_entry(entry_dir)
+        _bump("misses")
+        return None
+
+    # Touch the metadata file: its mtime is the LRU clock used by eviction.
+    try:
+        os.utime(meta_path, None)
+    except OSError:
+        pass
+
+    _bump("hits")
+    tool_output = materialized if meta.get("is_list") else materialized[0]
+    return tool_output, [artifact.get("sha256") for artifact in artifacts]
+
+def store(key: str, tool_name: str, result, args: dict, out_hashes: dict[str, str | None]):
+    """
+    Copies the artifact(s) produced by a successful tool run into the cache under key.
+    Results that are not anchored to an output argument are not cached.
+    Failures are logged and never propagate to the caller.
+    """
+    output_key = _output_key_for(result, args)
+    if output_key is None:
+        logger.info(f"Result cache: result of {tool_name} is not anchored to an output argument, not caching.")
+        return
+
+    entry_dir = _entry_dir(key)
+    if (entry_dir / META_FILENAME).exists():
+        return
+
+    paths = result if isinstance(result, list) else [result]
+    staging_dir = entry_dir.parent / f".{key}.{os.getpid()}.{threading.get_ident()}.staging"
+    try:
+        (staging_dir / ARTIFACTS_DIRNAME).mkdir(parents=True, exist_ok=True)
+        artifacts = []
+        total_size = 0
+        for p in paths:
+            src = Path(p)
+            dst = staging_dir / ARTIFACTS_DIRNAME / src.name
+            _clone_file(src, dst)
+            size = dst.stat().st_size
+            total_size += size
+            artifacts.append({"name": src.name, "size": size, "sha256": out_hashes.get(p)})
+        meta = {
+            "version": RESULT_CACHE_VERSION,
+            "tool": tool_name,
+            "output_key": output_key,
+            "is_list": isinstance(result, list),
+            "artifacts": artifacts,
+            "size": total_size,
+            "created_at": time.time(),
+        }
+        (staging_dir / META_FILENAME).write_text(json.dumps(meta), encoding="utf-8")
+        try:
+            os.rename(staging_dir, entry_dir)
+        except OSError:
+            # Another worker stored the same key first; keep theirs.
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return
+        _bump("stores")
+        logger.info(f"Result cache: stored {tool_name} result under {key} ({total_size} bytes)")
+    except Exception as e:
+        logger.warning(f"Result cache: failed to store result for {tool_name}: {e}", exc_info=True)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return
+
+    evict()
+
+def _remove_entry(entry_dir: Path):
+    shutil.rmtree(entry_dir, ignore_errors=True)
+
+def evict() -> int:
+    """
+    Enforces the age and size limits of the cache.
+    Expired entries go first, then least-recently-used entries until the total size fits the budget.
+    Returns the number of entries removed.
+    """
+    root = _cache_root()
+    if not root.is_dir():
+        return 0
+
+    max_bytes = getattr(settings, 'PDF_RESULT_CACHE_MAX_BYTES', None)
+    max_age = getattr(settings, 'PDF_RESULT_CACHE_MAX_AGE_SECONDS', None)
+    now = time.time()
+
+    entries = []
+    for meta_path in root.glob(f"*/*/{META_FILENAME}"):
+        try:
+            last_used = meta_path.stat().st_mtime
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            entries.append((last_used, meta.get("created_at", 0), meta.get("size", 0), meta_path.parent))
+        except (OSError, ValueError):
+            continue
+
+    removed = 0
+    remaining = []
+    for last_used, created_at, size, entry_dir in entries:
+        if max_age and now - created_at > max_age:
+            _remove_entry(entry_dir)
+            removed += 1
+        else:
+            remaining.append((last_used, size, entry_dir))
+
+    if max_bytes:
+        total = sum(size for _, size, _ in remaining)
+        for last_used, size, entry_dir in sorted(remaining, key=lambda e: e[0]):
+            if total <= max_bytes:
+                break
+            _remove_entry(entry_dir)
+            total -= size
+            removed += 1
+
+    if removed:
+        _bump("evictions", removed)
+        logger.info(f"Result cache: evicted {removed} entries.")
+    return removed
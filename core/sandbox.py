@@ -0,0 +1,289 @@
+import os
+import math
+import queue
+import atexit
+import signal
+import logging
+import threading
+import multiprocessing
+from dataclasses import dataclass
+from concurrent.futures import Executor, Future
+from django.conf import settings
+from tools.registry import get_registry
+from .worker import mark_sandbox_worker
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = {'memory_mb': 1024, 'cpu_seconds': 60, 'timeout_seconds': 120}
+
+class ToolRunKilled(RuntimeError):
+    """A sandboxed tool run was stopped for exceeding its limits, or its worker process died."""
+
+@dataclass(frozen=True)
+class SandboxLimits:
+    """
+    Per-run limits. memory_mb caps the worker's whole address space (RLIMIT_AS), cpu_seconds the CPU
+    time of this run (RLIMIT_CPU), timeout_seconds the wall-clock time the caller waits. None disables a limit.
+    """
+    memory_mb: int | None = None
+    cpu_seconds: int | None = None
+    timeout_seconds: float | None = None
+
+def limits_for(tool_name: str) -> SandboxLimits:
+    """PDF_SANDBOX_LIMITS[tool_name] on top of PDF_SANDBOX_LIMITS['default']."""
+    configured = getattr(settings, 'PDF_SANDBOX_LIMITS', {})
+    values = dict(DEFAULT_LIMITS, **configured.get('default', {}))
+    values.update(configured.get(tool_name, {}))
+    return SandboxLimits(**values)
+
+def _tool_settings() -> dict:
+    """The PDF_* settings of this process, sent with every job (overrides made at runtime included)."""
+    return {name: getattr(settings, name) for name in dir(settings) if name.startswith("PDF_")}
+
+# --- Worker side (runs in the forked process; no Django access beyond django.conf.settings) ---
+
+def _apply_limits(limits: SandboxLimits):
+    import resource
+    if limits.memory_mb is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (limits.memory_mb * 1024 * 1024, hard))
+    if limits.cpu_seconds is not None:
+        # RLIMIT_CPU counts the whole life of the process, so the budget starts at what this worker used so far
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = math.ceil(usage.ru_utime + usage.ru_stime + limits.cpu_seconds)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+
+def _clear_limits():
+    import resource
+    for limit in (resource.RLIMIT_AS, resource.RLIMIT_CPU):
+        _, hard = resource.getrlimit(limit)
+        resource.setrlimit(limit, (hard, hard))
+
+def _apply_settings(values: dict):
+    """Makes the caller's PDF_* settings current in this worker, so tools see the same configuration."""
+    from django.conf import settings as worker_settings
+    for name, value in values.items():
+        setattr(worker_settings, name, value)
+
+def _worker_main(conn, initializer=None, initargs=()):
+    """Runs jobs sent over conn until it is closed. A run that hits the memory cap ends the worker."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl-C is handled by the parent
+    os.setpgid(0, 0) # Own process group, so a killed run takes the tool's child processes with it
+    mark_sandbox_worker()
+    if initializer is not None:
+        try:
+            initializer(*initargs)
+        except Exception as e: # A failed warm-up only costs speed; the worker still serves jobs
+            logger.warning(f"Sandbox worker initializer failed: {type(e).__name__}: {e}")
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        except Exception as e: # The job could not be unpickled here (e.g. its function's module fails to import)
+            conn.send(("error", RuntimeError(f"Sandbox worker could not load the job: {type(e).__name__}: {e}")))
+            continue
+        if job is None:
+            return
+        fn, args, kwargs, limits, tool_settings = job
+        _apply_settings(tool_settings)
+        _apply_limits(limits)
+        try:
+            reply = ("ok", fn(*args, **kwargs))
+        except MemoryError:
+            _clear_limits()
+            conn.send(("killed", f"memory limit of {limits.memory_mb} MB exceeded"))
+            return # The heap may be left fragmented; let the pool start a fresh worker
+        except Exception as e:
+            reply = ("error", e)
+        _clear_limits()
+        try:
+            conn.send(reply)
+        except Exception as e: # Result or exception not picklable
+            conn.send(("error", RuntimeError(f"{type(e).__name__}: {e}")))
+
+# --- Parent side ---
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.tasks = 0
+
+    def stop(self, kill: bool = False):
+        if kill and self.process.is_alive():
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL) # The worker and any pool a tool started in it
+            except OSError:
+                self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+class SandboxPool:
+    """
+    A fixed set of pre-forked worker processes that run tool calls under per-run resource limits.
+    Workers are forked from a forkserver that imported every tool module first, so a fresh worker
+    starts warm. A run that exceeds its memory, CPU or wall-clock limit, or whose worker dies, raises
+    ToolRunKilled and its worker is replaced; workers are also recycled after max_tasks_per_worker runs.
+    Workers are not daemonic, so tools can start their own process pools in them (merge parsing,
+    split writing); the pool tracks every worker and kills the busy ones on shutdown. Those children
+    inherit the worker's resource limits, each on its own. initializer(*initargs), if given, runs
+    in every worker (replacements included) before its first job, like ProcessPoolExecutor's.
+    """
+    def __init__(self, workers: int, max_tasks_per_worker: int | None = None, initializer=None, initargs: tuple = ()):
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self._initializer = initializer
+        self._initargs = initargs
+        self._ctx = multiprocessing.get_context("forkserver")
+        self._ctx.set_forkserver_preload([__name__] + sorted(spec.module.__name__ for spec in get_registry().values()))
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        self._live: set[_Worker] = set() # Idle and busy workers
+        self._live_lock = threading.Lock()
+        self._workers = max(1, workers)
+        self._closed = False
+        for _ in range(self._workers):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(target=_worker_main, args=(child_conn, self._initializer, self._initargs), name="pdfshell-sandbox", daemon=False)
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        with self._live_lock:
+            self._live.add(worker)
+        return worker
+
+    def _retire(self, worker: _Worker, kill: bool = False):
+        with self._live_lock:
+            self._live.discard(worker)
+        worker.stop(kill=kill)
+
+    def _death_reason(self, worker: _Worker, limits: SandboxLimits) -> str:
+        worker.process.join(1)
+        exitcode = worker.process.exitcode
+        if exitcode == -signal.SIGXCPU:
+            return f"CPU time limit of {limits.cpu_seconds}s exceeded"
+        if exitcode == -signal.SIGKILL:
+            return "worker process was killed (out of memory?)"
+        return f"worker process exited unexpectedly (exit code {exitcode})"
+
+    def run(self, tool_name: str, limits: SandboxLimits, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) in a worker under limits and returns its result. Blocks until a worker is free."""
+        if self._closed:
+            raise RuntimeError("Sandbox pool is shut down.")
+        worker = self._idle.get()
+        retire = False
+        try:
+            try:
+                worker.conn.send((fn, args, kwargs, limits, _tool_settings()))
+                if not worker.conn.poll(limits.timeout_seconds):
+                    retire = True
+                    raise ToolRunKilled(f"Tool '{tool_name}' was stopped: wall-clock timeout of {limits.timeout_seconds}s exceeded")
+                status, value = worker.conn.recv()
+            except (EOFError, OSError):
+                retire = True
+                raise ToolRunKilled(f"Tool '{tool_name}' was stopped: {self._death_reason(worker, limits)}")
+            worker.tasks += 1
+            if status == "killed":
+                retire = True
+                raise ToolRunKilled(f"Tool '{tool_name}' was stopped: {value}")
+            if status == "error":
+                raise value
+            return value
+        finally:
+            if self._closed:
+                self._retire(worker, kill=retire)
+            elif retire or (self.max_tasks_per_worker and worker.tasks >= self.max_tasks_per_worker):
+                self._retire(worker, kill=retire)
+                if retire:
+                    logger.warning(f"Sandbox: replaced worker after a killed run of {tool_name}.")
+                self._idle.put(self._spawn())
+            else:
+                self._idle.put(worker)
+
+    def executor_for(self, tool_name: str) -> "SandboxExecutor":
+        return SandboxExecutor(self, tool_name, limits_for(tool_name))
+
+    def shutdown(self):
+        """Stops the idle workers and kills the busy ones (their runs raise ToolRunKilled)."""
+        self._closed = True
+        while True:
+            try:
+                self._retire(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        with self._live_lock:
+            busy = list(self._live)
+        for worker in busy:
+            self._retire(worker, kill=True)
+
+class SandboxExecutor(Executor):
+    """Executor view of a SandboxPool for one tool, so it can be passed as run_tool(tool_executor=...)."""
+    def __init__(self, pool: SandboxPool, tool_name: str, limits: SandboxLimits):
+        self.pool = pool
+        self.tool_name = tool_name
+        self.limits = limits
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        def _run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self.pool.run(self.tool_name, self.limits, fn, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+        threading.Thread(target=_run, name=f"pdfshell-sandbox-{self.tool_name}", daemon=True).start()
+        return future
+
+_pool: SandboxPool | None = None
+_pool_pid: int | None = None
+_pool_lock = threading.Lock()
+
+def is_enabled() -> bool:
+    return getattr(settings, 'PDF_SANDBOX_ENABLED', False) and "forkserver" in multiprocessing.get_all_start_methods()
+
+def shared_stamp_paths() -> list[str]:
+    """The DEFAULT_SHARED_FILES stamps to decode at startup, or none when PDF_STAMP_WARMUP is off."""
+    if not getattr(settings, 'PDF_STAMP_WARMUP', True):
+        return []
+    return [str(settings.PDF_FILES_ROOT / name) for name in getattr(settings, 'DEFAULT_SHARED_FILES', [])]
+
+def get_pool() -> SandboxPool:
+    """Returns this process's sandbox pool, starting its workers on first use."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            from tools.add_stamp import warm_stamp_images
+            stamps = shared_stamp_paths()
+            _pool = SandboxPool(
+                workers=getattr(settings, 'PDF_SANDBOX_WORKERS', os.cpu_count() or 1),
+                max_tasks_per_worker=getattr(settings, 'PDF_SANDBOX_MAX_TASKS_PER_WORKER', None),
+                # add_stamp runs in the workers, so that is where the shared stamps must be decoded
+                initializer=warm_stamp_images if stamps else None,
+                initargs=(stamps,),
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+def executor_for(tool_name: str) -> SandboxExecutor:
+    return get_pool().executor_for(tool_name)
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown()
+        _pool = None
+
+atexit.register(shutdown_pool)
@@ -1,12 +1,39 @@
 import os
 import hashlib
+import contextvars
 import mimetypes
 import logging
 from pathlib import Path
 from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from .alert import notify_slack
+from . import digest_cache
+from . import inputs
+
+try:
+    import xxhash # Optional: only used for fast internal cache keys
+except ImportError:
+    xxhash = None
 
 MAX_SIZE_MB = 25
+HASH_BUFFER_SIZE = 1024 * 1024 # 1 MB read buffer for algorithms hashlib.file_digest cannot handle
+PARALLEL_HASH_MIN_BYTES = 4 * 1024 * 1024 # Below this, thread start-up costs more than it saves
+MAGIC_SCAN_BYTES = 1024 # PDF readers accept a %PDF- header anywhere in the first 1024 bytes
+
+# Leading bytes each accepted MIME type must have; the extension alone is easy to fake
+MAGIC_NUMBERS = {
+    "application/pdf": b"%PDF-",
+    "image/png": b"\x89PNG\r\n\x1a\n",
+    "image/jpeg": b"\xff\xd8\xff",
+    "image/jpg": b"\xff\xd8\xff",
+}
+
+def _has_magic(path: Path, mime_type: str) -> bool:
+    magic = MAGIC_NUMBERS.get(mime_type)
+    if magic is None:
+        return True
+    head = inputs.read_head(str(path), MAGIC_SCAN_BYTES)
+    return magic in head if mime_type == "application/pdf" else head.startswith(magic)
 
 def validate(
     full_path_str: str, 
@@ -87,13 +114,56 @@ def validate(
             error_message = f"Invalid file type for '{full_path.name}': {mime_type}. Accepted types are: {', '.join(accepted_mime_types)}."
             # notify_slack(f"❌ PDFShell Validation Error: {error_message} (Path: {full_path}, Session: {session_id})")
             raise ValueError(error_message)
+
+        if not _has_magic(full_path, mime_type):
+            logging.warning(f"File validation failed: {full_path} does not start with the signature of {mime_type}.")
+            error_message = f"Invalid file content for '{full_path.name}': not a valid {mime_type} file."
+            raise ValueError(error_message)
     
     logging.info(f"Path validation successful for: {full_path} (Input: {is_input}, Session: {session_id})")
     return True
 
-def hash_file(path: str) -> str:
+def _new_hasher(algorithm: str):
+    """
+    Returns a fresh hash object for algorithm.
+    'xxh3_128' / 'xxh64' come from the optional xxhash package; everything else from hashlib.
+    """
+    if algorithm.startswith("xxh"):
+        if xxhash is None:
+            raise ValueError(f"Digest algorithm '{algorithm}' requires the optional 'xxhash' package.")
+        return getattr(xxhash, algorithm)()
+    return hashlib.new(algorithm)
+
+def _digest_file(path: str, algorithm: str) -> str:
+    """
+    Streams a file through the requested digest with large buffers.
+    hashlib.file_digest reads straight into a reusable buffer and releases the GIL while hashing.
+    Inside a request (core.inputs) the file is hashed from a read-only mapping that is closed right
+    after, so hashing many large inputs never keeps them all mapped.
+    """
+    if inputs.current() is not None:
+        with inputs.mapped(path) as buffer:
+            h = _new_hasher(algorithm)
+            h.update(buffer.data)
+            return h.hexdigest()
+    with open(path, "rb") as f:
+        if algorithm in hashlib.algorithms_available and hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, algorithm).hexdigest()
+        h = _new_hasher(algorithm)
+        buffer = bytearray(HASH_BUFFER_SIZE)
+        view = memoryview(buffer)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            h.update(view[:n])
+        return h.hexdigest()
+
+def hash_file(path: str, algorithm: str = "sha256") -> str:
     """
-    Calculates the SHA-256 hash of a file.
+    Calculates the digest of a file (SHA-256 unless another algorithm is requested).
+    Digests are memoized by (device, inode, size, mtime_ns) in core.digest_cache,
+    so an unchanged file is only read once across requests and worker processes.
     """
     # Ensure file exists before hashing
     if not os.path.exists(path) or not os.path.isfile(path):
@@ -101,22 +171,63 @@ def hash_file(path: str) -> str:
         # Depending on desired behavior, could raise error or return a specific value
         raise FileNotFoundError(f"File not found for hashing: {path}")
 
-    h = hashlib.sha256()
+    st_before = os.stat(path)
+    cached_digest = digest_cache.lookup(st_before, algorithm)
+    if cached_digest:
+        logging.info(f"Hashed file {path}: {cached_digest} (digest cache)")
+        return cached_digest
+
     try:
-        with open(path, "rb") as f:
-            while True:
-                chunk = f.read(4096) # Read in 4KB chunks
-                if not chunk:
-                    break
-                h.update(chunk)
+        hex_digest = _digest_file(path, algorithm)
     except IOError as e:
         logging.error(f"Could not read file for hashing {path}: {e}")
         raise IOError(f"Could not read file for hashing {path}: {e}")
-        
-    hex_digest = h.hexdigest()
+
+    digest_cache.record_hashed(st_before.st_size)
+    digest_cache.store(path, st_before, hex_digest, algorithm)
     logging.info(f"Hashed file {path}: {hex_digest}")
     return hex_digest
 
+def _hash_workers() -> int:
+    from django.conf import settings
+    default_workers = min(4, os.cpu_count() or 1)
+    if not settings.configured:
+        return default_workers
+    return getattr(settings, 'PDF_HASH_WORKERS', default_workers)
+
+def hash_files(paths: List[str], algorithm: str = "sha256", max_workers: Optional[int] = None) -> List[str]:
+    """
+    Hashes several files and returns their digests in the order of paths.
+    Each distinct path is hashed once. When there is enough data, files are hashed
+    concurrently in threads (hashlib releases the GIL on large updates).
+    """
+    unique_paths = list(dict.fromkeys(paths))
+    if max_workers is None:
+        max_workers = _hash_workers()
+
+    total_bytes = 0
+    for p in unique_paths:
+        try:
+            total_bytes += os.path.getsize(p)
+        except OSError:
+            pass # hash_file raises the proper FileNotFoundError below
+
+    if max_workers <= 1 or len(unique_paths) < 2 or total_bytes < PARALLEL_HASH_MIN_BYTES:
+        digests = {p: hash_file(p, algorithm) for p in unique_paths}
+    else:
+        context = contextvars.copy_context() # Hash threads see the request's mapped inputs too
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(unique_paths)), thread_name_prefix="pdfshell-hash") as executor:
+            digests = dict(zip(unique_paths, executor.map(lambda p: context.copy().run(hash_file, p, algorithm), unique_paths)))
+    return [digests[p] for p in paths]
+
+def fast_digest_algorithm() -> str:
+    """
+    Non-cryptographic digest for internal cache keys: xxh3_128 when xxhash is installed,
+    otherwise BLAKE2b, which is still considerably faster than SHA-256 in software.
+    Audit columns (Operation.in_hash / out_hash) always stay SHA-256.
+    """
+    return "xxh3_128" if xxhash is not None else "blake2b"
+
 # Placeholder for stripping JavaScript or other potentially malicious content from PDFs.
 # This is a complex task and pypdf itself has some capabilities that can be explored.
 # For MVP, this might be out of scope or a very basic attempt.
@@ -0,0 +1,134 @@
+import os
+import hashlib
+import logging
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Read the process umask once so committed files get the same permissions as a plain open(path, "wb").
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+@dataclass(frozen=True)
+class OutputResult:
+    """Digest and size of one committed output file."""
+    path: str
+    sha256: str
+    size: int
+    page_count: int | None = None
+    bytes_saved: int | None = None # Bytes the tool avoided writing (e.g. merge's shared-resource dedup)
+
+class OutputSink:
+    """
+    Write-only binary stream for a tool output.
+    Every byte is teed through SHA-256 and counted as it is written, so the engine gets the
+    digest and size without reading the file back. Data goes to a temporary file next to the
+    target and is renamed over it on commit, so readers never see a half-written output.
+    Used as a context manager: commits on success, discards the temporary file on error.
+    """
+    mode = "wb"
+
+    def __init__(self, path: str, on_commit=None, page_count: int | None = None):
+        self.path = str(path)
+        self.page_count = page_count
+        self.bytes_saved: int | None = None # Set by tools that deduplicate what they write
+        self._target = Path(path)
+        self._hasher = hashlib.sha256()
+        self._size = 0
+        self._on_commit = on_commit
+        self._result: OutputResult | None = None
+        fd, self._tmp_path = tempfile.mkstemp(dir=self._target.parent, prefix=f".{self._target.name}.", suffix=".tmp")
+        os.fchmod(fd, 0o666 & ~_UMASK)
+        self._file = os.fdopen(fd, "wb")
+
+    @property
+    def name(self) -> str:
+        return self.path
+
+    def write(self, data) -> int:
+        self._file.write(data)
+        self._hasher.update(data)
+        n = len(data) if not isinstance(data, memoryview) else data.nbytes
+        self._size += n
+        return n
+
+    def tell(self) -> int:
+        # PdfWriter records object offsets with tell(); this sink is strictly sequential.
+        return self._size
+
+    def flush(self):
+        self._file.flush()
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    @property
+    def result(self) -> OutputResult | None:
+        return self._result
+
+    def commit(self) -> OutputResult:
+        if self._result is not None:
+            return self._result
+        self._file.close()
+        os.replace(self._tmp_path, self._target)
+        self._result = OutputResult(self.path, self._hasher.hexdigest(), self._size, self.page_count, self.bytes_saved)
+        if self._on_commit:
+            self._on_commit(self._result)
+        return self._result
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.unlink(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        self.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+class OutputSinks:
+    """
+    Collects the outputs a tool writes during one run.
+    The engine passes one instance to tool.run(); tools open every output through it
+    and the engine reads the digests back with get().
+    """
+    def __init__(self):
+        self._results: dict[str, OutputResult] = {}
+
+    def open(self, path: str, page_count: int | None = None) -> OutputSink:
+        """Opens a sink for path. PDF tools pass the page count they are about to write, for the trace."""
+        return OutputSink(path, on_commit=self._remember, page_count=page_count)
+
+    def record(self, path: str, sha256: str, size: int, page_count: int | None = None, bytes_saved: int | None = None):
+        """Registers an output written elsewhere (e.g. by a worker process) together with its digest."""
+        self._remember(OutputResult(str(path), sha256, size, page_count, bytes_saved))
+
+    def _remember(self, result: OutputResult):
+        self._results[str(Path(result.path).resolve())] = result
+
+    def get(self, path: str) -> OutputResult | None:
+        return self._results.get(str(Path(path).resolve()))
+
+    @property
+    def results(self) -> list[OutputResult]:
+        return list(self._results.values())
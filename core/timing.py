@@ -0,0 +1,49 @@
+import time
+import json
+import logging
+from contextlib import contextmanager
+
+metrics_logger = logging.getLogger("pdfshell.metrics")
+
+class StageTimer:
+    """
+    Monotonic per-stage timings for one tool call, plus the size figures stored next to them.
+    Stages that run more than once accumulate. Everything is reported in milliseconds.
+    """
+    def __init__(self):
+        self._started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.bytes_in: int | None = None
+        self.bytes_out: int | None = None
+        self.page_count: int | None = None
+        self.bytes_saved: int | None = None
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - started) * 1000)
+
+    def add(self, name: str, ms: float):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    @property
+    def duration_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def fields(self) -> dict:
+        """Values for the Operation timing columns."""
+        return {
+            "duration_ms": round(self.duration_ms, 3),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "page_count": self.page_count,
+            "bytes_saved": self.bytes_saved,
+            "stages": {name: round(ms, 3) for name, ms in self.stages.items()},
+        }
+
+    def log(self, tool_name: str, status: str, cache_hit: bool = False, session_id: str | None = None):
+        """Emits one structured (JSON) line per tool call on the 'pdfshell.metrics' logger."""
+        metrics_logger.info(json.dumps({"event": "tool_run", "tool": tool_name, "status": status, "cache_hit": cache_hit, "session": session_id, **self.fields()}))
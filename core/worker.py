@@ -0,0 +1,71 @@
+import os
+import importlib
+import multiprocessing
+from .sink import OutputSinks, OutputResult
+from .inputs import open_inputs
+
+# Entry points that run inside executor worker processes.
+# Keep this module free of Django imports so it also works with the spawn/forkserver start methods.
+
+_sandbox_worker = False
+_cpu_share: int | None = None # Set in batch workers: CPUs their own nested pools may use
+
+def set_cpu_share(cpus: int):
+    """Pool initializer of core.batch: tools in that worker start at most cpus processes of their own."""
+    global _cpu_share
+    _cpu_share = max(1, cpus)
+
+def cap_workers(workers: int) -> int:
+    """
+    Caps the size of a pool a tool starts (merge parsing, split writing) by this process's CPU share,
+    so the nested pools of a batch's items do not over-subscribe the CPUs the batch pool already uses.
+    """
+    return max(1, min(workers, _cpu_share)) if _cpu_share is not None else max(1, workers)
+
+def mark_sandbox_worker():
+    """Called by core.sandbox in each of its worker processes."""
+    global _sandbox_worker
+    _sandbox_worker = True
+
+def pool_context():
+    """
+    Multiprocessing context for the process pools of the engine and the tools (batch items, async
+    tool runs, merge parsing, split writing). The web process is threaded, and a forked child can
+    inherit a lock that another thread held at fork time; like the sandbox (core.sandbox), children
+    start from the forkserver instead, or are spawned where forkserver is not available.
+    A sandbox worker runs one job at a time on a single thread, so there children are forked from
+    it directly: they start warm and stay under its resource limits.
+    """
+    if _sandbox_worker:
+        return multiprocessing.get_context("fork")
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+def execute_tool(tool_name: str, args: dict) -> tuple[object, list[OutputResult]]:
+    """
+    Runs tools.<tool_name>.run(args) and returns (tool_output, written outputs).
+    args must already be resolved and validated by the engine. The caller records the
+    returned OutputResults in its own OutputSinks, since sinks cannot cross process boundaries.
+    """
+    tool_module = importlib.import_module(f"tools.{tool_name}")
+    outputs = OutputSinks()
+    with open_inputs(): # Shares the caller's mapped inputs when run in-process (e.g. batch items)
+        tool_output = tool_module.run(args, outputs=outputs)
+    return tool_output, outputs.results
+
+def execute_batch_item(tool_name: str, args: dict, input_paths: list[str]):
+    """
+    Runs one item of core.batch.run_tool_batch inside a worker process.
+    args are already resolved, validated and dumped by the ArgsSchema in the parent.
+    Returns (tool_output, in_hash, out_hashes), out_hashes holding one hash per output path.
+    """
+    from .secure import hash_files # Needs django.conf only, never the app registry
+    with open_inputs():
+        input_hashes = hash_files(input_paths, max_workers=1) # The pool already uses every core
+        tool_output, written = execute_tool(tool_name, args)
+    outputs = OutputSinks()
+    for w in written:
+        outputs.record(w.path, w.sha256, w.size, w.page_count, w.bytes_saved)
+    output_paths = tool_output if isinstance(tool_output, list) else [tool_output]
+    out_hashes = [outputs.get(p).sha256 if isinstance(p, str) and outputs.get(p) else None for p in output_paths]
+    return tool_output, (input_hashes[0] if input_hashes else None), out_hashes
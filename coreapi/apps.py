@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'coreapi'
+
+    def ready(self):
+        # Build and validate the tool registry at startup, so a bad tools/*.yml spec fails here, not as a 500 on the first request
+        from tools.registry import get_registry
+        get_registry()
+
+        # Decode the shared stamps before the first request. With the sandbox on, add_stamp runs in the
+        # sandbox workers and each of them warms its own cache at start (see sandbox.get_pool)
+        from core import sandbox
+        if not sandbox.is_enabled():
+            from tools.add_stamp import warm_stamp_images
+            warm_stamp_images(sandbox.shared_stamp_paths())
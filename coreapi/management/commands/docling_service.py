@@ -0,0 +1,60 @@
+import json
+import signal
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+import logging
+
+from core.docling_service import DoclingService, service_stats
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Runs the shared Docling conversion service (warm converters behind a Unix socket) used by redact.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'PDF_DOCLING_WORKERS', 1),
+            help='Converter processes to keep warm. Each one loads its own copy of the models. Default is PDF_DOCLING_WORKERS.',
+        )
+        parser.add_argument(
+            '--socket',
+            default=getattr(settings, 'PDF_DOCLING_SOCKET', None),
+            help='Unix socket to listen on. Default is PDF_DOCLING_SOCKET.',
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Print the queue depth and model-load times of the running service, then exit.',
+        )
+
+    def handle(self, *args, **options):
+        socket_path = options['socket']
+        if not socket_path:
+            raise CommandError("PDF_DOCLING_SOCKET is not defined in settings and --socket was not given.")
+
+        if options['stats']:
+            try:
+                stats = service_stats(socket_path)
+            except (OSError, EOFError) as e:
+                raise CommandError(f"No Docling service is listening on {socket_path}: {e}")
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+
+        if options['workers'] < 1:
+            raise CommandError("Value for --workers must be at least 1.")
+
+        Path(socket_path).parent.mkdir(parents=True, exist_ok=True)
+        service = DoclingService(socket_path, workers=options['workers'], timeout=getattr(settings, 'PDF_DOCLING_TIMEOUT_SECONDS', 300))
+        signal.signal(signal.SIGTERM, lambda signum, frame: service.close())
+        service.start()
+        self.stdout.write(self.style.NOTICE(f"Docling service: starting {options['workers']} worker(s) on {socket_path}."))
+        try:
+            service.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.close()
+        self.stdout.write(self.style.SUCCESS("Docling service stopped."))
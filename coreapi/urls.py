@@ -5,5 +5,6 @@ urlpatterns = [
     path('nl/', views.nl_view, name='nl_view'),
     path('public-files/', views.public_files_view, name='public_files_view'),
     path('public-files/download/<str:filename>/', views.download_public_file_view, name='download_public_file'),
+    path('pipeline/', views.pipeline_view, name='pipeline_view'),
     path('<str:tool>/', views.tool_view, name='tool_view'),
 ] 
\ No newline at end of file
@@ -8,7 +8,8 @@ import os # Added for file operations
 from pathlib import Path # Added Path
 import uuid # For generating unique session filenames
 
-from core.engine import run_tool
+from core.engine import run_pipeline
+from core.async_engine import arun_tool_timed
 from .serializers import SCHEMAS
 from agent.agent import nl_execute # 新增: 導入 nl_execute
 from core.alert import notify_slack # 修改: 取消註釋並導入 notify_slack
@@ -19,7 +20,7 @@ logger = logging.getLogger(__name__) # 建議加入日誌
 # Create your views here.
 
 @csrf_exempt # 確保 API 端點可以接收 POST 請求
-def tool_view(request, tool: str):
+async def tool_view(request, tool: str):
     if request.method != 'POST':
         return JsonResponse({"status": "error", "message": "只允許 POST 請求。"}, status=405) # 405 Method Not Allowed
 
@@ -38,18 +39,16 @@ def tool_view(request, tool: str):
     except json.JSONDecodeError:
         return JsonResponse({"status": "error", "message": "無效的 JSON 格式。"}, status=400)
 
-    try:
-        # 使用對應的 Pydantic 模型驗證數據
-        validated_data = SCHEMAS[tool](**data).model_dump() # 使用 model_dump() 獲取 dict
-    except ValidationError as e:
-        return JsonResponse({"status": "error", "message": "參數驗證失敗", "detail": e.errors()}, status=400)
-    except Exception as e: # 其他潛在的 data 轉換錯誤
-        return JsonResponse({"status": "error", "message": f"處理請求參數時發生預期外的錯誤：{str(e)}"}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"status": "error", "message": "參數必須是 JSON 物件。"}, status=400)
 
     try:
-        # 調用核心引擎執行工具
-        output_result = run_tool(tool, validated_data, session_id=session_id)
-        return JsonResponse({"status": "ok", "output": output_result})
+        # 調用核心引擎執行工具 (非同步：不佔用 event loop，並受每個工具的並行上限控制)
+        # 參數由引擎以工具的 ArgsSchema 驗證一次
+        output_result, timing = await arun_tool_timed(tool, data, session_id=session_id)
+        return JsonResponse({"status": "ok", "output": output_result, "timing": {"queue_wait_ms": timing.queue_wait_ms, "exec_ms": timing.exec_ms}})
+    except ValidationError as e:
+        return JsonResponse({"status": "error", "message": "參數驗證失敗", "detail": e.errors(include_url=False, include_context=False)}, status=400)
     except FileNotFoundError as e:
         return JsonResponse({"status": "error", "message": f"執行工具時檔案未找到：{str(e)}"}, status=400)
     except ValueError as e: # 例如 secure.py 中的驗證錯誤
@@ -59,6 +58,45 @@ def tool_view(request, tool: str):
         logger.error(f"執行工具 {tool} 失敗 (Session: {session_id})：{e}", exc_info=True)
         return JsonResponse({"status": "error", "message": f"執行工具 {tool} 時發生內部錯誤：{str(e)}"}, status=500)
 
+@csrf_exempt
+def pipeline_view(request):
+    """
+    依序執行多個工具，步驟之間的文件保留在記憶體中，只寫出最後一步的結果。
+    Body: {"steps": [{"tool": "merge", "args": {...}}, {"tool": "split", "args": {...}}, ...]}
+    """
+    if request.method != 'POST':
+        return JsonResponse({"status": "error", "message": "只允許 POST 請求。"}, status=405)
+
+    session_id = request.headers.get("X-Session-ID")
+
+    try:
+        data = json.loads(request.body) if request.body else {}
+    except json.JSONDecodeError:
+        return JsonResponse({"status": "error", "message": "無效的 JSON 格式。"}, status=400)
+
+    steps = data.get("steps") if isinstance(data, dict) else None
+    if not isinstance(steps, list) or not steps or not all(isinstance(s, dict) for s in steps):
+        return JsonResponse({"status": "error", "message": "steps 必須是非空的步驟列表。"}, status=400)
+    for step in steps:
+        if step.get("tool") not in SCHEMAS:
+            return JsonResponse({"status": "error", "message": f"不支援的工具：{step.get('tool')}"}, status=404)
+        if not isinstance(step.get("args", {}), dict):
+            return JsonResponse({"status": "error", "message": "每個步驟的 args 必須是物件。"}, status=400)
+
+    try:
+        # 參數驗證 (含每一步的 Pydantic 驗證) 由引擎負責，因為後續步驟的 file 來自前一步
+        output_result = run_pipeline(steps, session_id=session_id)
+        return JsonResponse({"status": "ok", "output": output_result})
+    except ValidationError as e:
+        return JsonResponse({"status": "error", "message": "參數驗證失敗", "detail": e.errors(include_url=False, include_context=False)}, status=400)
+    except FileNotFoundError as e:
+        return JsonResponse({"status": "error", "message": f"執行工具時檔案未找到：{str(e)}"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"status": "error", "message": f"執行工具時參數錯誤：{str(e)}"}, status=400)
+    except Exception as e:
+        logger.error(f"執行 pipeline 失敗 (Session: {session_id})：{e}", exc_info=True)
+        return JsonResponse({"status": "error", "message": f"執行 pipeline 時發生內部錯誤：{str(e)}"}, status=500)
+
 @csrf_exempt
 def nl_view(request):
     if request.method != 'POST':
@@ -27,6 +27,61 @@ DEFAULT_SHARED_FILES = [
     "stamp2.png",
 ]
 
+# Content-addressed cache of tool results (see core/result_cache.py)
+PDF_RESULT_CACHE_ENABLED = os.getenv('PDF_RESULT_CACHE_ENABLED', 'True') == 'True'
+PDF_RESULT_CACHE_ROOT = BASE_DIR / "cache" / "results"
+PDF_RESULT_CACHE_MAX_BYTES = int(os.getenv('PDF_RESULT_CACHE_MAX_MB', '512')) * 1024 * 1024
+PDF_RESULT_CACHE_MAX_AGE_SECONDS = int(os.getenv('PDF_RESULT_CACHE_MAX_AGE_HOURS', '24')) * 60 * 60
+PDF_RESULT_CACHE_KEY_DIGEST = os.getenv('PDF_RESULT_CACHE_KEY_DIGEST', 'sha256') # 'sha256' (reuse audit digests) or 'fast'
+
+# Stat-keyed memoization of file digests, shared by all worker processes (see core/digest_cache.py)
+PDF_DIGEST_CACHE_ENABLED = os.getenv('PDF_DIGEST_CACHE_ENABLED', 'True') == 'True'
+PDF_DIGEST_CACHE_PATH = BASE_DIR / "cache" / "digests.sqlite3"
+PDF_DIGEST_CACHE_MAX_ENTRIES = 100_000
+PDF_HASH_WORKERS = int(os.getenv('PDF_HASH_WORKERS', '4')) # Threads used to hash the inputs of one operation
+PDF_BATCH_WORKERS = int(os.getenv('PDF_BATCH_WORKERS', str(os.cpu_count() or 1))) # Processes used by core.batch.run_tool_batch
+PDF_MERGE_STREAMING_THRESHOLD_MB = int(os.getenv('PDF_MERGE_STREAMING_THRESHOLD_MB', '256')) # merge switches to the bounded-memory writer above this total input size
+PDF_MERGE_PARSE_WORKERS = int(os.getenv('PDF_MERGE_PARSE_WORKERS', str(os.cpu_count() or 1))) # Processes parsing merge inputs concurrently
+PDF_MERGE_PARALLEL_MIN_FILES = int(os.getenv('PDF_MERGE_PARALLEL_MIN_FILES', '8')) # Smaller merges parse their inputs sequentially
+PDF_SPLIT_WRITE_WORKERS = int(os.getenv('PDF_SPLIT_WRITE_WORKERS', str(os.cpu_count() or 1))) # Processes writing split outputs concurrently
+PDF_SPLIT_PARALLEL_MIN_OUTPUTS = int(os.getenv('PDF_SPLIT_PARALLEL_MIN_OUTPUTS', '16')) # Splits with fewer outputs write them in-process
+PDF_STAMP_IMAGE_CACHE_MB = int(os.getenv('PDF_STAMP_IMAGE_CACHE_MB', '64')) # Decoded stamp images kept per process (tools.add_stamp.stamp_image)
+PDF_STAMP_WARMUP = os.getenv('PDF_STAMP_WARMUP', 'True') == 'True' # Decode the DEFAULT_SHARED_FILES stamps at startup
+
+# Shared Docling conversion service (`python manage.py docling_service`, see core/docling_service.py)
+PDF_DOCLING_SOCKET = os.getenv('PDF_DOCLING_SOCKET', str(BASE_DIR / "cache" / "docling.sock")) # redact converts in-process when nothing listens here
+PDF_DOCLING_WORKERS = int(os.getenv('PDF_DOCLING_WORKERS', '1')) # Each worker holds its own copy of the models
+PDF_DOCLING_TIMEOUT_SECONDS = float(os.getenv('PDF_DOCLING_TIMEOUT_SECONDS', '300'))
+# Docling conversions cached by input hash and Docling version (see core/docling_cache.py)
+PDF_DOCLING_CACHE_ENABLED = os.getenv('PDF_DOCLING_CACHE_ENABLED', 'True') == 'True'
+PDF_DOCLING_CACHE_ROOT = BASE_DIR / "cache" / "docling"
+PDF_DOCLING_CACHE_MAX_BYTES = int(os.getenv('PDF_DOCLING_CACHE_MAX_MB', '1024')) * 1024 * 1024
+
+# Async tool execution (core.async_engine.arun_tool): concurrent calls allowed per tool, per process
+PDF_TOOL_CONCURRENCY = {
+    'default': int(os.getenv('PDF_TOOL_CONCURRENCY_DEFAULT', '4')),
+    'redact': int(os.getenv('PDF_TOOL_CONCURRENCY_REDACT', '1')), # Docling is far heavier than the pypdf tools
+}
+PDF_TOOL_EXECUTOR = {'redact': 'thread'} # Everything else runs in the process pool
+PDF_ASYNC_PROCESS_WORKERS = int(os.getenv('PDF_ASYNC_PROCESS_WORKERS', str(os.cpu_count() or 1)))
+
+# Sandbox: tools run in pre-forked worker processes with per-run limits (core.sandbox)
+PDF_SANDBOX_ENABLED = os.getenv('PDF_SANDBOX_ENABLED', 'True') == 'True'
+PDF_SANDBOX_WORKERS = int(os.getenv('PDF_SANDBOX_WORKERS', str(os.cpu_count() or 1)))
+PDF_SANDBOX_MAX_TASKS_PER_WORKER = int(os.getenv('PDF_SANDBOX_MAX_TASKS_PER_WORKER', '200')) # Recycle workers to cap slow leaks
+PDF_SANDBOX_LIMITS = {
+    'default': {'memory_mb': 1024, 'cpu_seconds': 60, 'timeout_seconds': 120}, # memory_mb caps the worker's address space
+    'redact': {'memory_mb': 8192, 'cpu_seconds': 600, 'timeout_seconds': 900}, # Docling loads large models
+}
+
+# Trace rows (apptrace.Operation) are queued and bulk-inserted by a background thread (apptrace.writer)
+PDF_TRACE_BUFFERED = os.getenv('PDF_TRACE_BUFFERED', 'True') == 'True' # False: insert synchronously on the request path
+PDF_TRACE_QUEUE_SIZE = int(os.getenv('PDF_TRACE_QUEUE_SIZE', '10000'))
+PDF_TRACE_FLUSH_SIZE = int(os.getenv('PDF_TRACE_FLUSH_SIZE', '200'))
+PDF_TRACE_FLUSH_INTERVAL_SECONDS = float(os.getenv('PDF_TRACE_FLUSH_INTERVAL_SECONDS', '1.0'))
+PDF_TRACE_SPILL_PATH = BASE_DIR / "cache" / "trace_spill.jsonl" # Rows that could not be written while the DB was down
+PDF_TRACE_QUARANTINE_PATH = BASE_DIR / "cache" / "trace_quarantine.jsonl" # Rows the DB rejected, kept for inspection instead of being retried
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
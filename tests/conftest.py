@@ -0,0 +1,18 @@
+import pytest
+
+@pytest.fixture(autouse=True)
+def synchronous_trace(settings):
+    """測試中直接寫入 Operation，讓斷言能立即看到紀錄 (緩衝寫入器另有專門測試)。"""
+    settings.PDF_TRACE_BUFFERED = False
+
+@pytest.fixture(autouse=True)
+def no_sandbox(request, settings):
+    """
+    測試預設在行程內執行工具 (方便 monkeypatch)；標記為 sandbox 的測試 (引擎與合併) 則與正式環境一樣，
+    經由沙箱工作行程 (sandbox.executor_for) 執行，並套用其記憶體上限。
+    """
+    if request.node.get_closest_marker("sandbox") is None:
+        settings.PDF_SANDBOX_ENABLED = False
+        return
+    settings.PDF_SANDBOX_ENABLED = True
+    settings.PDF_SANDBOX_WORKERS = 2 # 整個測試階段共用同一個池 (見 sandbox.get_pool)
@@ -0,0 +1,23 @@
+import os
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# Docling 服務的 worker (spawn 出來的程序) 會匯入本模組，所以這裡不能匯入 Django 相關模組。
+
+class FakeConverter:
+    """代替 DocumentConverter：把檔案內容當成 Markdown；檔名含 crash 時讓 worker 直接結束，含 slow 時卡住。"""
+    def convert(self, path):
+        if "crash" in path:
+            os._exit(3)
+        if "slow" in path:
+            time.sleep(60)
+        text = Path(path).read_text(encoding="utf-8")
+        return SimpleNamespace(document=SimpleNamespace(export_to_markdown=lambda: text))
+
+def fake_converter():
+    time.sleep(0.2) # 模擬載入模型
+    return FakeConverter()
+
+def broken_converter():
+    raise ImportError("No module named 'docling'")
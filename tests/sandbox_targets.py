@@ -0,0 +1,45 @@
+import time
+
+# 在沙箱 worker 中執行的函式。worker 會匯入本模組，所以這裡不能匯入 Django 相關模組。
+
+def allocate(mb):
+    return len(bytearray(mb * 1024 * 1024))
+
+def spin():
+    while True:
+        pass
+
+def fail():
+    raise ValueError("壞掉的參數")
+
+def hang(tool_name, args):
+    time.sleep(30)
+
+def child_pool_pids(n):
+    """在 worker 中開一個行程池 (如 merge/split 的平行路徑)，回傳 (worker pid, 子行程 pid 們)。"""
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    from core.worker import pool_context
+    with ProcessPoolExecutor(max_workers=n, mp_context=pool_context()) as executor:
+        return os.getpid(), set(executor.map(_pid, range(n * 4)))
+
+def _pid(_):
+    import os
+    import time
+    time.sleep(0.05)
+    return os.getpid()
+
+def merge_parse_workers(file_count):
+    """worker 中 merge 會用的解析行程數 (設定由呼叫端轉送)。"""
+    from tools import merge
+    return merge._parse_workers(file_count)
+
+def split_write_workers(output_count):
+    """worker 中 split 會用的寫出行程數 (設定由呼叫端轉送)。"""
+    from tools import split
+    return split._write_workers(output_count)
+
+def stamp_cache_stats():
+    """worker 中印章圖片快取的命中/未命中次數與項目數。"""
+    from tools.add_stamp import image_cache_stats
+    return image_cache_stats()
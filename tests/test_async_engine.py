@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from pathlib import Path
+from pypdf import PdfReader, PdfWriter
+from apptrace.models import Operation
+from core import async_engine
+from core.async_engine import arun_tool, arun_tool_timed
+
+pytestmark = pytest.mark.django_db(transaction=True) # 工具在其他執行緒執行並寫入 Operation
+
+@pytest.fixture
+def async_env(settings, tmp_path):
+    files_root = tmp_path / "files"
+    files_root.mkdir()
+    settings.BASE_DIR = tmp_path
+    settings.PDF_FILES_ROOT = files_root
+    settings.PDF_RESULT_CACHE_ENABLED = False
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    writer = PdfWriter()
+    for _ in range(3):
+        writer.add_blank_page(width=200, height=200)
+    with open(files_root / "a.pdf", "wb") as f:
+        writer.write(f)
+    yield tmp_path
+    async_engine._reset_process_pool()
+
+def test_per_tool_concurrency_limit_reports_queue_wait(async_env, settings):
+    """同一工具超過並行上限的呼叫要排隊，排隊時間與執行時間分開回報。"""
+    settings.PDF_TOOL_CONCURRENCY = {"default": 4, "split": 1}
+    settings.PDF_TOOL_EXECUTOR = {"split": "thread"}
+
+    async def main():
+        calls = [arun_tool_timed("split", {"file": "a.pdf", "pages": str(i + 1), "output_dir": f"out{i}"}) for i in range(3)]
+        return await asyncio.gather(*calls)
+
+    results = asyncio.run(main())
+
+    for output, timing in results:
+        assert len(PdfReader(output).pages) == 1
+        assert timing.exec_ms > 0
+    waits = sorted(timing.queue_wait_ms for _, timing in results)
+    # 上限為 1：第二、第三個呼叫至少要等前一個做完
+    assert waits[1] >= min(t.exec_ms for _, t in results) * 0.5
+    assert waits[2] > waits[1]
+    assert Operation.objects.filter(tool="split", status="success").count() == 3
+
+def test_tool_runs_in_process_pool(async_env, settings):
+    """預設在 process pool 執行工具，out_hash 仍來自寫入時的摘要。"""
+    settings.PDF_TOOL_EXECUTOR = {}
+
+    output = asyncio.run(arun_tool("merge", {"files": ["a.pdf"], "output": "merged.pdf"}))
+
+    assert Path(output).name == "merged.pdf"
+    op = Operation.objects.get(tool="merge")
+    assert op.status == "success" and op.out_hash
+
+def test_concurrency_limit_spans_event_loops(async_env, settings):
+    """同步 WSGI 下每個請求各有自己的 event loop；並行上限仍須跨 loop 生效。"""
+    import threading
+    settings.PDF_TOOL_CONCURRENCY = {"default": 4, "split": 1}
+    settings.PDF_TOOL_EXECUTOR = {"split": "thread"}
+    timings = []
+
+    def request(i):
+        _, timing = asyncio.run(arun_tool_timed("split", {"file": "a.pdf", "pages": "1", "output_dir": f"loop{i}"}))
+        timings.append(timing)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(timings) == 2
+    # 上限為 1：後到的請求至少要等先到的做完一部分
+    assert max(t.queue_wait_ms for t in timings) >= min(t.exec_ms for t in timings) * 0.5
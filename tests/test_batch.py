@@ -0,0 +1,45 @@
+import hashlib
+import pytest
+from pathlib import Path
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from apptrace.models import Operation
+from core.batch import run_tool_batch
+
+pytestmark = pytest.mark.django_db
+
+@pytest.fixture
+def batch_env(settings, tmp_path):
+    """files/ 指向暫存目錄，放入數個 PDF 與一個印章圖片。"""
+    files_root = tmp_path / "files"
+    files_root.mkdir()
+    settings.BASE_DIR = tmp_path
+    settings.PDF_FILES_ROOT = files_root
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    for i in range(4):
+        writer = PdfWriter()
+        writer.add_blank_page(width=200, height=200)
+        with open(files_root / f"invoice{i}.pdf", "wb") as f:
+            writer.write(f)
+    Image.new("RGB", (30, 15), "red").save(files_root / "stamp.png")
+    return tmp_path
+
+def test_batch_stamps_every_file_and_collects_errors(batch_env):
+    """每個項目各自成功或失敗，錯誤不會中斷整批，最後一次寫入所有 Operation。"""
+    items = [{"file": f"invoice{i}.pdf", "stamp_path": "stamp.png", "page": 1, "output": f"stamped{i}.pdf"} for i in range(4)]
+    items.insert(2, {"file": "missing.pdf", "stamp_path": "stamp.png", "page": 1})
+    items.append({"file": "invoice0.pdf", "stamp_path": "stamp.png", "page": 5, "output": "bad_page.pdf"})
+
+    results = sorted(run_tool_batch("add_stamp", items, workers=2), key=lambda r: r.index)
+
+    assert [r.status for r in results] == ["success", "success", "error", "success", "success", "error"]
+    assert "missing.pdf" in results[2].error
+    assert "out of range" in results[5].error
+    for r in results:
+        if r.status == "success":
+            assert len(PdfReader(r.output).pages) == 1
+            assert r.out_hash == hashlib.sha256(Path(r.output).read_bytes()).hexdigest()
+
+    ops = list(Operation.objects.all())
+    assert len(ops) == 6
+    assert sorted(op.status for op in ops) == ["error", "error"] + ["success"] * 4
@@ -0,0 +1,174 @@
+import os
+import stat
+import time
+import threading
+import pytest
+from core import docling_cache, docling_service
+from core.docling_service import DoclingService, convert_to_markdown, service_stats
+from tests.docling_targets import FakeConverter, fake_converter, broken_converter
+from tools import redact
+
+@pytest.fixture
+def start_service(tmp_path, settings):
+    services = []
+    def start(factory=fake_converter, workers=1, timeout=30):
+        socket_path = tmp_path / "docling.sock"
+        settings.PDF_DOCLING_SOCKET = str(socket_path)
+        settings.PDF_DOCLING_CACHE_ENABLED = False # Every request reaches the service
+        service = DoclingService(socket_path, workers=workers, converter_factory=factory, timeout=timeout)
+        service.start()
+        threading.Thread(target=service.serve_forever, daemon=True).start()
+        services.append(service)
+        while not os.path.exists(socket_path):
+            time.sleep(0.05)
+        return service
+    yield start
+    for service in services:
+        service.close()
+
+def test_service_converts_with_warm_workers_and_reports_stats(start_service, tmp_path):
+    """轉換工作經由 socket 交給常駐 worker；模型只載入一次，並回報佇列深度與載入時間。"""
+    service = start_service(workers=2)
+    assert service.wait_ready(timeout=30)
+    for i in range(3):
+        (tmp_path / f"doc{i}.md").write_text(f"Henry number {i}", encoding="utf-8")
+        assert convert_to_markdown(str(tmp_path / f"doc{i}.md")) == f"Henry number {i}"
+
+    stats = service_stats()
+    assert stats["completed"] == 3 and stats["queue_depth"] == 0 and stats["running"] == 0
+    assert stats["ready"] == 2 and all(seconds >= 0.2 for seconds in stats["model_load_seconds"])
+
+def test_socket_is_created_owner_only(start_service, tmp_path):
+    """socket 建立時即為 0600 (先設定 umask 再 bind，而不是 bind 之後才 chmod)，且不改變本程序的 umask。"""
+    umask = os.umask(0o022)
+    try:
+        start_service()
+        assert stat.S_IMODE(os.stat(tmp_path / "docling.sock").st_mode) == 0o600
+        assert os.umask(0o022) == 0o022
+    finally:
+        os.umask(umask)
+
+def test_conversion_errors_and_dead_workers_fail_only_their_job(start_service, tmp_path):
+    service = start_service()
+    assert service.wait_ready(timeout=30)
+    with pytest.raises(RuntimeError, match="FileNotFoundError"):
+        convert_to_markdown(str(tmp_path / "missing.md"))
+    with pytest.raises(RuntimeError, match="exited unexpectedly"):
+        convert_to_markdown(str(tmp_path / "crash.md"))
+
+    (tmp_path / "ok.md").write_text("still works", encoding="utf-8")
+    assert convert_to_markdown(str(tmp_path / "ok.md")) == "still works" # 換上新的 worker
+    assert service_stats()["failed"] == 2
+
+def _wait_until(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+def test_job_past_the_timeout_is_stopped(start_service, tmp_path):
+    """逾時的工作不會在 worker 上繼續執行：執行中的 worker 被終止並換新，仍在佇列中的工作直接取消。"""
+    service = start_service(timeout=1)
+    assert service.wait_ready(timeout=30)
+    (tmp_path / "slow.md").write_text("never", encoding="utf-8")
+    (tmp_path / "ok.md").write_text("still works", encoding="utf-8")
+    pid = next(iter(service._load_seconds))
+
+    with pytest.raises(RuntimeError, match="did not finish within 1"):
+        convert_to_markdown(str(tmp_path / "slow.md"))
+    _wait_until(lambda: service.stats()["restarts"] == 1) # 換上新的 worker
+    assert pid not in service._load_seconds
+    with pytest.raises(OSError):
+        os.kill(pid, 0) # 舊的 worker 已結束
+    assert convert_to_markdown(str(tmp_path / "ok.md")) == "still works"
+
+    running = service.submit(str(tmp_path / "slow.md"))
+    waiting = service.submit(str(tmp_path / "ok.md"))
+    _wait_until(running.running)
+    service._abandon(waiting) # 還在佇列中：直接取消，不會送到 worker
+    assert waiting.cancelled()
+    service._abandon(running)
+    _wait_until(lambda: service.stats()["restarts"] == 2)
+    assert service.stats()["timeouts"] == 3
+
+def test_converter_that_cannot_load_fails_requests(start_service, tmp_path):
+    service = start_service(factory=broken_converter)
+    (tmp_path / "doc.md").write_text("x", encoding="utf-8")
+    assert not service.wait_ready(timeout=30)
+    assert "docling" in service.stats()["load_error"]
+    with pytest.raises(RuntimeError, match="No module named 'docling'"):
+        convert_to_markdown(str(tmp_path / "doc.md"))
+
+def test_falls_back_to_one_in_process_converter(settings, tmp_path, monkeypatch):
+    """沒有服務在監聽時，在本程序內轉換，且 converter 只建立一次。"""
+    settings.PDF_DOCLING_SOCKET = str(tmp_path / "nobody.sock")
+    settings.PDF_DOCLING_CACHE_ENABLED = False
+    built = []
+    monkeypatch.setattr(docling_service, "_local_converter", None)
+    monkeypatch.setattr(docling_service, "default_converter", lambda: built.append(1) or FakeConverter())
+    (tmp_path / "doc.md").write_text("local", encoding="utf-8")
+
+    assert convert_to_markdown(str(tmp_path / "doc.md")) == "local"
+    assert convert_to_markdown(str(tmp_path / "doc.md")) == "local"
+    assert built == [1]
+
+def test_redact_uses_the_service(start_service, tmp_path):
+    service = start_service()
+    assert service.wait_ready(timeout=30)
+    (tmp_path / "doc.md").write_text("Henry met henry.", encoding="utf-8")
+
+    output = redact.run({"file": str(tmp_path / "doc.md"), "patterns": ["henry"], "output": str(tmp_path / "out.md")})
+    assert (tmp_path / "out.md").read_text(encoding="utf-8") == "[REDACTED] met [REDACTED]."
+    assert output == str(tmp_path / "out.md")
+    assert service_stats()["completed"] == 1
+
+@pytest.fixture
+def cached_conversions(settings, tmp_path, monkeypatch):
+    """沒有服務、啟用磁碟快取；記錄每次實際轉換的檔案。"""
+    settings.PDF_DOCLING_SOCKET = str(tmp_path / "nobody.sock")
+    settings.PDF_DOCLING_CACHE_ENABLED = True
+    settings.PDF_DOCLING_CACHE_ROOT = tmp_path / "docling-cache"
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    converted = []
+    monkeypatch.setattr(docling_service, "_local_convert", lambda path: converted.append(path) or (open(path, encoding="utf-8").read(), '{"name": "doc"}'))
+    return converted
+
+def test_redacting_a_known_document_skips_the_conversion(cached_conversions, tmp_path):
+    """同一份文件用不同的 patterns 重複遮蔽時，只轉換一次；內容改變或 Docling 版本改變才重新轉換。"""
+    doc = tmp_path / "contract.md"
+    doc.write_text("Henry owes Alice 100.", encoding="utf-8")
+    for i, patterns in enumerate([["henry"], ["alice"], [r"\d+"]]):
+        redact.run({"file": str(doc), "patterns": patterns, "output": str(tmp_path / f"out{i}.md")})
+    assert len(cached_conversions) == 1
+    assert (tmp_path / "out2.md").read_text(encoding="utf-8") == "Henry owes Alice [REDACTED]."
+
+    key = docling_cache.make_key(docling_service.hash_file(str(doc)))
+    assert (docling_cache._entry_dir(key) / docling_cache.DOCUMENT_FILENAME).read_text(encoding="utf-8") == '{"name": "doc"}'
+
+    doc.write_text("Henry owes Alice 200.", encoding="utf-8")
+    assert convert_to_markdown(str(doc)) == "Henry owes Alice 200."
+    assert len(cached_conversions) == 2
+
+    docling_cache.converter_version.cache_clear()
+    try:
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(docling_cache.metadata, "version", lambda name: "99.0")
+            convert_to_markdown(str(doc))
+    finally:
+        docling_cache.converter_version.cache_clear()
+    assert len(cached_conversions) == 3
+
+def test_cache_evicts_least_recently_used_entries(cached_conversions, tmp_path, settings):
+    settings.PDF_DOCLING_CACHE_MAX_BYTES = 150 # 每筆 95 位元組 (Markdown + JSON)，最多保留一筆
+    docs = []
+    for name in ("a", "b"):
+        docs.append(tmp_path / f"{name}.md")
+        docs[-1].write_text(name * 80, encoding="utf-8")
+    convert_to_markdown(str(docs[0]))
+    time.sleep(0.01)
+    convert_to_markdown(str(docs[1])) # a 被淘汰
+    convert_to_markdown(str(docs[1]))
+    assert len(cached_conversions) == 2
+    convert_to_markdown(str(docs[0]))
+    assert len(cached_conversions) == 3
+    assert docling_cache.stats()["evictions"] >= 2
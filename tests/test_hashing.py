@@ -0,0 +1,78 @@
+import os
+import time
+import hashlib
+import pytest
+from core import digest_cache
+from core.secure import hash_file, hash_files, fast_digest_algorithm
+
+@pytest.fixture
+def digest_env(settings, tmp_path):
+    """使用暫存的 SQLite 摘要快取。"""
+    settings.PDF_DIGEST_CACHE_ENABLED = True
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    return tmp_path
+
+def _write_old_file(path, content: bytes):
+    """寫入檔案並把 mtime 調到過去，避開 racy timestamp 保護。"""
+    path.write_bytes(content)
+    past = time.time() - 60
+    os.utime(path, (past, past))
+
+def test_unchanged_file_is_not_rehashed(digest_env):
+    """檔案未變更時第二次 hash_file 應直接使用快取的摘要。"""
+    target = digest_env / "data.bin"
+    content = os.urandom(64 * 1024)
+    _write_old_file(target, content)
+    before = digest_cache.stats()
+
+    first = hash_file(str(target))
+    second = hash_file(str(target))
+
+    after = digest_cache.stats()
+    assert first == second == hashlib.sha256(content).hexdigest()
+    assert after["hits"] == before["hits"] + 1
+    assert after["bytes_hashed"] == before["bytes_hashed"] + len(content)
+    assert after["bytes_skipped"] == before["bytes_skipped"] + len(content)
+
+def test_modified_file_invalidates_cached_digest(digest_env):
+    """檔案內容改變 (大小或 mtime 改變) 時必須重新計算摘要。"""
+    target = digest_env / "data.bin"
+    _write_old_file(target, b"first version")
+    assert hash_file(str(target)) == hashlib.sha256(b"first version").hexdigest()
+
+    _write_old_file(target, b"second version, longer")
+    before = digest_cache.stats()
+    assert hash_file(str(target)) == hashlib.sha256(b"second version, longer").hexdigest()
+    assert digest_cache.stats()["invalidated"] == before["invalidated"] + 1
+
+def test_recently_modified_file_is_not_memoized(digest_env):
+    """剛寫入的檔案 (mtime 仍在 racy 視窗內) 不應被記錄。"""
+    target = digest_env / "fresh.bin"
+    target.write_bytes(b"just written")
+    hash_file(str(target))
+    before = digest_cache.stats()
+    hash_file(str(target))
+    assert digest_cache.stats()["hits"] == before["hits"]
+
+def test_hash_files_preserves_order_and_matches_serial(digest_env):
+    """平行雜湊的結果順序必須與輸入順序一致，且與逐一計算相同。"""
+    paths = []
+    for i in range(4):
+        p = digest_env / f"part{i}.bin"
+        p.write_bytes(os.urandom(2 * 1024 * 1024))
+        paths.append(str(p))
+    paths.append(paths[0]) # 重複的路徑只計算一次，但仍回傳在原位置
+
+    digests = hash_files(paths, max_workers=4)
+
+    assert digests == [hashlib.sha256(open(p, "rb").read()).hexdigest() for p in paths]
+
+def test_fast_digest_is_separate_from_sha256(digest_env):
+    """快速摘要 (供內部快取鍵使用) 不可與 SHA-256 摘要混用同一筆快取紀錄。"""
+    target = digest_env / "data.bin"
+    _write_old_file(target, b"same bytes")
+    sha = hash_file(str(target))
+    fast = hash_file(str(target), algorithm=fast_digest_algorithm())
+    assert sha == hashlib.sha256(b"same bytes").hexdigest()
+    assert fast != sha
+    assert hash_file(str(target), algorithm=fast_digest_algorithm()) == fast
@@ -0,0 +1,77 @@
+import pytest
+from pypdf import PdfWriter
+from core import inputs
+from core.engine import run_tool
+from core.inputs import MappedStream, mapped_reader, open_inputs
+from core.secure import hash_file
+
+pytestmark = pytest.mark.django_db
+
+@pytest.fixture
+def files_root(settings, tmp_path):
+    files_root = tmp_path / "files"
+    files_root.mkdir()
+    settings.BASE_DIR = tmp_path
+    settings.PDF_FILES_ROOT = files_root
+    settings.PDF_RESULT_CACHE_ENABLED = False
+    settings.PDF_DIGEST_CACHE_ENABLED = False
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    writer = PdfWriter()
+    for _ in range(3):
+        writer.add_blank_page(width=200, height=200)
+    with open(files_root / "a.pdf", "wb") as f:
+        writer.write(f)
+    return files_root
+
+def test_mapped_stream_has_independent_positions():
+    data = b"0123456789"
+    first, second = MappedStream(data), MappedStream(data)
+    assert first.read(4) == b"0123"
+    assert second.read(2) == b"01"
+    first.seek(-2, 2)
+    assert first.read() == b"89" and first.read(5) == b""
+    assert second.tell() == 2
+
+def test_mappings_are_released_by_their_consumer(files_root, monkeypatch):
+    """雜湊與合併各自映射輸入，用完立即解除對應，不會留到請求結束。"""
+    opened = []
+    class CountingBuffer(inputs.InputBuffer):
+        def __init__(self, path):
+            super().__init__(path)
+            opened.append(self)
+        def close(self):
+            assert inputs.current() is not None # 在請求進行中即已關閉
+            super().close()
+    monkeypatch.setattr(inputs, "InputBuffer", CountingBuffer)
+
+    run_tool("merge", {"files": ["a.pdf", "a.pdf"], "output": "merged.pdf", "streaming": False})
+
+    assert len(opened) == 3 # 一次雜湊（相同路徑只雜湊一次）與兩次讀取
+    assert all(buffer.data.closed for buffer in opened)
+    assert inputs.current() is None
+
+def test_shared_buffer_is_reused_until_request_ends(files_root):
+    path = str(files_root / "a.pdf")
+    with open_inputs():
+        shared = inputs.buffer_for(path)
+        with inputs.mapped(path) as buffer:
+            assert buffer is shared
+        with mapped_reader(path) as reader:
+            assert len(reader.pages) == 3
+        assert not shared.data.closed # The shared buffer outlives the reader's block
+    assert shared.data.closed
+
+def test_reader_and_hash_outside_request(files_root):
+    path = str(files_root / "a.pdf")
+    with mapped_reader(path) as reader:
+        assert len(reader.pages) == 3
+        buffer = reader.stream._data
+    assert buffer.closed # Mapped just for the reader, and closed with its block
+    with open_inputs():
+        mapped_digest = hash_file(path)
+    assert mapped_digest == hash_file(path)
+
+def test_rejects_pdf_extension_without_pdf_signature(files_root):
+    (files_root / "fake.pdf").write_bytes(b"MZ\x90\x00 not a pdf at all")
+    with pytest.raises(ValueError, match="Invalid file content"):
+        run_tool("split", {"file": "fake.pdf", "pages": "1"})
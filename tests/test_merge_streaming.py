@@ -0,0 +1,156 @@
+import pytest
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from reportlab.pdfgen import canvas
+from core import sandbox
+from core.sink import OutputSinks
+from core.worker import execute_tool
+from tools import merge
+
+pytestmark = pytest.mark.sandbox
+
+def _text_pdf(path, label, pages):
+    c = canvas.Canvas(str(path), pagesize=(300, 400))
+    for i in range(pages):
+        c.drawString(50, 200, f"{label} page {i + 1}")
+        c.showPage()
+    c.save()
+
+def _blank_pdf(path, width, height):
+    writer = PdfWriter()
+    writer.add_blank_page(width=width, height=height)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+def _sandboxed_merge(args: dict) -> OutputSinks:
+    """與 run_tool 相同，在沙箱工作行程中執行合併，回傳記錄了輸出的 OutputSinks。"""
+    _, written = sandbox.executor_for("merge").submit(execute_tool, "merge", args).result()
+    outputs = OutputSinks()
+    for w in written:
+        outputs.record(w.path, w.sha256, w.size, w.page_count, w.bytes_saved)
+    return outputs
+
+def test_streaming_merge_matches_in_memory_merge(tmp_path):
+    """串流合併的輸出與一般合併在頁數、頁面尺寸與文字內容上一致。"""
+    files = [tmp_path / "a.pdf", tmp_path / "b.pdf", tmp_path / "c.pdf"]
+    _text_pdf(files[0], "A", 3)
+    _blank_pdf(files[1], 500, 700)
+    _text_pdf(files[2], "C", 2)
+    args = {"files": [str(f) for f in files]}
+
+    outputs = _sandboxed_merge(dict(args, output=str(tmp_path / "streamed.pdf"), streaming=True))
+    _sandboxed_merge(dict(args, output=str(tmp_path / "in_memory.pdf"), streaming=False))
+
+    streamed = PdfReader(tmp_path / "streamed.pdf")
+    in_memory = PdfReader(tmp_path / "in_memory.pdf")
+    assert len(streamed.pages) == len(in_memory.pages) == 6
+    assert outputs.get(str(tmp_path / "streamed.pdf")).page_count == 6
+    for s, m in zip(streamed.pages, in_memory.pages):
+        assert s.mediabox == m.mediabox
+        assert s.extract_text() == m.extract_text()
+    assert "C page 2" in streamed.pages[5].extract_text()
+
+def test_streaming_switches_on_above_threshold(tmp_path, settings):
+    _text_pdf(tmp_path / "a.pdf", "A", 1)
+    args = {"files": [str(tmp_path / "a.pdf")], "output": str(tmp_path / "o.pdf")}
+
+    settings.PDF_MERGE_STREAMING_THRESHOLD_MB = 0
+    assert merge._use_streaming(args)
+    assert not merge._use_streaming(dict(args, streaming=False))
+    settings.PDF_MERGE_STREAMING_THRESHOLD_MB = 256
+    assert not merge._use_streaming(args)
+
+def _image_pdf(path, label, image_path):
+    c = canvas.Canvas(str(path), pagesize=(300, 400))
+    c.drawImage(str(image_path), 20, 20, width=200, height=200)
+    c.drawString(50, 300, label)
+    c.showPage()
+    c.save()
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_merge_dedups_shared_resources(tmp_path, streaming):
+    """同一產生器輸出的文件合併時，相同的圖片/字型只寫入一次，並回報節省的位元組。"""
+    image = Image.frombytes("RGB", (256, 256), bytes(range(256)) * 768)
+    image.save(tmp_path / "logo.png")
+    files = []
+    for i in range(3):
+        files.append(tmp_path / f"doc{i}.pdf")
+        _image_pdf(files[-1], f"doc {i}", tmp_path / "logo.png")
+    args = {"files": [str(f) for f in files], "streaming": streaming}
+
+    outputs = _sandboxed_merge(dict(args, output=str(tmp_path / "dedup.pdf")))
+    _sandboxed_merge(dict(args, output=str(tmp_path / "plain.pdf"), dedup=False))
+
+    saved = outputs.get(str(tmp_path / "dedup.pdf")).bytes_saved
+    dedup_size = (tmp_path / "dedup.pdf").stat().st_size
+    plain_size = (tmp_path / "plain.pdf").stat().st_size
+    assert saved > 0
+    assert dedup_size <= plain_size - saved * 0.9
+    reader = PdfReader(tmp_path / "dedup.pdf")
+    assert [p.extract_text().strip() for p in reader.pages] == ["doc 0", "doc 1", "doc 2"]
+    images = [p["/Resources"]["/XObject"] for p in reader.pages]
+    assert len({x.raw_get(name).idnum for x in images for name in x}) == 1 # 三頁共用同一個影像物件
+
+def test_parallel_parsing_keeps_file_order(tmp_path, settings):
+    """平行解析輸入時，組裝仍依呼叫端給定的檔案順序。(沙箱工作行程不能再開子行程，故在行程內執行)"""
+    settings.PDF_MERGE_PARALLEL_MIN_FILES = 2
+    settings.PDF_MERGE_PARSE_WORKERS = 3
+    files = []
+    for i in range(10):
+        files.append(str(tmp_path / f"in{i}.pdf"))
+        _text_pdf(files[-1], f"F{i}", 2)
+    assert merge._parse_workers(len(files)) == 3
+
+    outputs = OutputSinks()
+    merge.run({"files": files, "output": str(tmp_path / "out.pdf"), "streaming": True}, outputs=outputs)
+
+    reader = PdfReader(tmp_path / "out.pdf")
+    assert [p.extract_text().strip() for p in reader.pages] == [f"F{i} page {n}" for i in range(10) for n in (1, 2)]
+
+def test_many_files_keep_the_pypdf_writer_unless_streaming(tmp_path, settings, monkeypatch):
+    """檔案多但未要求串流、也未超過大小門檻時，仍用 pypdf 的寫入器，不會改走串流路徑。"""
+    settings.PDF_MERGE_PARALLEL_MIN_FILES = 2
+    settings.PDF_MERGE_PARSE_WORKERS = 3
+    settings.PDF_MERGE_STREAMING_THRESHOLD_MB = 256
+    files = []
+    for i in range(10):
+        files.append(str(tmp_path / f"in{i}.pdf"))
+        _blank_pdf(files[-1], 200, 200)
+    monkeypatch.setattr(merge, "run_streaming", lambda *a, **kw: pytest.fail("streaming writer used"))
+
+    merge.run({"files": files, "output": str(tmp_path / "out.pdf")})
+
+    assert len(PdfReader(tmp_path / "out.pdf").pages) == 10
+
+@pytest.mark.django_db
+def test_default_merge_parses_in_parallel_in_the_sandbox(tmp_path, settings):
+    """預設 (非串流) 合併經 run_tool 在沙箱中執行時，也能平行解析輸入，且頁序不變。"""
+    from core.engine import run_tool
+    from tests.sandbox_targets import merge_parse_workers
+    files_root = tmp_path / "files"
+    files_root.mkdir()
+    settings.BASE_DIR = tmp_path
+    settings.PDF_FILES_ROOT = files_root
+    settings.PDF_RESULT_CACHE_ENABLED = False
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    settings.PDF_MERGE_PARALLEL_MIN_FILES = 2
+    settings.PDF_MERGE_PARSE_WORKERS = 3
+    for i in range(10):
+        _text_pdf(files_root / f"in{i}.pdf", f"F{i}", 2)
+
+    assert sandbox.get_pool().run("merge", sandbox.limits_for("merge"), merge_parse_workers, 10) == 3 # 沙箱 worker 不再退回循序解析
+    output = run_tool("merge", {"files": [f"in{i}.pdf" for i in range(10)], "output": "out.pdf"})
+
+    reader = PdfReader(output)
+    assert [p.extract_text().strip() for p in reader.pages] == [f"F{i} page {n}" for i in range(10) for n in (1, 2)]
+    assert not reader.pdf_header.startswith("%PDF-1.7") # pypdf 的寫入器，而非串流寫入器
+
+@pytest.mark.parametrize("version, supported", [("4.2.0", True), ("4.3.1", True), ("3.17.4", False), ("5.0.0", False), ("5.1.0.dev1", False)])
+def test_pypdf_internals_are_checked_against_the_pinned_range(version, supported):
+    """pdfstream 使用的 pypdf 內部介面只在 pyproject.toml 鎖定的版本範圍內啟用。"""
+    from tools.pdfstream import check_pypdf_version
+    if supported:
+        check_pypdf_version(version)
+    else:
+        with pytest.raises(ImportError, match=version):
+            check_pypdf_version(version)
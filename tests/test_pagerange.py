@@ -0,0 +1,53 @@
+import pytest
+from tools.pagerange import PageRange, all_pages, compile_range
+
+@pytest.mark.parametrize("rng, expected", [
+    ("1-3,5", [1, 2, 3, 5]),
+    ("5,1-3,2", [1, 2, 3, 5]),
+    ("1-10,!5", [1, 2, 3, 4, 6, 7, 8, 9, 10]),
+    ("!3", [1, 2, 4, 5, 6, 7, 8, 9, 10]),
+    ("!2-4,!-1", [1, 5, 6, 7, 8, 9]),
+    ("-1", [10]),
+    ("1--1", list(range(1, 11))),
+    ("8--1", [8, 9, 10]),
+    ("1-5,-1", [1, 2, 3, 4, 5, 10]),
+    ("1-3,4-6,!5", [1, 2, 3, 4, 6]),
+    ("!1-10", []),
+])
+def test_compile_range_selects_pages(rng, expected):
+    assert list(compile_range(rng, 10)) == expected
+
+def test_intervals_are_merged_and_never_expanded():
+    """50k 頁的文件不會被展開成逐頁集合：結果只有兩個區間。"""
+    selection = compile_range("1--1,!200-300", 50_000)
+    assert selection.intervals == ((1, 199), (301, 50_000))
+    assert len(selection) == 50_000 - 101
+    assert 199 in selection and 250 not in selection and 50_000 in selection
+    assert selection.expression() == "1-199,301-50000"
+
+def test_compiled_ranges_are_cached_per_page_count():
+    assert compile_range("1-3", 10) is compile_range("1-3", 10)
+    assert compile_range("1--1", 10) != compile_range("1--1", 11)
+
+def test_chunks_split_across_intervals():
+    chunks = list(compile_range("1-3,7-9", 10).chunks(2))
+    assert [list(c) for c in chunks] == [[1, 2], [3, 7], [8, 9]]
+    assert [(c.first, c.last) for c in chunks] == [(1, 2), (3, 7), (8, 9)]
+    assert list(all_pages(3).indices()) == [0, 1, 2]
+    assert not PageRange((), 0)
+
+@pytest.mark.parametrize("rng, message", [
+    ("", "頁碼範圍字串不可為空"),
+    ("1,,2", "無效的 token 格式"),
+    ("0", "頁碼必須大於 0"),
+    ("11", "頁碼 11 超出總頁數 10"),
+    ("0-3", "起始頁碼必須大於 0"),
+    ("3-11", "結束頁碼 11 超出總頁數 10"),
+    ("5-2", "起始頁碼 5 大於結束頁碼 2"),
+    ("1-2-3", "無效的 '-' 使用"),
+    ("abc", "頁碼格式錯誤"),
+    ("!12", "頁碼 12 超出總頁數 10"),
+])
+def test_invalid_ranges_are_rejected(rng, message):
+    with pytest.raises(ValueError, match=message):
+        compile_range(rng, 10)
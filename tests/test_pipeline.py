@@ -0,0 +1,83 @@
+import json
+import pytest
+from pathlib import Path
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from django.test import Client
+from django.urls import reverse
+from apptrace.models import Operation
+from core.engine import run_pipeline
+
+pytestmark = pytest.mark.django_db
+
+def _write_blank_pdf(path: Path, pages: int = 1):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+@pytest.fixture
+def pipeline_env(settings, tmp_path):
+    """files/ 與 output/ 指向暫存目錄，放入兩個 PDF 與一個印章圖片。"""
+    files_root = tmp_path / "files"
+    files_root.mkdir()
+    settings.BASE_DIR = tmp_path
+    settings.PDF_FILES_ROOT = files_root
+    settings.PDF_RESULT_CACHE_ENABLED = False
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    _write_blank_pdf(files_root / "a.pdf", pages=2)
+    _write_blank_pdf(files_root / "b.pdf", pages=3)
+    Image.new("RGB", (30, 15), "red").save(files_root / "stamp.png")
+    return tmp_path
+
+STEPS = [
+    {"tool": "merge", "args": {"files": ["a.pdf", "b.pdf"]}},
+    {"tool": "split", "args": {"pages": "2-4"}},
+    {"tool": "add_stamp", "args": {"stamp_path": "stamp.png", "page": 0, "output": "final.pdf"}},
+]
+
+def test_pipeline_writes_only_final_output(pipeline_env):
+    """merge → split → add_stamp：只寫出最後的檔案，每一步各有一筆 Operation。"""
+    result = run_pipeline(STEPS)
+
+    assert Path(result) == pipeline_env / "files" / "final.pdf"
+    reader = PdfReader(result)
+    assert len(reader.pages) == 3
+    assert all("/XObject" in page["/Resources"] for page in reader.pages)
+    assert not list((pipeline_env / "output").glob("*.pdf")) # 中間結果沒有寫到磁碟
+
+    ops = list(Operation.objects.order_by("id"))
+    assert [op.tool for op in ops] == ["merge", "split", "add_stamp"]
+    assert [op.args["pipeline"]["step"] for op in ops] == [1, 2, 3]
+    assert len({op.args["pipeline"]["id"] for op in ops}) == 1
+    assert ops[0].in_hash is not None
+    assert [op.out_hash is not None for op in ops] == [False, False, True]
+
+def test_pipeline_error_stops_and_is_traced(pipeline_env):
+    """失敗的步驟寫入錯誤紀錄並拋出原本的例外，後續步驟不執行。"""
+    steps = [
+        {"tool": "merge", "args": {"files": ["a.pdf"]}},
+        {"tool": "split", "args": {"pages": "9"}},
+        {"tool": "add_stamp", "args": {"stamp_path": "stamp.png", "page": 1}},
+    ]
+    with pytest.raises(ValueError):
+        run_pipeline(steps)
+
+    assert list(Operation.objects.order_by("id").values_list("tool", "status")) == [("merge", "success"), ("split", "error")]
+
+def test_pipeline_rejects_file_on_later_step_and_redact(pipeline_env):
+    """後續步驟不可自行指定 file；沒有 transform 的工具 (redact) 不能放進 pipeline。"""
+    with pytest.raises(ValueError):
+        run_pipeline([{"tool": "merge", "args": {"files": ["a.pdf"]}}, {"tool": "split", "args": {"file": "b.pdf", "pages": "1"}}])
+    with pytest.raises(ValueError):
+        run_pipeline([{"tool": "redact", "args": {"file": "a.pdf", "patterns": ["x"]}}])
+
+def test_pipeline_api(pipeline_env):
+    """/api/v1/pipeline/ 端點回傳最後輸出的路徑。"""
+    response = Client().post(reverse("pipeline_view"), data=json.dumps({"steps": STEPS}), content_type="application/json")
+    assert response.status_code == 200
+    assert Path(response.json()["output"]).name == "final.pdf"
+
+    response = Client().post(reverse("pipeline_view"), data=json.dumps({"steps": []}), content_type="application/json")
+    assert response.status_code == 400
@@ -0,0 +1,27 @@
+import pytest
+from pydantic import ValidationError
+from tools.registry import get_registry, get_tool
+
+def test_registry_is_built_once_with_path_metadata():
+    """登錄表在同一個行程中只建立一次，並由 YAML 提供路徑參數與預設輸出名稱。"""
+    assert get_registry() is get_registry()
+
+    merge = get_tool("merge")
+    assert merge.input_keys == ("files",)
+    assert merge.output_keys == ("output",)
+    assert merge.default_output_name("a") == "a_merged.pdf"
+    assert get_tool("add_stamp").input_keys == ("file", "stamp_path", "stamps[].stamp_path")
+    assert get_tool("split").output_keys == ("output_dir",)
+    assert get_tool("split").supports_pipeline
+
+def test_validate_coerces_and_rejects():
+    """validate 依工具的 ArgsSchema 驗證一次並回傳一般的 dict。"""
+    args = get_tool("add_stamp").validate({"file": "/x/a.pdf", "stamp_path": "/x/s.png", "page": "2", "output": "/x/o.pdf"})
+    assert args == {"file": "/x/a.pdf", "stamp_path": "/x/s.png", "page": 2, "pages": None, "pos": "br", "scale": 1.0, "stamps": None, "incremental": False, "output": "/x/o.pdf"}
+
+    with pytest.raises(ValidationError):
+        get_tool("merge").validate({"files": [], "output": "/x/o.pdf"})
+
+def test_unknown_tool_raises_import_error():
+    with pytest.raises(ImportError):
+        get_tool("does_not_exist")
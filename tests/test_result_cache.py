@@ -0,0 +1,95 @@
+import pytest
+from pathlib import Path
+from pypdf import PdfWriter
+from apptrace.models import Operation
+from core import result_cache
+from core.engine import run_tool
+
+pytestmark = [pytest.mark.django_db, pytest.mark.sandbox]
+
+def _write_blank_pdf(path: Path, pages: int = 1, width: int = 200):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=width, height=200)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+@pytest.fixture
+def cache_env(settings, tmp_path):
+    """把 files/、output/ 與結果快取都指向暫存目錄，並放入兩個 PDF。"""
+    files_root = tmp_path / "files"
+    files_root.mkdir()
+    settings.BASE_DIR = tmp_path
+    settings.PDF_FILES_ROOT = files_root
+    settings.PDF_RESULT_CACHE_ENABLED = True
+    settings.PDF_RESULT_CACHE_ROOT = tmp_path / "cache"
+    settings.PDF_RESULT_CACHE_MAX_BYTES = 10 * 1024 * 1024
+    settings.PDF_RESULT_CACHE_MAX_AGE_SECONDS = 3600
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    _write_blank_pdf(files_root / "a.pdf")
+    _write_blank_pdf(files_root / "b.pdf", pages=2)
+    return tmp_path
+
+def test_repeated_merge_is_served_from_cache(cache_env):
+    """相同工具、參數與輸入內容的第二次呼叫應命中快取，且仍寫入一筆 Operation。"""
+    before = result_cache.stats()
+
+    first = run_tool("merge", {"files": ["a.pdf", "b.pdf"], "output": "first.pdf"})
+    second = run_tool("merge", {"files": ["a.pdf", "b.pdf"], "output": "second.pdf"})
+
+    after = result_cache.stats()
+    assert after["hits"] == before["hits"] + 1
+    assert after["stores"] == before["stores"] + 1
+    assert Path(second).name == "second.pdf"
+    assert Path(first).read_bytes() == Path(second).read_bytes()
+
+    ops = list(Operation.objects.order_by("id"))
+    assert [op.cache_hit for op in ops] == [False, True]
+    assert ops[0].out_hash == ops[1].out_hash
+    assert ops[0].in_hash == ops[1].in_hash
+
+def test_cache_opt_out_and_changed_input(cache_env):
+    """use_cache=False 一定重新執行；輸入內容改變時不可命中舊結果。"""
+    run_tool("split", {"file": "b.pdf", "pages": "1"})
+    run_tool("split", {"file": "b.pdf", "pages": "1"}, use_cache=False)
+
+    _write_blank_pdf(cache_env / "files" / "b.pdf", pages=2, width=300)
+    run_tool("split", {"file": "b.pdf", "pages": "1"})
+
+    assert list(Operation.objects.order_by("id").values_list("cache_hit", flat=True)) == [False, False, False]
+
+def test_same_content_under_another_name_is_not_reused_for_split(cache_env):
+    """內容相同但檔名不同的輸入：split 的輸出以輸入檔名命名，不可回傳另一個檔名的快取結果。"""
+    (cache_env / "files" / "c.pdf").write_bytes((cache_env / "files" / "a.pdf").read_bytes())
+
+    first = run_tool("split", {"file": "a.pdf", "pages": "1"})
+    second = run_tool("split", {"file": "c.pdf", "pages": "1"})
+    third = run_tool("split", {"file": "c.pdf", "pages": "1"})
+
+    assert Path(first).name == "a_split.pdf"
+    assert Path(second).name == "c_split.pdf" and Path(second).is_file()
+    assert Path(third) == Path(second)
+    assert list(Operation.objects.order_by("id").values_list("cache_hit", flat=True)) == [False, False, True]
+
+def test_editing_a_fetched_output_does_not_change_the_cache_entry(cache_env):
+    """就地修改 (大小不變) 從快取取出的輸出，不可影響快取內容；再次取出仍是原本的位元組。"""
+    first = Path(run_tool("merge", {"files": ["a.pdf", "b.pdf"], "output": "first.pdf"}))
+    original = first.read_bytes()
+    second = Path(run_tool("merge", {"files": ["a.pdf", "b.pdf"], "output": "second.pdf"})) # 快取命中
+
+    with open(second, "r+b") as f: # 就地覆寫，不改變大小
+        f.write(b"X" * 16)
+    third = Path(run_tool("merge", {"files": ["a.pdf", "b.pdf"], "output": "third.pdf"}))
+
+    assert third.read_bytes() == original
+    assert second.stat().st_ino != third.stat().st_ino
+    assert list(Operation.objects.order_by("id").values_list("cache_hit", flat=True)) == [False, True, True]
+
+def test_eviction_respects_size_budget(cache_env, settings):
+    """快取總大小超出上限時，應淘汰最久未使用的項目。"""
+    run_tool("merge", {"files": ["a.pdf"], "output": "one.pdf"})
+    settings.PDF_RESULT_CACHE_MAX_BYTES = 1
+    run_tool("merge", {"files": ["b.pdf"], "output": "two.pdf"})
+
+    entries = list(Path(settings.PDF_RESULT_CACHE_ROOT).glob(f"*/*/{result_cache.META_FILENAME}"))
+    assert entries == []
@@ -0,0 +1,118 @@
+import time
+import pytest
+from pypdf import PdfWriter
+from apptrace.models import Operation
+from core import engine, sandbox
+from core.engine import run_tool
+from core.sandbox import SandboxLimits, SandboxPool, ToolRunKilled
+from tests.sandbox_targets import allocate, spin, fail, hang, child_pool_pids
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(workers=1)
+    yield pool
+    pool.shutdown()
+
+def test_runs_and_propagates_errors(pool):
+    limits = SandboxLimits(timeout_seconds=30)
+    assert pool.run("t", limits, allocate, 1) == 1024 * 1024
+    with pytest.raises(ValueError, match="壞掉的參數"):
+        pool.run("t", limits, fail)
+
+def test_wall_clock_timeout_recycles_worker(pool):
+    with pytest.raises(ToolRunKilled, match="wall-clock timeout"):
+        pool.run("t", SandboxLimits(timeout_seconds=0.5), time.sleep, 30)
+    assert pool.run("t", SandboxLimits(timeout_seconds=30), allocate, 1) == 1024 * 1024 # 換上新的 worker
+
+def test_memory_and_cpu_limits(pool):
+    with pytest.raises(ToolRunKilled, match="memory limit"):
+        pool.run("t", SandboxLimits(memory_mb=256, timeout_seconds=30), allocate, 2048)
+    with pytest.raises(ToolRunKilled, match="CPU time limit"):
+        pool.run("t", SandboxLimits(cpu_seconds=1, timeout_seconds=30), spin)
+    assert pool.run("t", SandboxLimits(timeout_seconds=30), allocate, 1) == 1024 * 1024
+
+@pytest.mark.sandbox
+def test_worker_can_start_a_child_pool(pool):
+    """沙箱 worker 不是 daemon 行程，工具可以在其中開自己的行程池。"""
+    worker_pid, child_pids = pool.run("t", SandboxLimits(timeout_seconds=30), child_pool_pids, 2)
+    assert child_pids and worker_pid not in child_pids
+
+def test_shutdown_kills_busy_worker():
+    """關閉沙箱池時，執行中的 worker 也要被終止，不會留下非 daemon 行程。"""
+    pool = SandboxPool(workers=1)
+    process = next(iter(pool._live)).process
+    future = pool.executor_for("merge").submit(time.sleep, 30)
+    time.sleep(0.5)
+    pool.shutdown()
+    with pytest.raises(ToolRunKilled):
+        future.result(timeout=10)
+    assert not process.is_alive()
+
+@pytest.mark.django_db
+def test_run_tool_in_sandbox_reports_killed_run(settings, tmp_path, monkeypatch):
+    """沙箱中被終止的工具執行要寫入一筆乾淨的 error Operation，而不是拖垮呼叫端。"""
+    files_root = tmp_path / "files"
+    files_root.mkdir()
+    settings.BASE_DIR = tmp_path
+    settings.PDF_FILES_ROOT = files_root
+    settings.PDF_RESULT_CACHE_ENABLED = False
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    settings.PDF_SANDBOX_ENABLED = True
+    settings.PDF_SANDBOX_WORKERS = 1
+    writer = PdfWriter()
+    writer.add_blank_page(width=200, height=200)
+    with open(files_root / "a.pdf", "wb") as f:
+        writer.write(f)
+
+    try:
+        run_tool("merge", {"files": ["a.pdf"], "output": "ok.pdf"})
+        assert (files_root / "ok.pdf").exists()
+
+        settings.PDF_SANDBOX_LIMITS = {"default": {"timeout_seconds": 1}}
+        monkeypatch.setattr(engine, "execute_tool", hang) # 在 worker 中卡住的工具
+        with pytest.raises(ToolRunKilled):
+            run_tool("merge", {"files": ["a.pdf"], "output": "too_big.pdf"})
+    finally:
+        sandbox.shutdown_pool()
+
+    op = Operation.objects.get(status="error")
+    assert op.tool == "merge" and "wall-clock timeout" in op.error_message
+    assert Operation.objects.filter(status="success").count() == 1
+
+def _bulky_pdf(path, payload: bytes):
+    """一頁的 PDF，頁面資源中帶一個未壓縮的大型 XObject (payload)。"""
+    from pypdf.generic import DictionaryObject, NameObject, NumberObject, ArrayObject
+    from tools.pdfstream import add_object, decoded_stream
+    writer = PdfWriter()
+    page = writer.add_blank_page(width=200, height=200)
+    form = decoded_stream(payload)
+    form.update({NameObject("/Type"): NameObject("/XObject"), NameObject("/Subtype"): NameObject("/Form"),
+                 NameObject("/BBox"): ArrayObject([NumberObject(0), NumberObject(0), NumberObject(1), NumberObject(1)])})
+    page[NameObject("/Resources")] = DictionaryObject({NameObject("/XObject"): DictionaryObject({NameObject("/Bulk"): add_object(writer, form)})})
+    with open(path, "wb") as f:
+        writer.write(f)
+
+@pytest.mark.django_db
+def test_streaming_merge_stays_within_the_sandbox_memory_cap(settings, tmp_path):
+    """串流合併在沙箱的位址空間上限 (RLIMIT_AS) 內完成：每個輸入用完即解除映射，不會整個請求都留著。"""
+    import os
+    files_root = tmp_path / "files"
+    files_root.mkdir()
+    settings.BASE_DIR = tmp_path
+    settings.PDF_FILES_ROOT = files_root
+    settings.PDF_RESULT_CACHE_ENABLED = False
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    settings.PDF_SANDBOX_ENABLED = True
+    settings.PDF_SANDBOX_WORKERS = 1
+    settings.PDF_SANDBOX_LIMITS = {"default": {"memory_mb": 512, "timeout_seconds": 120}}
+
+    count, size_mb = 24, 16 # 384 MB of inputs: mapping all of them at once does not fit next to the interpreter
+    for i in range(count):
+        _bulky_pdf(files_root / f"part{i}.pdf", os.urandom(size_mb * 1024 * 1024 - 64 * 1024) + bytes([i]) * (64 * 1024))
+
+    try:
+        output = run_tool("merge", {"files": [f"part{i}.pdf" for i in range(count)], "output": "merged.pdf", "streaming": True})
+    finally:
+        sandbox.shutdown_pool()
+    from pypdf import PdfReader
+    assert len(PdfReader(output).pages) == count
@@ -0,0 +1,64 @@
+import hashlib
+import pytest
+from pathlib import Path
+from pypdf import PdfWriter
+from apptrace.models import Operation
+from core import digest_cache
+from core.engine import run_tool
+from core.sink import OutputSinks
+
+def test_sink_hashes_while_writing_and_commits_atomically(tmp_path):
+    """寫入時即計算 SHA-256 與大小；提交前目標檔維持原內容，提交後才被替換。"""
+    target = tmp_path / "out.bin"
+    target.write_bytes(b"old content")
+    outputs = OutputSinks()
+
+    with outputs.open(str(target)) as sink:
+        sink.write(b"new ")
+        sink.write(memoryview(b"content"))
+        assert sink.tell() == 11
+        assert target.read_bytes() == b"old content"
+
+    result = outputs.get(str(target))
+    assert target.read_bytes() == b"new content"
+    assert result.sha256 == hashlib.sha256(b"new content").hexdigest()
+    assert result.size == 11
+    assert [p.name for p in tmp_path.iterdir()] == ["out.bin"]
+
+def test_sink_discards_partial_output_on_error(tmp_path):
+    """工具中途失敗時不可留下半成品，也不可覆蓋既有檔案。"""
+    target = tmp_path / "out.bin"
+    target.write_bytes(b"keep me")
+    outputs = OutputSinks()
+
+    with pytest.raises(RuntimeError):
+        with outputs.open(str(target)) as sink:
+            sink.write(b"partial")
+            raise RuntimeError("boom")
+
+    assert target.read_bytes() == b"keep me"
+    assert outputs.get(str(target)) is None
+    assert [p.name for p in tmp_path.iterdir()] == ["out.bin"]
+
+@pytest.mark.django_db
+def test_engine_takes_out_hash_from_sink(settings, tmp_path):
+    """run_tool 的 out_hash 來自寫入時的摘要，不會再讀一次輸出檔。"""
+    files_root = tmp_path / "files"
+    files_root.mkdir()
+    settings.BASE_DIR = tmp_path
+    settings.PDF_FILES_ROOT = files_root
+    settings.PDF_RESULT_CACHE_ENABLED = False
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    writer = PdfWriter()
+    writer.add_blank_page(width=200, height=200)
+    with open(files_root / "a.pdf", "wb") as f:
+        writer.write(f)
+    input_size = (files_root / "a.pdf").stat().st_size
+    before = digest_cache.stats()
+
+    output = run_tool("merge", {"files": ["a.pdf"], "output": "merged.pdf"})
+
+    op = Operation.objects.get()
+    assert op.out_hash == hashlib.sha256(Path(output).read_bytes()).hexdigest()
+    # 只有輸入檔被讀取雜湊
+    assert digest_cache.stats()["bytes_hashed"] == before["bytes_hashed"] + input_size
@@ -0,0 +1,131 @@
+import pytest
+from pathlib import Path
+from pypdf import PdfReader, PdfWriter
+from apptrace.models import Operation
+from core.engine import run_tool, run_pipeline
+from core.secure import hash_file
+from tools import split
+
+pytestmark = pytest.mark.django_db
+
+def _write_pdf(path: Path, pages: int):
+    """每頁寬度不同 (100 + 頁碼)，用來辨認輸出中的頁面。"""
+    writer = PdfWriter()
+    for i in range(pages):
+        writer.add_blank_page(width=100 + i + 1, height=200)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+def _page_numbers(path) -> list[int]:
+    return [int(page.mediabox.width) - 100 for page in PdfReader(path).pages]
+
+@pytest.fixture
+def split_env(settings, tmp_path):
+    files_root = tmp_path / "files"
+    files_root.mkdir()
+    settings.BASE_DIR = tmp_path
+    settings.PDF_FILES_ROOT = files_root
+    settings.PDF_RESULT_CACHE_ENABLED = False
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    _write_pdf(files_root / "doc.pdf", 12)
+    return tmp_path
+
+def test_groups_write_one_file_each_and_one_trace_row(split_env):
+    """多個群組在同一次執行中各輸出一個檔案，並只寫入一筆含所有輸出雜湊的 Operation。"""
+    outputs = run_tool("split", {"file": "doc.pdf", "pages": "1-3;intro=4-5;11--1", "output_dir": "parts"})
+
+    assert [Path(p).name for p in outputs] == ["doc_part1.pdf", "doc_intro.pdf", "doc_part3.pdf"]
+    assert [_page_numbers(p) for p in outputs] == [[1, 2, 3], [4, 5], [11, 12]]
+
+    op = Operation.objects.get()
+    assert op.out_hashes == [hash_file(p) for p in outputs]
+    assert op.out_hash == op.out_hashes[0]
+    assert op.page_count == 7
+
+def test_burst_writes_every_n_pages(split_env):
+    outputs = run_tool("split", {"file": "doc.pdf", "burst": 5, "output_dir": "burst"})
+    assert [Path(p).name for p in outputs] == ["doc_p1-5.pdf", "doc_p6-10.pdf", "doc_p11-12.pdf"]
+    assert [_page_numbers(p) for p in outputs] == [[1, 2, 3, 4, 5], [6, 7, 8, 9, 10], [11, 12]]
+
+    outputs = run_tool("split", {"file": "doc.pdf", "pages": "!2-11", "burst": 1, "output_dir": "burst"})
+    assert [Path(p).name for p in outputs] == ["doc_p1.pdf", "doc_p12.pdf"]
+
+def test_single_range_keeps_single_output(split_env):
+    output = run_tool("split", {"file": "doc.pdf", "pages": "2-3", "output_dir": "single"})
+    assert isinstance(output, str) and Path(output).name == "doc_split.pdf"
+    assert Operation.objects.get().out_hashes is None
+
+def test_multi_output_cache_hit_restores_every_file(split_env, settings):
+    settings.PDF_RESULT_CACHE_ENABLED = True
+    settings.PDF_RESULT_CACHE_ROOT = split_env / "cache"
+    first = run_tool("split", {"file": "doc.pdf", "pages": "1;2", "output_dir": "first"})
+    second = run_tool("split", {"file": "doc.pdf", "pages": "1;2", "output_dir": "second"})
+
+    assert [Path(p).name for p in second] == ["doc_part1.pdf", "doc_part2.pdf"]
+    assert [Path(p).read_bytes() for p in first] == [Path(p).read_bytes() for p in second]
+    ops = list(Operation.objects.order_by("id"))
+    assert [op.cache_hit for op in ops] == [False, True]
+    assert ops[0].out_hashes == ops[1].out_hashes
+
+@pytest.mark.parametrize("args, message", [
+    ({"pages": "a=1;a=2"}, "群組名稱不可重複"),
+    ({"pages": "bad name=1"}, "無效的群組名稱"),
+    ({"pages": "1;;2"}, "頁碼群組不可為空"),
+    ({"pages": "1;2", "burst": 1}, "cannot be combined"),
+    ({}, "Either 'pages' or 'burst'"),
+])
+def test_invalid_groups_are_rejected(split_env, args, message):
+    with pytest.raises(ValueError, match=message):
+        run_tool("split", dict(args, file="doc.pdf", output_dir="bad"))
+
+def test_multi_output_split_cannot_be_a_pipeline_step(split_env):
+    with pytest.raises(ValueError, match="pipeline"):
+        run_pipeline([{"tool": "split", "args": {"file": "doc.pdf", "pages": "1;2"}}])
+
+def test_groups_share_one_parse(tmp_path, monkeypatch):
+    """所有輸出都來自同一個 PdfReader。"""
+    _write_pdf(tmp_path / "doc.pdf", 4)
+    opened = []
+    real_mapped_reader = split.mapped_reader
+    monkeypatch.setattr(split, "mapped_reader", lambda path: opened.append(path) or real_mapped_reader(path))
+
+    outputs = split.run({"file": str(tmp_path / "doc.pdf"), "pages": "1;2;3-4", "output_dir": str(tmp_path)})
+    assert len(outputs) == 3
+    assert len(opened) == 1
+
+def test_parallel_burst_matches_sequential(tmp_path, settings):
+    """平行寫出的檔案、回傳順序與記錄的雜湊，都和單一程序寫出的結果相同。"""
+    _write_pdf(tmp_path / "doc.pdf", 20)
+    args = {"file": str(tmp_path / "doc.pdf"), "burst": 3}
+    settings.PDF_SPLIT_PARALLEL_MIN_OUTPUTS = 2
+
+    def split_with(workers):
+        settings.PDF_SPLIT_WRITE_WORKERS = workers
+        out_dir = tmp_path / f"w{workers}"
+        out_dir.mkdir()
+        outputs, reported = split.OutputSinks(), []
+        paths = split.run_multi(dict(args, output_dir=str(out_dir)), outputs, progress=lambda done, total: reported.append((done, total)))
+        return paths, [outputs.get(p).sha256 for p in paths], reported
+
+    sequential, sequential_hashes, _ = split_with(1)
+    parallel, parallel_hashes, reported = split_with(3)
+
+    assert [Path(p).name for p in parallel] == [Path(p).name for p in sequential]
+    assert parallel_hashes == sequential_hashes
+    assert [_page_numbers(p) for p in parallel][-1] == [19, 20]
+    assert reported[-1] == (7, 7)
+    assert [done for done, _ in reported] == sorted(done for done, _ in reported)
+
+@pytest.mark.sandbox
+def test_parallel_writer_runs_in_sandbox_and_stays_within_batch_share(settings, monkeypatch):
+    """沙箱 worker 中仍會平行寫出；批次 worker 中的巢狀行程池則不超過該 worker 分到的 CPU 數。"""
+    from core import sandbox, worker
+    from tests.sandbox_targets import split_write_workers
+    settings.PDF_SPLIT_PARALLEL_MIN_OUTPUTS = 2
+    settings.PDF_SPLIT_WRITE_WORKERS = 4
+
+    assert sandbox.get_pool().run("split", sandbox.limits_for("split"), split_write_workers, 100) == 4
+
+    monkeypatch.setattr(worker, "_cpu_share", None)
+    worker.set_cpu_share(2) # 例如 8 顆 CPU、4 個批次 worker
+    assert split._write_workers(100) == 2
@@ -0,0 +1,243 @@
+import os
+import pytest
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import StreamObject
+from tools import add_stamp
+from tools.pdfstream import stored_data
+
+def _write_pdf(path, sizes):
+    writer = PdfWriter()
+    for width, height in sizes:
+        writer.add_blank_page(width=width, height=height)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+@pytest.fixture
+def stamp_env(tmp_path, monkeypatch):
+    """兩種頁面尺寸交錯的 6 頁文件、一個印章圖片，並記錄每次實際繪製印章的比例。"""
+    _write_pdf(tmp_path / "doc.pdf", [(300 if i % 2 else 200, 400) for i in range(6)])
+    Image.new("RGB", (30, 15), "red").save(tmp_path / "stamp.png")
+
+    monkeypatch.setattr(add_stamp, "_stamp_cache", add_stamp.OrderedDict())
+    monkeypatch.setattr(add_stamp, "_image_cache", add_stamp.OrderedDict())
+    rendered = []
+    real_render = add_stamp._render_stamp
+    def counting_render(path, digest, scale):
+        rendered.append(scale)
+        return real_render(path, digest, scale)
+    monkeypatch.setattr(add_stamp, "_render_stamp", counting_render)
+    return tmp_path, rendered
+
+def _stamp(tmp_path, output_name, **extra):
+    args = dict({"file": str(tmp_path / "doc.pdf"), "stamp_path": str(tmp_path / "stamp.png"), "page": 0, "pos": "br", "scale": 1.0,
+                 "output": str(tmp_path / output_name)}, **extra)
+    return PdfReader(add_stamp.run(args))
+
+def _stamp_refs(page) -> set[int]:
+    xobjects = page["/Resources"]["/XObject"]
+    return {xobjects.raw_get(name).idnum for name in xobjects if name.startswith("/PdfShellStamp")}
+
+def test_all_pages_share_one_stamp_form(stamp_env):
+    """所有頁面 (不論尺寸) 都引用同一個印章 Form XObject，印章只繪製一次。"""
+    tmp_path, rendered = stamp_env
+    reader = _stamp(tmp_path, "out.pdf")
+
+    assert rendered == [1.0]
+    assert len(reader.pages) == 6
+    assert len({ref for page in reader.pages for ref in _stamp_refs(page)}) == 1
+    # 印章位置依頁面寬度計算 (右下角)
+    assert b"30.0000 20.0000 cm" in reader.pages[0].get_contents().get_data()
+    assert b"130.0000 20.0000 cm" in reader.pages[1].get_contents().get_data()
+
+def test_stamp_file_is_hashed_once_per_run(stamp_env, monkeypatch):
+    """印章檔案在每次執行中只讀取並雜湊一次，而非每頁一次；繪製時沿用同一個雜湊值。"""
+    tmp_path, _ = stamp_env
+    hashed = []
+    real_digest = add_stamp._stamp_digest
+    monkeypatch.setattr(add_stamp, "_stamp_digest", lambda path: hashed.append(path) or real_digest(path))
+
+    _stamp(tmp_path, "out.pdf", scale=0.5)
+    assert hashed == [str(tmp_path / "stamp.png")]
+
+def test_stamps_are_reused_across_runs_until_the_stamp_changes(stamp_env):
+    tmp_path, rendered = stamp_env
+    _stamp(tmp_path, "first.pdf")
+    _stamp(tmp_path, "second.pdf", pos="tl")
+    assert len(rendered) == 1
+
+    _stamp(tmp_path, "scaled.pdf", scale=0.5)
+    assert len(rendered) == 2
+
+    Image.new("RGB", (30, 15), "blue").save(tmp_path / "stamp.png")
+    _stamp(tmp_path, "changed.pdf")
+    assert len(rendered) == 3
+
+def test_page_content_is_kept_and_stamp_drawn_after_it(tmp_path):
+    _write_pdf(tmp_path / "doc.pdf", [(200, 400)] * 2)
+    Image.new("RGB", (30, 15), "red").save(tmp_path / "stamp.png")
+    reader = _stamp(tmp_path, "single.pdf", page=-1)
+
+    assert "/XObject" not in reader.pages[0]["/Resources"]
+    data = reader.pages[1].get_contents().get_data()
+    assert data.startswith(b"q") and data.rstrip().endswith(b"Do Q")
+
+def test_stamp_image_is_decoded_once_per_content(stamp_env, monkeypatch, settings):
+    """解碼後的印章圖片依內容雜湊快取：不同比例共用同一次解碼，超過記憶體上限時淘汰最舊的。"""
+    tmp_path, rendered = stamp_env
+    decoded = []
+    real_decode = add_stamp._decode_image
+    monkeypatch.setattr(add_stamp, "_decode_image", lambda data: decoded.append(len(data)) or real_decode(data))
+
+    _stamp(tmp_path, "a.pdf")
+    _stamp(tmp_path, "b.pdf", scale=0.5)
+    assert len(rendered) == 2 and len(decoded) == 1
+
+    # 30x15 RGB = 1350 bytes; a budget of ~2 images keeps only the two most recent
+    settings.PDF_STAMP_IMAGE_CACHE_MB = 2800 / (1024 * 1024)
+    for color in ("blue", "green"):
+        Image.new("RGB", (30, 15), color).save(tmp_path / f"{color}.png")
+        add_stamp.stamp_image(str(tmp_path / f"{color}.png"))
+    assert len(add_stamp._image_cache) == 2
+    add_stamp.stamp_image(str(tmp_path / "stamp.png"))
+    assert len(decoded) == 4
+
+def test_warm_stamp_images_preloads_shared_stamps(stamp_env):
+    tmp_path, _ = stamp_env
+    (tmp_path / "broken.png").write_bytes(b"not an image")
+    loaded = add_stamp.warm_stamp_images([tmp_path / "stamp.png", tmp_path / "doc.pdf", tmp_path / "missing.png", tmp_path / "broken.png"])
+    assert loaded == 1
+    assert add_stamp._stamp_digest(str(tmp_path / "stamp.png")) in add_stamp._image_cache
+
+def test_thousand_page_stamp_embeds_the_image_once(tmp_path):
+    """輸出大小回歸測試：1000 頁全部蓋章，圖片只嵌入一次，每頁只增加少量位元組。"""
+    pages = 1000
+    _write_pdf(tmp_path / "doc.pdf", [(595, 842)] * pages)
+    Image.frombytes("RGB", (200, 100), os.urandom(200 * 100 * 3)).save(tmp_path / "stamp.png") # 無法壓縮的雜訊圖
+
+    reader = _stamp(tmp_path, "stamped.pdf")
+    objects = [reader.get_object(i) for i in range(1, reader.trailer["/Size"])]
+    images = [obj for obj in objects if isinstance(obj, StreamObject) and obj.get("/Subtype") == "/Image"]
+    image_bytes = sum(len(stored_data(image)) for image in images)
+    growth = os.path.getsize(tmp_path / "stamped.pdf") - os.path.getsize(tmp_path / "doc.pdf")
+
+    assert len(images) == 1
+    assert image_bytes >= 200 * 100 * 3 * 0.9
+    assert growth < image_bytes + pages * 150
+
+def test_page_range_and_several_stamps_in_one_pass(stamp_env):
+    """頁碼範圍與多個印章 (不同圖片、位置、比例) 在同一次讀寫中完成。"""
+    tmp_path, rendered = stamp_env
+    Image.new("RGB", (30, 15), "blue").save(tmp_path / "seal.png")
+    reader = _stamp(tmp_path, "multi.pdf", page=None, pages="1,3-4", stamps=[
+        {"stamp_path": str(tmp_path / "seal.png"), "pages": "!1", "pos": "tl", "scale": 0.5},
+        {"stamp_path": str(tmp_path / "stamp.png"), "pages": "-1", "pos": "tr"},
+    ])
+
+    stamps_per_page = [len(_stamp_refs(page)) for page in reader.pages]
+    assert stamps_per_page == [1, 1, 2, 2, 1, 2]
+    assert sorted(rendered) == [0.5, 1.0] # 同一張圖片與比例只繪製一次
+    last_page = reader.pages[5].get_contents().get_data()
+    assert last_page.count(b" Do Q") == 2 and b"130.0000 305.0000 cm" in last_page
+
+@pytest.mark.parametrize("extra, message", [
+    ({"page": None}, "exactly one of 'page' or 'pages'"),
+    ({"pages": "1"}, "exactly one of 'page' or 'pages'"),
+    ({"stamp_path": None, "page": None}, "Either 'stamp_path' or 'stamps'"),
+    ({"stamp_path": None, "stamps": [{"stamp_path": "s.png"}]}, "give each entry of 'stamps' its own 'pages'"),
+])
+def test_stamp_arguments_are_validated(extra, message):
+    args = dict({"file": "/x/a.pdf", "stamp_path": "/x/s.png", "page": 1}, **extra)
+    with pytest.raises(ValueError, match=message):
+        add_stamp.ArgsSchema(**args)
+
+@pytest.mark.django_db
+def test_engine_resolves_paths_inside_stamps(settings, tmp_path):
+    files_root = tmp_path / "files"
+    files_root.mkdir()
+    settings.BASE_DIR = tmp_path
+    settings.PDF_FILES_ROOT = files_root
+    settings.PDF_RESULT_CACHE_ENABLED = False
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    _write_pdf(files_root / "doc.pdf", [(200, 400)] * 3)
+    Image.new("RGB", (30, 15), "red").save(files_root / "stamp.png")
+    from core.engine import run_tool
+
+    stamps = [{"stamp_path": "stamp.png", "pages": "2-3"}]
+    output = run_tool("add_stamp", {"file": "doc.pdf", "stamps": stamps, "output": "out.pdf"})
+    assert [len(_stamp_refs(p)) if "/XObject" in p["/Resources"] else 0 for p in PdfReader(output).pages] == [0, 1, 1]
+    assert stamps == [{"stamp_path": "stamp.png", "pages": "2-3"}] # 呼叫端的參數不被改寫
+
+    with pytest.raises(ValueError, match="Access denied"):
+        run_tool("add_stamp", {"file": "doc.pdf", "stamps": [{"stamp_path": "../../etc/passwd"}], "output": "bad.pdf"})
+
+@pytest.mark.django_db
+@pytest.mark.sandbox
+def test_sandbox_workers_start_with_the_shared_stamps_decoded(settings, tmp_path):
+    """沙箱 worker 啟動時就解碼共用印章，所以在沙箱中執行的 add_stamp 直接命中快取。"""
+    from core import sandbox
+    from core.engine import run_tool
+    from tests import sandbox_targets
+    files_root = tmp_path / "files"
+    files_root.mkdir()
+    settings.BASE_DIR = tmp_path
+    settings.PDF_FILES_ROOT = files_root
+    settings.PDF_RESULT_CACHE_ENABLED = False
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    settings.DEFAULT_SHARED_FILES = ["shared_stamp.png"]
+    settings.PDF_STAMP_WARMUP = True
+    settings.PDF_SANDBOX_WORKERS = 1 # 查詢統計與執行工具落在同一個 worker
+    _write_pdf(files_root / "doc.pdf", [(200, 400)] * 3)
+    Image.new("RGB", (30, 15), "red").save(files_root / "shared_stamp.png")
+
+    sandbox.shutdown_pool() # 以上面的設定啟動新的池
+    try:
+        pool = sandbox.get_pool()
+        limits = sandbox.SandboxLimits()
+        before = pool.run("test", limits, sandbox_targets.stamp_cache_stats)
+        assert before["entries"] == 1
+
+        run_tool("add_stamp", {"file": "doc.pdf", "stamp_path": "shared_stamp.png", "pages": "1-3", "output": "out.pdf"})
+        after = pool.run("test", limits, sandbox_targets.stamp_cache_stats)
+        assert after["hits"] > before["hits"]
+        assert after["misses"] == before["misses"]
+    finally:
+        sandbox.shutdown_pool() # 其他測試使用預設設定的池
+
+def test_incremental_save_appends_to_the_original_bytes(tmp_path):
+    """增量儲存：原始位元組完全不變，只附加印章物件與被修改的頁面字典。"""
+    _write_pdf(tmp_path / "doc.pdf", [(595, 842)] * 200)
+    Image.new("RGB", (30, 15), "red").save(tmp_path / "stamp.png")
+    original = (tmp_path / "doc.pdf").read_bytes()
+
+    reader = _stamp(tmp_path, "inc.pdf", page=None, pages="2,5", incremental=True)
+    data = (tmp_path / "inc.pdf").read_bytes()
+    assert data.startswith(original)
+    assert len(data) - len(original) < 4096 # 與變更大小成正比，而非文件大小
+    assert [i for i, page in enumerate(reader.pages, 1) if "/XObject" in page["/Resources"]] == [2, 5]
+    assert len(reader.pages) == 200
+
+    # 再次增量儲存 (這次接在 xref stream 之後) 仍保留前一版的位元組
+    from tools.pdfstream import IncrementalUpdate
+    update = IncrementalUpdate(PdfReader(tmp_path / "inc.pdf"), data)
+    update.xref_stream = True
+    with open(tmp_path / "xs.pdf", "wb") as f:
+        update.write(f)
+    args = {"file": str(tmp_path / "xs.pdf"), "stamp_path": str(tmp_path / "stamp.png"), "page": -1, "incremental": True, "output": str(tmp_path / "again.pdf")}
+    again = PdfReader(add_stamp.run(args), strict=True)
+    assert (tmp_path / "again.pdf").read_bytes().startswith(data)
+    assert [i for i, page in enumerate(again.pages, 1) if "/XObject" in page["/Resources"]] == [2, 5, 200]
+
+def test_incremental_save_rejects_encrypted_input_and_pipelines(tmp_path):
+    writer = PdfWriter()
+    writer.add_blank_page(width=200, height=200)
+    writer.encrypt("secret")
+    with open(tmp_path / "locked.pdf", "wb") as f:
+        writer.write(f)
+    Image.new("RGB", (30, 15), "red").save(tmp_path / "stamp.png")
+
+    args = {"file": str(tmp_path / "locked.pdf"), "stamp_path": str(tmp_path / "stamp.png"), "page": 1, "incremental": True, "output": str(tmp_path / "out.pdf")}
+    with pytest.raises(ValueError, match="encrypted"):
+        add_stamp.run(args)
+    with pytest.raises(ValueError, match="pipeline"):
+        add_stamp.transform(args, source=PdfWriter())
@@ -0,0 +1,59 @@
+import json
+import logging
+import pytest
+from pathlib import Path
+from pypdf import PdfWriter
+from apptrace.models import Operation
+from core.engine import run_tool
+from core.timing import StageTimer
+
+pytestmark = [pytest.mark.django_db, pytest.mark.sandbox]
+
+@pytest.fixture
+def files_root(settings, tmp_path):
+    files_root = tmp_path / "files"
+    files_root.mkdir()
+    settings.BASE_DIR = tmp_path
+    settings.PDF_FILES_ROOT = files_root
+    settings.PDF_RESULT_CACHE_ENABLED = False
+    settings.PDF_DIGEST_CACHE_PATH = tmp_path / "digests.sqlite3"
+    writer = PdfWriter()
+    for _ in range(4):
+        writer.add_blank_page(width=200, height=200)
+    with open(files_root / "a.pdf", "wb") as f:
+        writer.write(f)
+    return files_root
+
+def test_stage_timer_accumulates_repeated_stages():
+    timer = StageTimer()
+    with timer.stage("tool"):
+        pass
+    timer.add("tool", 2.0)
+    assert timer.stages["tool"] >= 2.0
+    assert timer.duration_ms >= 0
+    assert set(timer.fields()) == {"duration_ms", "bytes_in", "bytes_out", "page_count", "bytes_saved", "stages"}
+
+def test_run_tool_stores_timings_on_operation(files_root, caplog):
+    """run_tool 將總耗時、各階段耗時、輸入/輸出位元組數與頁數寫入 Operation，並輸出一行結構化記錄。"""
+    with caplog.at_level(logging.INFO, logger="pdfshell.metrics"):
+        output = run_tool("merge", {"files": ["a.pdf", "a.pdf"], "output": "merged.pdf"})
+
+    op = Operation.objects.get(tool="merge")
+    assert op.page_count == 8
+    assert op.bytes_saved == 0 # 空白頁沒有可共用的資源
+    assert op.bytes_in == (files_root / "a.pdf").stat().st_size # 同一檔案只計一次
+    assert op.bytes_out == (files_root / "merged.pdf").stat().st_size == Path(output).stat().st_size
+    assert {"resolve", "hash_inputs", "validate", "tool", "hash_output"} <= set(op.stages)
+    assert op.duration_ms >= op.stages["tool"]
+
+    line = json.loads(next(r.getMessage() for r in caplog.records if r.name == "pdfshell.metrics"))
+    assert line["tool"] == "merge" and line["status"] == "success" and line["page_count"] == 8
+    assert "trace" in line["stages"] # 寫入 trace 本身的耗時只出現在記錄行中
+
+def test_failed_run_records_duration(files_root):
+    with pytest.raises(FileNotFoundError):
+        run_tool("split", {"file": "missing.pdf", "pages": "1"})
+
+    op = Operation.objects.get(tool="split")
+    assert op.status == "error"
+    assert op.duration_ms is not None and "resolve" in op.stages
@@ -2,6 +2,7 @@ import os
 import pytest
 from pathlib import Path
 from core.engine import run_tool
+from pydantic import ValidationError
 from pypdf import PdfReader, PdfWriter # For creating dummy PDFs
 from PIL import Image, ImageDraw # For creating dummy stamp image
 from reportlab.pdfgen import canvas as reportlab_canvas # Alias to avoid conflict with pytest canvas
@@ -9,7 +10,7 @@ from reportlab.lib.pagesizes import letter
 from io import BytesIO
 
 # Apply django_db mark to all tests in this module if not already applied to specific tests
-pytestmark = pytest.mark.django_db
+pytestmark = [pytest.mark.django_db, pytest.mark.sandbox]
 
 @pytest.fixture
 def sample_pdfs(tmp_path):
@@ -273,14 +274,7 @@ def test_redact_tool_empty_patterns_list(pdf_with_text_content, tmp_path):
         "patterns": [], # Empty list
         "output": str(output_file)
     }
-    # pydantic schema for RedactSchema has patterns: conlist(str, min_length=1)
-    # So, this should raise a validation error via Pydantic in coreapi/views.py if called via API.
-    # If run_tool is called directly (as in tests), tools/redact.py might handle it differently or pydantic validation is bypassed.
-    # tools/redact.py currently would not find any matches if patterns list is empty, so it might run successfully.
-    # Let's assume for direct tool call, it should run without error if list is empty (no patterns to match).
-    # If API validation layer is considered, this test might expect ValidationError.
-    # For now, testing direct tool behavior:
-    result_path_str = run_tool("redact", args)
-    result_path = Path(result_path_str)
-    assert result_path.exists()
-    # Similar to no_match, output should ideally be unchanged.
+    # RedactSchema (tools/redact.py) requires at least one pattern, and run_tool validates
+    # against it for direct calls as well as for the API, so an empty list is rejected.
+    with pytest.raises(ValidationError):
+        run_tool("redact", args)
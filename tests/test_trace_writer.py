@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import time
+import subprocess
+import datetime
+import pytest
+from django.utils import timezone
+from apptrace.models import Operation
+from apptrace.writer import TraceWriter, _to_json
+
+pytestmark = pytest.mark.django_db(transaction=True) # 寫入器在背景執行緒使用自己的連線
+
+def _row(i: int, **extra) -> dict:
+    return dict(tool="merge", args={"i": i}, in_hash=None, out_hash=None, status="success", error_message=None, created_at=timezone.now(), **extra)
+
+@pytest.fixture
+def writer(tmp_path):
+    w = TraceWriter(max_queue=100, flush_size=3, flush_interval=0.05, spill_path=tmp_path / "spill.jsonl")
+    yield w
+    w.close()
+
+def test_rows_are_bulk_written_in_background(writer):
+    """紀錄先進入佇列，由背景執行緒以 bulk_create 批次寫入，並保留原本的時間戳記。"""
+    past = timezone.now() - datetime.timedelta(minutes=5)
+    for i in range(7):
+        writer.submit(_row(i))
+    writer.submit(dict(_row(7), created_at=past))
+
+    assert writer.flush(timeout=5)
+
+    assert Operation.objects.count() == 8
+    assert Operation.objects.get(args__i=7).created_at == past
+    assert writer.stats()["written"] == 8
+    assert writer.stats()["flushes"] < 8
+
+def test_rows_spill_to_disk_and_replay_after_outage(writer, monkeypatch):
+    """資料庫無法寫入時紀錄寫到本機檔案，恢復後自動補寫，不會遺失。"""
+    def db_down(*args, **kwargs):
+        raise RuntimeError("database is unavailable")
+    monkeypatch.setattr(Operation.objects, "bulk_create", db_down)
+    for i in range(4):
+        writer.submit(_row(i))
+    assert writer.flush(timeout=5)
+    assert Operation.objects.count() == 0
+    assert len(writer.spill_path.read_text(encoding="utf-8").splitlines()) == 4
+
+    monkeypatch.undo()
+    time.sleep(0.1) # 讓重試間隔過去
+    writer.submit(_row(4))
+    assert writer.flush(timeout=5)
+
+    assert sorted(op.args["i"] for op in Operation.objects.all()) == [0, 1, 2, 3, 4]
+    assert not writer.spill_path.exists()
+    assert writer.stats()["replayed"] == 4
+
+def test_close_drains_queue(writer):
+    for i in range(2):
+        writer.submit(_row(i))
+    writer.close()
+    assert Operation.objects.count() == 2
+
+def test_rejected_row_is_quarantined_not_spilled(writer):
+    """批次中有一筆資料庫拒絕的紀錄時，其餘紀錄照常寫入，該筆移到隔離檔，不會整批溢寫到磁碟。"""
+    for i in range(2):
+        writer.submit(_row(i))
+    writer.submit(dict(_row(2), tool=None)) # tool 不可為 NULL
+    assert writer.flush(timeout=5)
+
+    assert sorted(op.args["i"] for op in Operation.objects.all()) == [0, 1]
+    assert not writer.spill_path.exists()
+    quarantined = [json.loads(line) for line in writer.quarantine_path.read_text(encoding="utf-8").splitlines()]
+    assert [row["args"]["i"] for row in quarantined] == [2]
+    assert "IntegrityError" in quarantined[0]["quarantine_error"]
+    assert writer.stats()["quarantined"] == 1 and writer.stats()["written"] == 2
+
+def test_bad_spilled_row_does_not_block_replay(writer):
+    """溢寫檔中有一筆無法寫入的紀錄時，重播只隔離該筆，其餘紀錄補寫成功，之後不會再重試它。"""
+    writer.spill_path.write_text("".join(_to_json(row) + "\n" for row in [_row(0), dict(_row(1), tool=None), _row(2)]), encoding="utf-8")
+
+    writer.submit(_row(3)) # 成功寫入後會重播溢寫檔
+    assert writer.flush(timeout=5)
+
+    assert sorted(op.args["i"] for op in Operation.objects.all()) == [0, 2, 3]
+    assert not writer.spill_path.exists()
+    assert len(writer.quarantine_path.read_text(encoding="utf-8").splitlines()) == 1
+    assert writer.stats()["replayed"] == 2
+
+def test_replay_left_by_a_dead_process_is_recovered_at_startup(tmp_path):
+    """重播途中當掉的程序留下的 .replaying 檔，在下一個寫入器啟動時補寫；仍在執行的程序的檔案則不動。"""
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    (tmp_path / f"spill.jsonl.{dead.pid}.replaying").write_text("".join(_to_json(_row(i)) + "\n" for i in range(2)), encoding="utf-8")
+    busy = tmp_path / f"spill.jsonl.{os.getppid()}.replaying"
+    busy.write_text(_to_json(_row(2)) + "\n", encoding="utf-8")
+
+    w = TraceWriter(max_queue=100, flush_size=3, flush_interval=0.05, spill_path=tmp_path / "spill.jsonl")
+    try:
+        assert w.flush(timeout=5)
+    finally:
+        w.close()
+
+    assert sorted(op.args["i"] for op in Operation.objects.all()) == [0, 1]
+    assert [p.name for p in tmp_path.glob("*.replaying")] == [busy.name]
+    assert w.stats()["replayed"] == 2
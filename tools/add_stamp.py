@@ -1,123 +1,362 @@
-from typing import Optional, Type, Literal
+from typing import List, Optional, Type, Literal
 from langchain_core.tools import BaseTool
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from pathlib import Path
 from pypdf import PdfReader, PdfWriter, PageObject
+from pypdf.generic import ArrayObject, DictionaryObject, FloatObject, IndirectObject, NameObject
 from reportlab.pdfgen import canvas
+from reportlab.lib.utils import ImageReader
 # from reportlab.lib.pagesizes import letter # Not strictly needed if using target page dimensions
 from io import BytesIO
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
 import logging
+import threading
+from core.sink import OutputSinks
+from core.inputs import buffer_for, mapped, mapped_reader
+from tools.pagerange import PageRange, all_pages, compile_range
+from tools.pdfstream import IncrementalUpdate, add_object, decoded_stream
+
+class StampSpec(BaseModel):
+    stamp_path: str = Field(description="The FULL PATH to the stamp image file (e.g., PNG, JPG).")
+    pages: str = Field(default="1--1", description="Pages to stamp, with the same range grammar as split (e.g. \"1,5,10-20\", \"!1\"). Defaults to every page.")
+    pos: Literal["br", "tr", "tl", "bl"] = Field(default="br", description="Position of the stamp. Defaults to 'br'.")
+    scale: float = Field(default=1.0, description="Scale factor for the stamp image. Defaults to 1.0.")
 
 class AddStampSchema(BaseModel):
     file: str = Field(description="The FULL PATH to the input PDF file.")
-    stamp_path: str = Field(description="The FULL PATH to the stamp image file (e.g., PNG, JPG).")
-    page: int = Field(description="The page number to add the stamp to. Use 1 for the first page, -1 for the last page.")
+    stamp_path: Optional[str] = Field(default=None, description="The FULL PATH to the stamp image file (e.g., PNG, JPG). Required unless 'stamps' is given.")
+    page: Optional[int] = Field(default=None, description="The page number to add the stamp to. Use 1 for the first page, -1 for the last page, 0 for all pages.")
+    pages: Optional[str] = Field(default=None, description="Instead of 'page': the pages to stamp, with the same range grammar as split (e.g. \"1,5,10-20\").")
     pos: Optional[Literal["br", "tr", "tl", "bl"]] = Field(default="br", description="Position of the stamp. Defaults to 'br'.")
     scale: Optional[float] = Field(default=1.0, description="Scale factor for the stamp image. Defaults to 1.0.")
+    stamps: Optional[List[StampSpec]] = Field(default=None, description="Several stamps (each with its own image, pages, position and scale), all applied in the same pass. Applied after the 'stamp_path' stamp if both are given.")
+    incremental: bool = Field(default=False, description="Save as an incremental update: the original bytes are kept unchanged and only the stamp objects and the changed pages are appended (keeps existing signatures' signed bytes intact).")
     output: Optional[str] = Field(default=None, description="The FULL PATH for the output stamped PDF file. If None, '_stamped' is appended to the input file name in the same directory.")
 
-def run(args: dict) -> str:
-    """Adds an image stamp to a specified page of a PDF file.
-    Assumes 'file', 'stamp_path', and 'output' in args are full, validated, absolute paths.
-    """
-    input_file_str: str = args['file']
-    stamp_image_str: str = args['stamp_path']
-    page_num: int = args['page']
-    position: str = args.get('pos', "br")
-    scale_factor: float = args.get('scale', 1.0)
-    output_final_path_str: str = args['output'] # 'output' is now always a full path from engine
+    @model_validator(mode="after")
+    def _check_stamps(self):
+        if self.stamp_path is None:
+            if not self.stamps:
+                raise ValueError("Either 'stamp_path' or 'stamps' is required.")
+            if self.page is not None or self.pages is not None:
+                raise ValueError("'page'/'pages' apply to 'stamp_path'; give each entry of 'stamps' its own 'pages'.")
+        elif (self.page is None) == (self.pages is None):
+            raise ValueError("Give exactly one of 'page' or 'pages' with 'stamp_path'.")
+        return self
+
+STAMP_BASE_SIZE = (150, 75) # Stamp size in points at scale 1.0
+STAMP_MARGIN = 20 # Distance from the page edges, in points
+STAMP_CACHE_SIZE = 64 # Rendered stamps kept across runs (each is a one-page PDF holding the image once)
+DEFAULT_IMAGE_CACHE_MB = 64 # Decoded stamp images kept across runs (see stamp_image)
+STAMP_IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg")
+
+_stamp_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+_stamp_cache_lock = threading.Lock()
+_image_cache: "OrderedDict[str, tuple[ImageReader, int]]" = OrderedDict() # Content hash -> (decoded image, decoded bytes)
+_image_cache_lock = threading.Lock()
+_image_stats = {"hits": 0, "misses": 0} # Guarded by _image_cache_lock
+_render_lock = threading.Lock() # An ImageReader keeps a file position, so renders sharing one are serialized
 
+def _setting(name: str, default):
+    # Tools also run in Django-free worker processes; fall back to the default there
     try:
-        # input_file_path = Path(input_file_str) # No longer needed to construct output path
-        stamp_image_path = Path(stamp_image_str)
-        output_final_path = Path(output_final_path_str)
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
 
-        # Engine ensures parent directory for output_final_path exists.
+def _stamp_digest(stamp_path: str) -> str:
+    """SHA-256 of the stamp image, from the request's mapping when there is one (core.inputs)."""
+    buffer = buffer_for(stamp_path)
+    data = buffer.data if buffer is not None else Path(stamp_path).read_bytes()
+    return hashlib.sha256(data).hexdigest()
 
-        reader = PdfReader(input_file_str)
-        if not reader.pages:
-            raise ValueError("The input PDF has no pages.")
+def _stamp_size(scale_factor: float) -> tuple[float, float]:
+    return STAMP_BASE_SIZE[0] * scale_factor, STAMP_BASE_SIZE[1] * scale_factor
 
-        writer = PdfWriter() # Initialize writer here to add all pages
-
-        if page_num == 0: # Stamp all pages
-            for i, current_target_page in enumerate(reader.pages):
-                packet = BytesIO()
-                canvas_width = float(current_target_page.mediabox.width)
-                canvas_height = float(current_target_page.mediabox.height)
-                c = canvas.Canvas(packet, pagesize=(canvas_width, canvas_height))
-
-                img_base_w, img_base_h = 150, 75
-                img_w, img_h = img_base_w * scale_factor, img_base_h * scale_factor
-
-                if position == "br": xy = (canvas_width - img_w - 20, 20)
-                elif position == "tr": xy = (canvas_width - img_w - 20, canvas_height - img_h - 20)
-                elif position == "tl": xy = (20, canvas_height - img_h - 20)
-                elif position == "bl": xy = (20, 20)
-                else: xy = (canvas_width - img_w - 20, 20) # Default to bottom-right
-
-                c.drawImage(str(stamp_image_path), xy[0], xy[1], width=img_w, height=img_h, mask='auto')
-                c.save()
-                packet.seek(0)
-
-                overlay_reader = PdfReader(packet)
-                if not overlay_reader.pages:
-                    logging.warning(f"Failed to create overlay for page {i+1}. Skipping stamp for this page.")
-                    # Add original page without stamp if overlay fails
-                    # writer.add_page(current_target_page) # This would add it again if loop continues, instead make sure all pages are added at the end or original is preserved
-                    # The current_target_page is a reference from reader.pages, so if we don't merge, it remains original.
-                    # We must add *every* page from the reader to the writer, stamped or not.
-                    continue # Skip merging for this page
-                
-                current_target_page.merge_page(overlay_reader.pages[0])
-                # No need to add page to writer here, done after loop for all pages from reader
-            
-            # After loop, all pages (modified or not) from reader are added to writer
-            for p_item in reader.pages:
-                writer.add_page(p_item)
+def _decode_image(data: bytes) -> tuple[ImageReader, int]:
+    """An ImageReader with its pixels (and alpha mask) already decoded, and the decoded size in bytes."""
+    image = ImageReader(BytesIO(data))
+    decoded = len(image.getRGBData())
+    if image._dataA is not None: # reportlab's alpha mask (it has no public accessor), used by drawImage(mask='auto')
+        decoded += len(image._dataA.getRGBData())
+    return image, decoded
+
+def stamp_image(stamp_image_path: str, stamp_digest: str | None = None) -> ImageReader:
+    """
+    The decoded stamp image, from a process-wide LRU keyed by the image's content hash and bounded
+    by PDF_STAMP_IMAGE_CACHE_MB of decoded pixels. Images larger than the budget are decoded but not kept.
+    """
+    if stamp_digest is None:
+        stamp_digest = _stamp_digest(stamp_image_path)
+    with _image_cache_lock:
+        if stamp_digest in _image_cache:
+            _image_cache.move_to_end(stamp_digest)
+            _image_stats["hits"] += 1
+            return _image_cache[stamp_digest][0]
+        _image_stats["misses"] += 1
+    buffer = buffer_for(stamp_image_path)
+    image, decoded = _decode_image(bytes(buffer.data) if buffer is not None else Path(stamp_image_path).read_bytes())
+    budget = _setting('PDF_STAMP_IMAGE_CACHE_MB', DEFAULT_IMAGE_CACHE_MB) * 1024 * 1024
+    if decoded <= budget:
+        with _image_cache_lock:
+            _image_cache[stamp_digest] = (image, decoded)
+            used = sum(size for _, size in _image_cache.values())
+            while used > budget:
+                _, (_, size) = _image_cache.popitem(last=False)
+                used -= size
+    return image
+
+def image_cache_stats() -> dict:
+    """Hits, misses and entries of this process's decoded-image cache."""
+    with _image_cache_lock:
+        return dict(_image_stats, entries=len(_image_cache))
+
+def warm_stamp_images(paths) -> int:
+    """Decodes the given stamp images into the cache (e.g. the shared stamps, at startup). Returns how many were loaded."""
+    loaded = 0
+    for path in paths:
+        path = Path(path)
+        if path.suffix.lower() not in STAMP_IMAGE_SUFFIXES or not path.is_file():
+            continue
+        try:
+            stamp_image(str(path))
+            loaded += 1
+        except Exception as e: # A broken shared stamp must not stop the server from starting
+            logging.warning(f"Could not preload stamp image {path}: {e}")
+    return loaded
+
+def _render_stamp(stamp_image_path: str, stamp_digest: str, scale_factor: float) -> bytes:
+    """Draws the stamp image on a page exactly its size and returns it as a one-page PDF."""
+    img_w, img_h = _stamp_size(scale_factor)
+    image = stamp_image(stamp_image_path, stamp_digest)
+    packet = BytesIO()
+    c = canvas.Canvas(packet, pagesize=(img_w, img_h))
+    with _render_lock:
+        c.drawImage(image, 0, 0, width=img_w, height=img_h, mask='auto')
+        c.save()
+    return packet.getvalue()
+
+def stamp_pdf(stamp_image_path: str, stamp_digest: str, scale_factor: float) -> bytes:
+    """
+    The rendered stamp for one scale, rendered once and then served from an in-process LRU keyed by
+    (scale, stamp content hash), so a changed stamp file is never reused. Page size and position
+    do not matter here: they only decide where the stamp is drawn (see _StampPlacer).
+    """
+    key = (scale_factor, stamp_digest)
+    with _stamp_cache_lock:
+        if key in _stamp_cache:
+            _stamp_cache.move_to_end(key)
+            return _stamp_cache[key]
+    data = _render_stamp(stamp_image_path, stamp_digest, scale_factor)
+    with _stamp_cache_lock:
+        _stamp_cache[key] = data
+        while len(_stamp_cache) > STAMP_CACHE_SIZE:
+            _stamp_cache.popitem(last=False)
+    return data
+
+def _stamp_origin(page: PageObject, img_w: float, img_h: float, position: str) -> tuple[float, float]:
+    canvas_width = float(page.mediabox.width)
+    canvas_height = float(page.mediabox.height)
+    if position == "br": return (canvas_width - img_w - STAMP_MARGIN, STAMP_MARGIN)
+    elif position == "tr": return (canvas_width - img_w - STAMP_MARGIN, canvas_height - img_h - STAMP_MARGIN)
+    elif position == "tl": return (STAMP_MARGIN, canvas_height - img_h - STAMP_MARGIN)
+    elif position == "bl": return (STAMP_MARGIN, STAMP_MARGIN)
+    return (canvas_width - img_w - STAMP_MARGIN, STAMP_MARGIN) # Default to bottom-right
+
+class _StampPlacer:
+    """
+    Draws stamps on the pages of one writer without merging page content.
+    Each (stamp image, scale) is embedded once as a Form XObject, and each placement (form, x, y) is
+    one small shared content stream; a stamped page only gets references to these objects, so the
+    output grows by the image size once rather than once per page, and the page's own content
+    streams are neither decoded nor rewritten.
+    With update (an IncrementalUpdate), pages are the reader's own and new objects go to the update;
+    a stamped page gets its own copy of its resource dictionaries, so the page dictionary is the
+    only original object that changes.
+    """
+    def __init__(self, writer: PdfWriter | None, update: IncrementalUpdate | None = None):
+        self.writer = writer
+        self.update = update
+        self._forms: dict[tuple[str, float], tuple[NameObject, IndirectObject]] = {} # (digest, scale) -> form
+        self._placed: dict[tuple[str, float], tuple[NameObject, IndirectObject]] = {} # (path, scale) -> form
+        self._draws: dict[tuple[str, float, float], IndirectObject] = {}
+        self._save_state: IndirectObject | None = None
+
+    def _form(self, stamp_image_path: str, scale_factor: float) -> tuple[NameObject, IndirectObject]:
+        # place() runs once per page; the stamp file is read and hashed only on its first use
+        placed_key = (stamp_image_path, scale_factor)
+        if placed_key not in self._placed:
+            self._placed[placed_key] = self._digest_form(stamp_image_path, _stamp_digest(stamp_image_path), scale_factor)
+        return self._placed[placed_key]
 
-        else: # Stamp a single page
-            actual_page_input_for_user_msg = page_num # page_num is already not 0 here
-            
-            if actual_page_input_for_user_msg < 0:
-                target_page_index = len(reader.pages) + actual_page_input_for_user_msg
-            else:
-                target_page_index = actual_page_input_for_user_msg - 1
-
-            if not (0 <= target_page_index < len(reader.pages)):
-                raise ValueError(f"Page number {actual_page_input_for_user_msg} is out of range for PDF with {len(reader.pages)} pages.")
-
-            target_page: PageObject = reader.pages[target_page_index]
-            packet = BytesIO()
-            canvas_width = float(target_page.mediabox.width)
-            canvas_height = float(target_page.mediabox.height)
-            c = canvas.Canvas(packet, pagesize=(canvas_width, canvas_height))
-
-            img_base_w, img_base_h = 150, 75 
-            img_w, img_h = img_base_w * scale_factor, img_base_h * scale_factor
-
-            if position == "br": xy = (canvas_width - img_w - 20, 20)
-            elif position == "tr": xy = (canvas_width - img_w - 20, canvas_height - img_h - 20)
-            elif position == "tl": xy = (20, canvas_height - img_h - 20)
-            elif position == "bl": xy = (20, 20)
-            else: xy = (canvas_width - img_w - 20, 20) # Default to bottom-right
-
-            c.drawImage(str(stamp_image_path), xy[0], xy[1], width=img_w, height=img_h, mask='auto')
-            c.save()
-            packet.seek(0)
-
-            overlay_reader = PdfReader(packet)
-            if not overlay_reader.pages:
+    def _digest_form(self, stamp_image_path: str, digest: str, scale_factor: float) -> tuple[NameObject, IndirectObject]:
+        key = (digest, scale_factor)
+        if key not in self._forms:
+            stamp_reader = PdfReader(BytesIO(stamp_pdf(stamp_image_path, digest, scale_factor)))
+            if not stamp_reader.pages:
                 raise ValueError("Failed to create overlay page from stamp.")
-            
-            target_page.merge_page(overlay_reader.pages[0])
-            
-            # Add all pages from reader to writer, ensuring modified one is included
+            stamp_page = stamp_reader.pages[0]
+            img_w, img_h = _stamp_size(scale_factor)
+            form = decoded_stream(stamp_page.get_contents().get_data())
+            form.update({
+                NameObject("/Type"): NameObject("/XObject"),
+                NameObject("/Subtype"): NameObject("/Form"),
+                NameObject("/BBox"): ArrayObject([FloatObject(0), FloatObject(0), FloatObject(img_w), FloatObject(img_h)]),
+                NameObject("/Resources"): (self.update.import_object(stamp_page.raw_get("/Resources")) if self.update is not None
+                                           else stamp_page["/Resources"].clone(self.writer)),
+            })
+            # Named after its content, so stamps added by another step on the same document never clash
+            name = NameObject("/PdfShellStamp" + hashlib.sha256(f"{digest}:{scale_factor}".encode()).hexdigest()[:16])
+            self._forms[key] = (name, self._add(form))
+        return self._forms[key]
+
+    def _add(self, obj) -> IndirectObject:
+        return self.update.add(obj) if self.update is not None else add_object(self.writer, obj)
+
+    def _stream(self, data: bytes) -> IndirectObject:
+        return self._add(decoded_stream(data))
+
+    def place(self, page: PageObject, stamp_image_path: str, position: str, scale_factor: float):
+        """Draws the stamp on page (a page of this writer, or of the updated reader) at position."""
+        name, form_ref = self._form(stamp_image_path, scale_factor)
+        x, y = _stamp_origin(page, *_stamp_size(scale_factor), position)
+
+        draw_key = (name, round(x, 4), round(y, 4))
+        if draw_key not in self._draws:
+            # Q closes the q pushed before the page's own content, so the stamp is drawn in the default graphics state
+            self._draws[draw_key] = self._stream(f"\nQ q 1 0 0 1 {x:.4f} {y:.4f} cm {name} Do Q\n".encode())
+        if self._save_state is None:
+            self._save_state = self._stream(b"q\n")
+
+        resources = _own_resources(page)
+        if self.update is not None:
+            # Direct copies: shared or indirect resource dictionaries of the original stay untouched
+            resources = page[NameObject("/Resources")] = DictionaryObject(resources)
+            xobjects = resources.get("/XObject")
+            resources[NameObject("/XObject")] = DictionaryObject(xobjects.get_object()) if xobjects is not None else DictionaryObject()
+        elif "/XObject" not in resources:
+            resources[NameObject("/XObject")] = DictionaryObject()
+        resources["/XObject"][name] = form_ref
+
+        contents = page.raw_get("/Contents") if "/Contents" in page else None
+        if contents is None:
+            parts = []
+        elif isinstance(contents.get_object(), ArrayObject):
+            parts = list(contents.get_object())
+        elif isinstance(contents, IndirectObject):
+            parts = [contents]
+        else:
+            parts = [self._add(contents)]
+        page[NameObject("/Contents")] = ArrayObject([self._save_state, *parts, self._draws[draw_key]])
+        if self.update is not None:
+            self.update.replace(page.indirect_reference, page)
+
+def _own_resources(page: PageObject) -> DictionaryObject:
+    """The page's /Resources, copied onto the page first if it is only inherited from the page tree."""
+    if "/Resources" in page:
+        return page["/Resources"].get_object()
+    node = page.get("/Parent")
+    while node is not None:
+        node = node.get_object()
+        if "/Resources" in node:
+            page[NameObject("/Resources")] = DictionaryObject(node["/Resources"].get_object())
+            return page["/Resources"]
+        node = node.get("/Parent")
+    page[NameObject("/Resources")] = DictionaryObject()
+    return page["/Resources"]
+
+def _page_selection(page_num: int, total_pages: int) -> PageRange:
+    """The pages of the 'page' argument: 0 = all pages, negative numbers count from the end."""
+    if page_num == 0: # Stamp all pages
+        return all_pages(total_pages)
+    target_page_index = total_pages + page_num if page_num < 0 else page_num - 1
+    if not (0 <= target_page_index < total_pages):
+        raise ValueError(f"Page number {page_num} is out of range for PDF with {total_pages} pages.")
+    return PageRange(((target_page_index + 1, target_page_index + 1),), total_pages)
+
+def _stamp_plan(args: dict, total_pages: int) -> list[tuple[PageRange, str, str, float]]:
+    """(pages, stamp image, position, scale) of every stamp to apply, in drawing order. Validates all of them up front."""
+    plan = []
+    if args.get('stamp_path'):
+        if args.get('pages') is not None:
+            selection = compile_range(args['pages'], total_pages)
+        else:
+            selection = _page_selection(args['page'], total_pages)
+        plan.append((selection, str(args['stamp_path']), args.get('pos') or "br", args.get('scale') or 1.0))
+    for spec in args.get('stamps') or []:
+        plan.append((compile_range(spec.get('pages', "1--1"), total_pages), str(spec['stamp_path']), spec.get('pos', "br"), spec.get('scale', 1.0)))
+    for selection, *_ in plan:
+        if not selection:
+            raise ValueError("No pages selected for stamping based on the provided range.")
+    return plan
+
+def transform(args: dict, source: PdfWriter | None = None) -> PdfWriter:
+    """Stamps the document in memory and returns the writer, without writing it.
+    Every stamp (the 'stamp_path' one and each entry of 'stamps') is applied in the same pass.
+    In a pipeline (core.engine.run_pipeline), source is the previous step's document and args['file'] is not read.
+    """
+    if args.get('incremental'):
+        raise ValueError("add_stamp with 'incremental' appends to the input file's bytes and cannot be used as a pipeline step.")
+    # In a pipeline the previous step's writer is stamped in place; otherwise copy the reader's pages into a new writer
+    if source is not None:
+        writer = source
+    else:
+        writer = PdfWriter()
+        with mapped_reader(args['file']) as reader:
             for p_item in reader.pages:
                 writer.add_page(p_item)
+    if not writer.pages:
+        raise ValueError("The input PDF has no pages.")
+
+    plan = _stamp_plan(args, len(writer.pages))
+
+    placer = _StampPlacer(writer)
+    for selection, stamp_image_path, position, scale_factor in plan:
+        for index in selection.indices():
+            placer.place(writer.pages[index], stamp_image_path, position, scale_factor)
+    return writer
+
+@contextmanager
+def incremental_update(args: dict):
+    """
+    Stamps the document as an incremental update of args['file']: the original objects are read, never rewritten.
+    The update is yielded for the enclosed block, which must write it: it reads the input's mapping, closed on exit.
+    """
+    with mapped(args['file']) as buffer:
+        reader = PdfReader(buffer.stream())
+        update = IncrementalUpdate(reader, buffer.data) # Refuses encrypted or repaired files before any page is read
+        if not reader.pages:
+            raise ValueError("The input PDF has no pages.")
+
+        plan = _stamp_plan(args, len(reader.pages))
+        placer = _StampPlacer(None, update)
+        for selection, stamp_image_path, position, scale_factor in plan:
+            for index in selection.indices():
+                placer.place(reader.pages[index], stamp_image_path, position, scale_factor)
+        yield update
+
+def run(args: dict, outputs: OutputSinks | None = None) -> str:
+    """Adds image stamps to the selected pages of a PDF file, reading and writing it once.
+    Assumes 'file', every stamp path, and 'output' in args are full, validated, absolute paths.
+    """
+    output_final_path_str: str = args['output'] # 'output' is now always a full path from engine
+    if outputs is None:
+        outputs = OutputSinks()
+
+    try:
+        output_final_path = Path(output_final_path_str)
+        # Engine ensures parent directory for output_final_path exists.
 
-        with open(output_final_path, "wb") as fp:
-            writer.write(fp)
+        if args.get('incremental'):
+            with incremental_update(args) as update, outputs.open(output_final_path, page_count=len(update.reader.pages)) as fp:
+                update.write(fp)
+        else:
+            writer = transform(args)
+            with outputs.open(output_final_path, page_count=len(writer.pages)) as fp:
+                writer.write(fp)
         
         return str(output_final_path) # Return the full output path
 
@@ -130,25 +369,31 @@ def run(args: dict) -> str:
 
 class AddStampTool(BaseTool):
     name: str = "add_stamp"
-    description: str = ("Adds an image stamp to a specified page of a PDF file. "
-                       "Expects full paths for 'file', 'stamp_path', and 'output' (if provided).")
+    description: str = ("Adds an image stamp to a page, a page range, or several stamps to different pages of a PDF file in one pass. "
+                       "Expects full paths for 'file', 'stamp_path' (or each 'stamps' entry's), and 'output' (if provided).")
     args_schema: Type[BaseModel] = AddStampSchema
 
     def _run(
         self,
         file: str,
-        stamp_path: str,
-        page: int,
+        stamp_path: Optional[str] = None,
+        page: Optional[int] = None,
+        pages: Optional[str] = None,
         pos: Optional[str] = "br",
         scale: Optional[float] = 1.0,
+        stamps: Optional[List[dict]] = None,
+        incremental: bool = False,
         output: Optional[str] = None,
     ) -> str:
         args_dict = {
             "file": file,
             "stamp_path": stamp_path,
             "page": page,
+            "pages": pages,
             "pos": pos,
             "scale": scale,
+            "stamps": [s.model_dump() if isinstance(s, BaseModel) else s for s in stamps] if stamps else None,
+            "incremental": incremental,
         }
         if output:
             args_dict["output"] = output
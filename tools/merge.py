@@ -1,13 +1,26 @@
-from typing import List, Type
+import os
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Type
 from pathlib import Path
 from langchain_core.tools import BaseTool
 from pydantic import BaseModel, Field
-from pypdf import PdfReader, PdfWriter
+from pypdf import PdfWriter
 import logging
+from core.sink import OutputSinks
+from core.inputs import mapped_reader
+from core.worker import cap_workers, pool_context
+from tools.pdfstream import DocumentFragment, StreamingPdfWriter, append_fragment, dedupe_writer, extract_fragment, peak_rss_mb
+
+DEFAULT_STREAMING_THRESHOLD_MB = 256
+DEFAULT_PARALLEL_MIN_FILES = 8
 
 class MergeSchema(BaseModel):
-    files: List[str] = Field(description="A list of FULL PATHS to the input PDF files to be merged.")
+    files: List[str] = Field(min_length=1, description="A list of FULL PATHS to the input PDF files to be merged.")
     output: str = Field(description="The FULL PATH for the output merged PDF file.")
+    dedup: bool = Field(default=True, description="Write identical fonts, images and other shared resources only once.")
+    streaming: Optional[bool] = Field(default=None, description="Write the output incrementally, one input at a time, to keep memory bounded. Default: automatic above PDF_MERGE_STREAMING_THRESHOLD_MB of total input. Merges of many files parse their inputs in parallel either way.")
 
 # The engine will call a 'run' function directly, not as a BaseTool._run
 # However, the schema can still be useful for validation if used elsewhere or for documentation.
@@ -19,24 +32,109 @@ class MergeSchema(BaseModel):
 # If this file is meant to be a Langchain tool primarily, the structure might differ.
 # Assuming engine.py is the primary consumer calling tools.tool_name.run(args)
 
-def run(args: dict) -> str:
+def transform(args: dict, source: PdfWriter | None = None, workers: int | None = None) -> PdfWriter:
+    """Builds the merged document in memory without writing it.
+    In a pipeline (core.engine.run_pipeline), source is the previous step's document and comes first.
+    workers overrides the number of parsing processes (default: _parse_workers).
+    """
+    writer = source if source is not None else PdfWriter()
+    if workers is None:
+        workers = _parse_workers(len(args['files']))
+    if workers > 1:
+        # Inputs are parsed ahead in worker processes and appended in the caller's order; dedup runs on the whole writer later
+        for fragment in iter_fragments(args['files'], dedup=False, workers=workers):
+            append_fragment(writer, fragment)
+        return writer
+    for file_path_str in args['files']:
+        # Paths are already full and validated by the engine
+        with mapped_reader(file_path_str) as reader: # add_page copies the page, so the input is unmapped right after
+            for page in reader.pages:
+                writer.add_page(page)
+    return writer
+
+def _setting(name: str, default):
+    # Tools also run in Django-free worker processes; fall back to the default there
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+def _streaming_threshold_bytes() -> int:
+    return _setting('PDF_MERGE_STREAMING_THRESHOLD_MB', DEFAULT_STREAMING_THRESHOLD_MB) * 1024 * 1024
+
+def _parse_workers(file_count: int) -> int:
+    """
+    Processes used to parse the inputs. Small merges stay sequential (a pool costs more than it saves);
+    inside a batch worker the pool stays within that worker's CPU share.
+    """
+    if file_count < _setting('PDF_MERGE_PARALLEL_MIN_FILES', DEFAULT_PARALLEL_MIN_FILES):
+        return 1
+    return cap_workers(min(_setting('PDF_MERGE_PARSE_WORKERS', os.cpu_count() or 1), file_count))
+
+def iter_fragments(paths: list[str], dedup: bool, workers: int = 1) -> Iterator[DocumentFragment]:
+    """
+    Parses the inputs into DocumentFragments and yields them in the given order.
+    With several workers, parsing (and dedup hashing) runs ahead in a process pool; at most two
+    fragments per worker are in flight, so memory stays bounded however many files are merged.
+    """
+    if workers <= 1:
+        for path in paths:
+            yield extract_fragment(path, dedup)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as executor:
+        remaining = iter(paths)
+        in_flight = deque(executor.submit(extract_fragment, path, dedup) for path in islice(remaining, workers * 2))
+        while in_flight:
+            fragment = in_flight.popleft().result()
+            next_path = next(remaining, None)
+            if next_path is not None:
+                in_flight.append(executor.submit(extract_fragment, next_path, dedup))
+            yield fragment
+
+def _use_streaming(args: dict) -> bool:
+    if args.get('streaming') is not None:
+        return args['streaming']
+    return sum(os.path.getsize(p) for p in args['files']) >= _streaming_threshold_bytes()
+
+def run_streaming(args: dict, outputs: OutputSinks, workers: int = 1) -> str:
+    """
+    Merges with StreamingPdfWriter: inputs are parsed one at a time (or a few ahead on `workers`
+    processes) and each input's objects go straight to the output, in the order of args['files'].
+    """
+    logger = logging.getLogger(__name__)
+    output_path_str: str = args['output']
+    dedup = args.get('dedup', True)
+    with outputs.open(output_path_str) as f:
+        writer = StreamingPdfWriter(f, dedup=dedup)
+        for fragment in iter_fragments(args['files'], dedup, workers):
+            writer.add_fragment(fragment) # The fragment is dropped once its pages are out
+        writer.close()
+        f.page_count = writer.page_count
+        f.bytes_saved = writer.bytes_saved
+    logger.info(f"MERGE TOOL: Streamed {len(args['files'])} files ({writer.page_count} pages, {workers} parse workers) to {output_path_str}, dedup saved {writer.bytes_saved} bytes, peak RSS {peak_rss_mb():.1f} MB")
+    return output_path_str
+
+def run(args: dict, outputs: OutputSinks | None = None) -> str:
     """Merges multiple PDF files into a single PDF file.
     The 'files' and 'output' in args are expected to be full, validated, absolute paths.
+    The output is written through outputs (see core.sink) so the engine gets its digest without re-reading it.
     """
-    files_list: List[str] = args['files']
     output_path_str: str = args['output']
 
+    if outputs is None:
+        outputs = OutputSinks()
+
     try:
-        writer = PdfWriter()
-        
-        for file_path_str in files_list:
-            # Paths are already full and validated by the engine
-            reader = PdfReader(file_path_str)
-            for page in reader.pages:
-                writer.add_page(page)
+        if _use_streaming(args):
+            return run_streaming(args, outputs, _parse_workers(len(args['files'])))
+
+        writer = transform(args)
+        bytes_saved = dedupe_writer(writer) if args.get('dedup', True) else None
         
         # Output path is also full and validated; parent directory created by engine
-        with open(output_path_str, "wb") as f:
+        with outputs.open(output_path_str, page_count=len(writer.pages)) as f:
+            f.bytes_saved = bytes_saved
             writer.write(f)
         
         # === BEGIN DEBUGGING MODIFICATION ===
@@ -66,14 +164,14 @@ class MergeTool(BaseTool):
 
     # root_dir: Path = Path.cwd() # No longer needed if paths are absolute
 
-    def _run(self, files: List[str], output: str) -> str:
+    def _run(self, files: List[str], output: str, dedup: bool = True, streaming: Optional[bool] = None) -> str:
         # This method would now call the standalone run function if you want to keep it
         # or duplicate the logic, ensuring paths are treated as absolute.
         # For the engine, it will call tools.merge.run(args)
         # If this _run is still needed, it should mirror the logic of the standalone run.
         
         # Simplified: assuming the standalone run function is the primary logic
-        return run({"files": files, "output": output})
+        return run({"files": files, "output": output, "dedup": dedup, "streaming": streaming})
 
 merge = MergeTool()
 
@@ -0,0 +1,170 @@
+import re
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Iterator, Tuple
+
+# 頁碼範圍運算式 (例如 "1-3,5,!7,-1", "1--1", "!200-300") 的共用解析器。
+# 運算式只解析一次，結果是排序、合併後的閉區間，不會展開成逐頁的集合；
+# 依 (運算式, 總頁數) 快取，split / add_stamp / merge 都可以共用。
+# "-1" 代表最後一頁。只有排除項時，從全部頁面開始排除。
+
+_NUMBER = r"\s*(-1|\d+)\s*"
+_RANGE_RE = re.compile(rf"^{_NUMBER}-{_NUMBER}$")
+
+Interval = Tuple[int, int] # 1-based, inclusive
+
+class PageRange:
+    """
+    A compiled page-range expression: sorted, disjoint, non-adjacent 1-based inclusive intervals.
+    Pages are produced lazily; len(), membership and chunking work on the intervals.
+    """
+    __slots__ = ("intervals", "total_pages", "_starts")
+
+    def __init__(self, intervals: Tuple[Interval, ...], total_pages: int):
+        self.intervals = intervals
+        self.total_pages = total_pages
+        self._starts = [start for start, _ in intervals]
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in self.intervals:
+            yield from range(start, end + 1)
+
+    def __len__(self) -> int:
+        return sum(end - start + 1 for start, end in self.intervals)
+
+    def __bool__(self) -> bool:
+        return bool(self.intervals)
+
+    def __contains__(self, page: int) -> bool:
+        i = bisect_right(self._starts, page) - 1
+        return i >= 0 and page <= self.intervals[i][1]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PageRange) and (self.intervals, self.total_pages) == (other.intervals, other.total_pages)
+
+    def __hash__(self) -> int:
+        return hash((self.intervals, self.total_pages))
+
+    def __repr__(self) -> str:
+        return f"PageRange({self.expression()!r}, total_pages={self.total_pages})"
+
+    @property
+    def first(self) -> int | None:
+        return self.intervals[0][0] if self.intervals else None
+
+    @property
+    def last(self) -> int | None:
+        return self.intervals[-1][1] if self.intervals else None
+
+    def indices(self) -> Iterator[int]:
+        """0-based page indices, in order (for reader.pages[...])."""
+        for start, end in self.intervals:
+            yield from range(start - 1, end)
+
+    def chunks(self, size: int) -> Iterator["PageRange"]:
+        """Consecutive runs of `size` selected pages (the last one may be shorter), as PageRanges."""
+        if size < 1:
+            raise ValueError("Chunk size must be at least 1.")
+        current: list[Interval] = []
+        count = 0
+        for start, end in self.intervals:
+            while start <= end:
+                take = min(end - start + 1, size - count)
+                current.append((start, start + take - 1))
+                count += take
+                start += take
+                if count == size:
+                    yield PageRange(tuple(current), self.total_pages)
+                    current, count = [], 0
+        if current:
+            yield PageRange(tuple(current), self.total_pages)
+
+    def expression(self) -> str:
+        """Canonical expression that compiles back to this range, e.g. "1-3,7"."""
+        return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in self.intervals)
+
+def _merge(intervals: list[Interval]) -> list[Interval]:
+    merged: list[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def _subtract(included: list[Interval], excluded: list[Interval]) -> list[Interval]:
+    """included minus excluded; both sorted and merged. Linear sweep over the two lists."""
+    result: list[Interval] = []
+    j = 0
+    for start, end in included:
+        while j < len(excluded) and excluded[j][1] < start:
+            j += 1
+        k = j
+        while start <= end:
+            if k >= len(excluded) or excluded[k][0] > end:
+                result.append((start, end))
+                break
+            ex_start, ex_end = excluded[k]
+            if ex_start > start:
+                result.append((start, ex_start - 1))
+            start = max(start, ex_end + 1)
+            k += 1
+    return result
+
+def _resolve(number_str: str, total_pages: int, kind: str) -> int:
+    """頁碼字串轉為實際頁碼 ("-1" 為最後一頁)，並檢查範圍。"""
+    if number_str == "-1":
+        return total_pages
+    number = int(number_str)
+    if number <= 0:
+        raise ValueError(f"{kind}必須大於 0 或為 -1: {number_str}")
+    if number > total_pages:
+        raise ValueError(f"{kind} {number} 超出總頁數 {total_pages}")
+    return number
+
+def _parse_token(token: str, total_pages: int) -> Interval:
+    match = _RANGE_RE.match(token)
+    if match:
+        start_str, end_str = match.groups()
+        start = _resolve(start_str, total_pages, "起始頁碼")
+        end = _resolve(end_str, total_pages, "結束頁碼")
+        if start > end:
+            raise ValueError(f"無效的頁碼範圍 (起始頁碼 {start} 大於結束頁碼 {end}): {token}")
+        return start, end
+    if token == "-1" or '-' not in token:
+        try:
+            page = _resolve(token, total_pages, "頁碼")
+        except ValueError as e:
+            if "頁碼" in str(e):
+                raise
+            raise ValueError(f"頁碼格式錯誤: {token} -> {e}")
+        return page, page
+    raise ValueError(f"頁碼範圍格式錯誤 (無效的 '-' 使用): {token}")
+
+@lru_cache(maxsize=256)
+def compile_range(rng: str, total_pages: int) -> PageRange:
+    """
+    解析頁碼範圍字串 (例如 "1-3,5,!7,-1", "1--1")，回傳 PageRange (1-based 閉區間)。
+    結果依 (rng, total_pages) 快取；PageRange 不可變，可以安全共用。
+    """
+    if not rng.strip():
+        raise ValueError("頁碼範圍字串不可為空。")
+
+    included: list[Interval] = []
+    excluded: list[Interval] = []
+    for raw_token in rng.split(','):
+        token = raw_token.strip()
+        is_exclusion = token.startswith('!')
+        effective_token = token[1:].strip() if is_exclusion else token
+        if not effective_token: # 例如 "!" 或 "," 後面直接接 ","
+            raise ValueError(f"無效的 token 格式: '{raw_token}'")
+        (excluded if is_exclusion else included).append(_parse_token(effective_token, total_pages))
+
+    # 沒有明確包含、只有排除時，從全部頁面開始
+    if not included and total_pages > 0:
+        included = [(1, total_pages)]
+    return PageRange(tuple(_subtract(_merge(included), _merge(excluded))), total_pages)
+
+def all_pages(total_pages: int) -> PageRange:
+    return PageRange(((1, total_pages),) if total_pages > 0 else (), total_pages)
@@ -0,0 +1,517 @@
+import re
+import hashlib
+from io import BytesIO
+import resource
+from collections import deque
+from dataclasses import dataclass
+from typing import BinaryIO
+import pypdf
+from pypdf import PageObject, PdfReader, PdfWriter
+from core.inputs import mapped_reader
+from pypdf.generic import (
+    ArrayObject, DecodedStreamObject, DictionaryObject, IndirectObject, NameObject, NullObject, NumberObject, PdfObject, StreamObject,
+)
+
+# --- pypdf internals ---
+# pypdf has no public API to add an object to a PdfWriter without adding a page, to walk or replace
+# a writer's objects, or to read a stream's stored (still encoded) bytes. Every such access in this
+# package goes through the helpers below, which are checked against the pypdf range pinned in
+# pyproject.toml (pypdf = "^4.2.0"); review them before raising that pin.
+PYPDF_RANGE = ((4, 2), (5, 0)) # [lowest, first unsupported) (major, minor)
+
+def check_pypdf_version(version: str):
+    """Raises ImportError if version is outside PYPDF_RANGE."""
+    parsed = tuple(int(part) for part in re.findall(r"\d+", version)[:2])
+    if not PYPDF_RANGE[0] <= parsed < PYPDF_RANGE[1]:
+        low, high = (".".join(map(str, bound)) for bound in PYPDF_RANGE)
+        raise ImportError(f"tools.pdfstream uses pypdf internals checked for pypdf >={low},<{high}; found {version}.")
+
+check_pypdf_version(pypdf.__version__)
+
+def add_object(writer: PdfWriter, obj: PdfObject) -> IndirectObject:
+    """Adds obj to the writer as a new indirect object and returns its reference."""
+    return writer._add_object(obj)
+
+def writer_objects(writer: PdfWriter) -> list[PdfObject | None]:
+    """The writer's indirect objects; object number n is at index n - 1."""
+    return writer._objects
+
+def set_object(writer: PdfWriter, ref: IndirectObject, obj: PdfObject):
+    """Makes obj the writer's object ref (a reference from add_object)."""
+    writer._objects[ref.idnum - 1] = obj
+
+def stored_data(stream: StreamObject) -> bytes:
+    """The stream's bytes as stored in the file, without decoding its filters."""
+    return stream._data
+
+def raw_stream(data: bytes) -> StreamObject:
+    """A stream that writes data as it is; the caller sets /Filter if data is encoded."""
+    stream = StreamObject()
+    stream.set_data(data)
+    return stream
+
+def decoded_stream(data: bytes) -> DecodedStreamObject:
+    """An unfiltered stream holding data (e.g. a content stream)."""
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return stream
+
+class ObjectDigests:
+    """
+    Merkle-style content digests of the indirect objects of one document: an object's digest covers
+    its own content (stream bytes included) and the digests of everything it references, so identical
+    fonts, images or form XObjects get the same digest even when their object numbers differ.
+    Objects inside a reference cycle or referring to pages have no digest (None) and are never shared.
+    """
+    def __init__(self):
+        self._memo: dict[tuple[int, int], tuple[bytes, int] | None] = {}
+        self._visiting: set[tuple[int, int]] = set()
+
+    def digest(self, ref: IndirectObject) -> bytes | None:
+        entry = self._entry(ref)
+        return entry[0] if entry else None
+
+    def stream_bytes(self, ref: IndirectObject) -> int:
+        """Stream data bytes of ref and everything below it (0 if it has no digest)."""
+        entry = self._entry(ref)
+        return entry[1] if entry else 0
+
+    def _entry(self, ref: IndirectObject):
+        key = (ref.idnum, ref.generation)
+        if key in self._memo:
+            return self._memo[key]
+        if key in self._visiting:
+            return None # Cycle: leave the whole loop unshared
+        self._visiting.add(key)
+        try:
+            h = hashlib.sha256()
+            size = self._feed(h, ref.get_object())
+            entry = (h.digest(), size) if size is not None else None
+        finally:
+            self._visiting.discard(key)
+        self._memo[key] = entry
+        return entry
+
+    def _feed(self, h, obj) -> int | None:
+        """Adds obj to h; returns the stream bytes it covers, or None if it must not be shared."""
+        if isinstance(obj, IndirectObject):
+            entry = self._entry(obj)
+            if entry is None:
+                return None
+            h.update(b"R" + entry[0])
+            return entry[1]
+        if isinstance(obj, DictionaryObject):
+            if obj.get("/Type") in ("/Page", "/Pages"):
+                return None
+            size = 0
+            if isinstance(obj, StreamObject):
+                data = stored_data(obj)
+                h.update(b"S%d:" % len(data) + data)
+                size += len(data)
+            h.update(b"D%d" % len(obj))
+            for key in sorted(obj):
+                if key == "/Length":
+                    continue
+                h.update(key.encode() + b"=")
+                child = self._feed(h, obj[key])
+                if child is None:
+                    return None
+                size += child
+            return size
+        if isinstance(obj, ArrayObject):
+            size = 0
+            h.update(b"A%d" % len(obj))
+            for value in obj:
+                child = self._feed(h, value)
+                if child is None:
+                    return None
+                size += child
+            return size
+        h.update(f"{type(obj).__name__}:{obj!r};".encode())
+        return 0
+
+def dedupe_writer(writer: PdfWriter) -> int:
+    """
+    Makes identical stream objects (fonts, images, form XObjects, ...) of an in-memory PdfWriter
+    share one copy: references to duplicates are pointed at the first occurrence and the duplicates
+    are replaced by null objects. Returns the stream bytes that will not be written.
+    """
+    digests = ObjectDigests()
+    canonical: dict[bytes, IndirectObject] = {}
+    replaced: dict[int, IndirectObject] = {}
+    bytes_saved = 0
+    objects = writer_objects(writer)
+    for index, obj in enumerate(objects):
+        if not isinstance(obj, StreamObject):
+            continue
+        ref = IndirectObject(index + 1, 0, writer)
+        digest = digests.digest(ref)
+        if digest is None:
+            continue
+        if digest in canonical:
+            replaced[ref.idnum] = canonical[digest]
+            bytes_saved += len(stored_data(obj))
+        else:
+            canonical[digest] = ref
+    if not replaced:
+        return 0
+
+    def relink(obj):
+        if isinstance(obj, DictionaryObject):
+            for key, value in obj.items():
+                if isinstance(value, IndirectObject) and value.idnum in replaced:
+                    obj[key] = replaced[value.idnum]
+                elif isinstance(value, (DictionaryObject, ArrayObject)):
+                    relink(value)
+        elif isinstance(obj, ArrayObject):
+            for i, value in enumerate(obj):
+                if isinstance(value, IndirectObject) and value.idnum in replaced:
+                    obj[i] = replaced[value.idnum]
+                elif isinstance(value, (DictionaryObject, ArrayObject)):
+                    relink(value)
+
+    for index, obj in enumerate(objects):
+        if index + 1 in replaced:
+            objects[index] = NullObject() # Keeps the object numbering (and xref table) intact
+        elif obj is not None:
+            relink(obj)
+    return bytes_saved
+
+class LocalRef(NumberObject):
+    """
+    Reference to another object of the same DocumentFragment, by its 1-based position.
+    Stands in for IndirectObject, which cannot be pickled without its reader.
+    """
+
+@dataclass
+class DocumentFragment:
+    """
+    The pages of one input and every object they reference, detached from the reader so it can be
+    built in a worker process and sent back (pickled) for assembly. objects[i] is local object i + 1;
+    references between them are LocalRefs. Page dictionaries carry no /Parent; the assembler sets it.
+    With dedup, digests/stream_bytes hold the ObjectDigests entry of every stream object.
+    """
+    objects: list[PdfObject]
+    pages: list[int]
+    digests: list[bytes | None]
+    stream_bytes: list[int]
+    pdf_header: str = "%PDF-1.3"
+
+def append_fragment(writer: PdfWriter, fragment: DocumentFragment):
+    """
+    Appends the pages of a fragment to an in-memory PdfWriter, as add_page would with the input's
+    reader: every object is added to the writer once and the pages go to the end of its page tree.
+    Deduplication is left to dedupe_writer().
+    """
+    refs = [add_object(writer, NullObject()) for _ in fragment.objects] # Numbers first: objects refer to each other
+    page_numbers = set(fragment.pages)
+
+    def relink(obj):
+        if isinstance(obj, LocalRef):
+            return refs[int(obj) - 1]
+        if isinstance(obj, DictionaryObject):
+            for key, value in obj.items():
+                obj[key] = relink(value)
+        elif isinstance(obj, ArrayObject):
+            for i, value in enumerate(obj):
+                obj[i] = relink(value)
+        return obj
+
+    for number, obj in enumerate(fragment.objects, start=1):
+        obj = relink(obj)
+        if number in page_numbers:
+            page = PageObject(writer, refs[number - 1])
+            page.update(obj)
+            obj = page
+        set_object(writer, refs[number - 1], obj)
+    for number in fragment.pages:
+        writer.add_page(writer.get_object(refs[number - 1])) # Already in this writer: add_page links it without copying
+    writer.pdf_header = max(writer.pdf_header, fragment.pdf_header)
+
+def extract_fragment(source: PdfReader | str, dedup: bool = False) -> DocumentFragment:
+    """
+    Parses one input (a reader or a path) into a DocumentFragment. Also used as a process-pool task.
+    A path is mapped only while it is parsed: the fragment holds copies of the bytes it needs.
+    """
+    if not isinstance(source, PdfReader):
+        with mapped_reader(source) as reader:
+            return extract_fragment(reader, dedup)
+    reader = source
+    local: dict[tuple[int, int], int] = {} # Source (idnum, generation) -> local object number
+    sources: list[IndirectObject | None] = []
+    pending: deque[int] = deque()
+
+    def register(ref: IndirectObject | None) -> int:
+        sources.append(ref)
+        if ref is not None:
+            local[(ref.idnum, ref.generation)] = len(sources)
+        return len(sources)
+
+    def detach(obj):
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key not in local:
+                pending.append(register(obj))
+            return LocalRef(local[key])
+        if isinstance(obj, StreamObject):
+            copy = raw_stream(stored_data(obj)) # Kept as stored (still encoded); never decoded here
+            copy.update({key: detach(value) for key, value in obj.items() if key != "/Length"})
+            return copy
+        if isinstance(obj, DictionaryObject):
+            return DictionaryObject({key: detach(value) for key, value in obj.items()})
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(detach(value) for value in obj)
+        return obj
+
+    pages = list(reader.pages)
+    # Pages are registered first so links and annotations pointing at other pages resolve to them
+    page_numbers = [register(page.indirect_reference) for page in pages]
+    objects: list[PdfObject | None] = [None] * len(page_numbers)
+    for page, number in zip(pages, page_numbers):
+        objects[number - 1] = DictionaryObject({key: detach(value) for key, value in page.items() if key not in ("/Parent", "/StructParents")})
+    while pending:
+        number = pending.popleft()
+        obj = sources[number - 1].get_object()
+        objects.append(NullObject() if obj is None else detach(obj)) # FIFO order: number == len(objects) + 1
+
+    digests: list[bytes | None] = [None] * len(objects)
+    stream_bytes = [0] * len(objects)
+    if dedup:
+        object_digests = ObjectDigests()
+        for index, obj in enumerate(objects):
+            if isinstance(obj, StreamObject):
+                digests[index] = object_digests.digest(sources[index])
+                stream_bytes[index] = object_digests.stream_bytes(sources[index])
+    return DocumentFragment(objects, page_numbers, digests, stream_bytes, reader.pdf_header)
+
+class StreamingPdfWriter:
+    """
+    Writes a PDF object by object straight to fp, so memory stays bounded by one input document.
+    add_document()/add_fragment() append the pages of one input and everything they reference
+    (content streams, fonts, images, annotations); its objects are renumbered and written right away,
+    and nothing of the input is kept afterwards except object offsets (and, with dedup, one digest per
+    stream), so callers can drop it. Document-level structures (outlines, forms, named destinations)
+    are not copied, as with PdfWriter.add_page. close() writes the page tree, catalog, xref table and trailer.
+    With dedup, a stream object whose content digest (see ObjectDigests) was already written, from
+    this or an earlier input, is not written again; bytes_saved counts the stream bytes skipped.
+    """
+    def __init__(self, fp: BinaryIO, dedup: bool = False):
+        self._fp = fp
+        self.dedup = dedup
+        self.bytes_saved = 0
+        self._by_digest: dict[bytes, IndirectObject] = {} # Content digest -> stream written earlier
+        self._offsets: list[int | None] = [None] # Index = object number; object 0 is the free-list head
+        self._page_refs: list[IndirectObject] = []
+        self._fp.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        self._pages_ref = self._reserve()
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_refs)
+
+    def _reserve(self) -> IndirectObject:
+        self._offsets.append(None)
+        return IndirectObject(len(self._offsets) - 1, 0, None)
+
+    def _write_object(self, ref: IndirectObject, obj: PdfObject):
+        self._offsets[ref.idnum] = self._fp.tell()
+        self._fp.write(f"{ref.idnum} 0 obj\n".encode())
+        obj.write_to_stream(self._fp)
+        self._fp.write(b"\nendobj\n")
+
+    def add_document(self, reader: PdfReader):
+        """Appends all pages of reader."""
+        self.add_fragment(extract_fragment(reader, dedup=self.dedup))
+
+    def add_fragment(self, fragment: DocumentFragment):
+        """Appends the pages of a fragment. Objects only reachable through a deduplicated stream are not written."""
+        targets: dict[int, IndirectObject] = {}
+        pending: deque[int] = deque()
+
+        def resolve(number: int) -> IndirectObject:
+            if number not in targets:
+                digest = fragment.digests[number - 1] if self.dedup else None
+                if digest is not None and digest in self._by_digest:
+                    targets[number] = self._by_digest[digest]
+                    self.bytes_saved += fragment.stream_bytes[number - 1]
+                else:
+                    targets[number] = self._reserve()
+                    pending.append(number)
+                    if digest is not None:
+                        self._by_digest[digest] = targets[number]
+            return targets[number]
+
+        def relink(obj):
+            # Fragments are used once, so their objects are relinked in place
+            if isinstance(obj, LocalRef):
+                return resolve(int(obj))
+            if isinstance(obj, DictionaryObject):
+                for key, value in obj.items():
+                    obj[key] = relink(value)
+            elif isinstance(obj, ArrayObject):
+                for i, value in enumerate(obj):
+                    obj[i] = relink(value)
+            return obj
+
+        for number in fragment.pages:
+            targets[number] = self._reserve()
+        for number in fragment.pages:
+            page = relink(fragment.objects[number - 1])
+            page[NameObject("/Parent")] = self._pages_ref
+            self._write_object(targets[number], page)
+            while pending:
+                reached = pending.popleft()
+                self._write_object(targets[reached], relink(fragment.objects[reached - 1]))
+            self._page_refs.append(targets[number])
+
+    def close(self):
+        """Writes the page tree, catalog and cross-reference table. Does not close fp."""
+        self._write_object(self._pages_ref, DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(self._page_refs),
+            NameObject("/Count"): NumberObject(len(self._page_refs)),
+        }))
+        catalog_ref = self._reserve()
+        self._write_object(catalog_ref, DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): self._pages_ref,
+        }))
+
+        xref_offset = self._fp.tell()
+        self._fp.write(f"xref\n0 {len(self._offsets)}\n".encode())
+        self._fp.write(b"0000000000 65535 f \n")
+        self._fp.write(b"".join(f"{offset:010d} 00000 n \n".encode() for offset in self._offsets[1:]))
+        self._fp.write(f"trailer\n<< /Size {len(self._offsets)} /Root {catalog_ref.idnum} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+def _last_startxref(data) -> int:
+    """Offset given by the last 'startxref' of a PDF, i.e. where its newest cross-reference section starts."""
+    tail = bytes(data[max(0, len(data) - 2048):])
+    at = tail.rfind(b"startxref")
+    try:
+        return int(tail[at + len(b"startxref"):].split()[0]) if at >= 0 else -1
+    except (IndexError, ValueError):
+        return -1
+
+class IncrementalUpdate:
+    """
+    A PDF incremental update (ISO 32000-1, 7.5.6) of an existing document: write() copies the original
+    bytes unchanged and appends only the added and replaced objects, followed by a cross-reference
+    section (a table or an xref stream, like the original's newest one) whose /Prev points at the
+    original's. Objects read from reader keep their numbers, so a replaced object (e.g. a page
+    dictionary) is written as it is and the references to it stay valid.
+    Encrypted documents and files whose trailer pypdf had to repair are refused (ValueError).
+    """
+    def __init__(self, reader: PdfReader, original):
+        if reader.is_encrypted:
+            raise ValueError("Incremental save is not supported for encrypted PDFs.")
+        self.reader = reader
+        self.original = original # bytes (or a mapping) of the file reader was opened on
+        self.prev = _last_startxref(original)
+        section = bytes(original[self.prev:self.prev + 64]).lstrip() if self.prev >= 0 else b""
+        self.xref_stream = not section.startswith(b"xref")
+        if self.xref_stream and not re.match(rb"\d+\s+\d+\s+obj", section):
+            raise ValueError("Incremental save needs an intact trailer: 'startxref' does not point at a cross-reference section.")
+        self._next = int(reader.trailer["/Size"])
+        self._objects: dict[int, tuple[int, PdfObject]] = {} # Object number -> (generation, object), in write order
+        self._imported: dict[tuple[int, int, int], IndirectObject] = {}
+
+    def add(self, obj: PdfObject) -> IndirectObject:
+        """Adds a new object and returns a reference to it."""
+        ref = IndirectObject(self._next, 0, None)
+        self._next += 1
+        self._objects[ref.idnum] = (0, obj)
+        return ref
+
+    def replace(self, ref: IndirectObject, obj: PdfObject):
+        """Writes obj as the new version of the original's object ref."""
+        self._objects[ref.idnum] = (ref.generation, obj)
+
+    def import_object(self, obj: PdfObject) -> PdfObject:
+        """
+        Copies obj from another document (e.g. a rendered stamp) with everything it references;
+        each of that document's indirect objects becomes one added object, however often it is reached.
+        """
+        if isinstance(obj, IndirectObject):
+            key = (id(obj.pdf), obj.idnum, obj.generation)
+            if key not in self._imported:
+                self._imported[key] = ref = self.add(NullObject()) # Reserved first, so cycles end here
+                self._objects[ref.idnum] = (0, self.import_object(obj.get_object()))
+            return self._imported[key]
+        if isinstance(obj, StreamObject):
+            copy = raw_stream(stored_data(obj))
+            copy.update({key: self.import_object(value) for key, value in obj.items() if key != "/Length"})
+            return copy
+        if isinstance(obj, DictionaryObject):
+            return DictionaryObject({key: self.import_object(value) for key, value in obj.items()})
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self.import_object(value) for value in obj)
+        return obj
+
+    def write(self, fp: BinaryIO) -> int:
+        """Writes the original bytes followed by the update to fp. Returns the number of bytes appended."""
+        fp.write(self.original)
+        start = offset = len(self.original)
+        if bytes(self.original[-1:]) not in (b"\n", b"\r"):
+            fp.write(b"\n")
+            offset += 1
+
+        offsets: dict[int, tuple[int, int]] = {}
+        def write_object(number: int, generation: int, obj: PdfObject):
+            nonlocal offset
+            buffer = BytesIO()
+            buffer.write(f"{number} {generation} obj\n".encode())
+            obj.write_to_stream(buffer)
+            buffer.write(b"\nendobj\n")
+            fp.write(buffer.getvalue())
+            offsets[number] = (offset, generation)
+            offset += buffer.tell()
+
+        for number, (generation, obj) in self._objects.items():
+            write_object(number, generation, obj)
+
+        trailer = DictionaryObject({NameObject(key): self.reader.trailer.raw_get(key) for key in ("/Root", "/Info", "/ID") if key in self.reader.trailer})
+        trailer[NameObject("/Prev")] = NumberObject(self.prev)
+        xref_offset = offset
+        if self.xref_stream:
+            # The xref stream is itself an object of the update, listed in its own section
+            number = self._next
+            offsets[number] = (offset, 0)
+            runs = _runs(offsets)
+            width = max(4, (offset.bit_length() + 7) // 8)
+            stream = decoded_stream(b"".join(b"\x01" + offsets[n][0].to_bytes(width, "big") + offsets[n][1].to_bytes(2, "big") for run in runs for n in run))
+            stream.update(trailer)
+            stream.update({
+                NameObject("/Type"): NameObject("/XRef"),
+                NameObject("/Size"): NumberObject(number + 1),
+                NameObject("/W"): ArrayObject([NumberObject(1), NumberObject(width), NumberObject(2)]),
+                NameObject("/Index"): ArrayObject(NumberObject(v) for run in runs for v in (run[0], len(run))),
+            })
+            write_object(number, 0, stream)
+            tail = BytesIO()
+        else:
+            tail = BytesIO()
+            tail.write(b"xref\n0 1\n0000000000 65535 f \n") # Free-list head, so readers see a zero-based table
+            for run in _runs(offsets):
+                tail.write(f"{run[0]} {len(run)}\n".encode())
+                tail.write(b"".join(f"{offsets[n][0]:010d} {offsets[n][1]:05d} n \n".encode() for n in run))
+            trailer[NameObject("/Size")] = NumberObject(self._next)
+            tail.write(b"trailer\n")
+            trailer.write_to_stream(tail)
+            tail.write(b"\n")
+        tail.write(f"startxref\n{xref_offset}\n%%EOF\n".encode())
+        fp.write(tail.getvalue())
+        return offset + tail.tell() - start
+
+def _runs(offsets: dict) -> list[list[int]]:
+    """Object numbers grouped into consecutive runs, one cross-reference subsection each."""
+    runs: list[list[int]] = []
+    for number in sorted(offsets):
+        if runs and number == runs[-1][-1] + 1:
+            runs[-1].append(number)
+        else:
+            runs.append([number])
+    return runs
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB (ru_maxrss is in KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -5,9 +5,10 @@ from pathlib import Path
 from langchain_core.tools import BaseTool # 保留 Langchain 整合
 from pydantic import BaseModel, Field # 保留 Pydantic 驗證
 import logging
+from core.sink import OutputSinks
 
-# 新增 Docling 導入
-from docling.document_converter import DocumentConverter
+# Docling 轉換交給常駐的共用服務 (core.docling_service)；服務未啟動時在本程序內轉換
+from core.docling_service import convert_to_markdown
 # from pypdf import PdfReader, PdfWriter # 這些可能不再直接使用，或僅用於後續的視覺遮蔽（本次不作此目標）
 # from reportlab.pdfgen.canvas import Canvas # 同上
 # from reportlab.lib.colors import black # 同上
@@ -15,10 +16,10 @@ from docling.document_converter import DocumentConverter
 
 class RedactSchema(BaseModel): # Pydantic Schema 維持不變
     file: str = Field(description="The FULL PATH to the input PDF file.")
-    patterns: List[str] = Field(description="A list of regex patterns to search for and redact.")
+    patterns: List[str] = Field(min_length=1, description="A list of regex patterns to search for and redact.")
     output: Optional[str] = Field(default=None, description="The FULL PATH for the output redacted TEXT/MARKDOWN file. If None, '_redacted.txt' is appended to the input file name in the same directory.") # 修改描述
 
-def run(args: dict) -> str:
+def run(args: dict, outputs: OutputSinks | None = None) -> str:
     """
     Redacts text in a PDF file based on a list of regex patterns using Docling.
     Outputs a text or markdown file with matched patterns replaced by [REDACTED].
@@ -27,6 +28,8 @@ def run(args: dict) -> str:
     input_file_str: str = args['file']
     patterns_list: List[str] = args['patterns']
     output_final_path_str: str = args['output'] # 'output' is now always a full path from engine
+    if outputs is None:
+        outputs = OutputSinks()
 
     try:
         input_file_path = Path(input_file_str) # Still needed for logging and to check existence
@@ -43,18 +46,14 @@ def run(args: dict) -> str:
 
         logging.info(f"Redacting PDF: {input_file_path} with Docling. Outputting to: {output_final_path}")
 
-        # Docling 讀取/解析文件
-        converter = DocumentConverter()
-        docling_doc = converter.convert(str(input_file_path)) # convert() 需要 string 類型的路徑
-
-        # 取得 Markdown 格式的內容 (Docling 能較好地處理版面結構轉 Markdown)
-        # 如果只要純文字，可以用 docling_doc.document.get_full_text() 或類似方法
-        content = docling_doc.document.export_to_markdown()
+        # Docling 讀取/解析文件，取得 Markdown 格式的內容 (Docling 能較好地處理版面結構轉 Markdown)
+        # 模型只在服務 (或本程序) 第一次轉換時載入，之後的呼叫都重複使用
+        content = convert_to_markdown(str(input_file_path))
         if not content:
             logging.warning(f"Docling extracted no content from {input_file_path}")
             # 寫入一個空的輸出檔案
-            with open(output_final_path, "w", encoding="utf-8") as f:
-                f.write("")
+            with outputs.open(output_final_path) as f:
+                f.write(b"")
             return str(output_final_path)
 
         compiled_patterns = [re.compile(p, re.IGNORECASE) for p in patterns_list]
@@ -65,8 +64,8 @@ def run(args: dict) -> str:
             redacted_content = pattern.sub("[REDACTED]", redacted_content)
 
         # 寫入處理後的 Markdown 內容
-        with open(output_final_path, "w", encoding="utf-8") as f:
-            f.write(redacted_content)
+        with outputs.open(output_final_path) as f:
+            f.write(redacted_content.encode("utf-8"))
         
         logging.info(f"Redacted content saved to {output_final_path}")
         return str(output_final_path)
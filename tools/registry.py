@@ -0,0 +1,92 @@
+import yaml
+import logging
+import importlib
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from types import ModuleType
+from pydantic import BaseModel, TypeAdapter
+
+logger = logging.getLogger(__name__)
+
+TOOLS_DIR = Path(__file__).resolve().parent
+
+@dataclass(frozen=True)
+class ToolSpec:
+    """
+    Everything the engine needs to know about one tool, resolved once per process.
+    Built from tools/<name>.yml (name, description, path keys, default output name)
+    and the module's ArgsSchema, which is the single source of truth for argument validation.
+    A path key "items[].key" names the 'key' field of every object in the list argument 'items'.
+    """
+    name: str
+    description: str
+    module: ModuleType
+    schema: type[BaseModel]
+    adapter: TypeAdapter
+    input_keys: tuple[str, ...]
+    output_keys: tuple[str, ...]
+    default_output: str | None = None # Filename template for a missing 'output'; {stem} is the first input's stem
+
+    @property
+    def path_keys(self) -> tuple[str, ...]:
+        return self.input_keys + self.output_keys
+
+    @property
+    def supports_pipeline(self) -> bool:
+        return hasattr(self.module, 'transform')
+
+    def validate(self, args: dict) -> dict:
+        """Validates args against the tool schema and returns the type-coerced values as a plain dict."""
+        return self.adapter.dump_python(self.adapter.validate_python(args))
+
+    def default_output_name(self, stem: str) -> str:
+        return (self.default_output or "{stem}_output.pdf").format(stem=stem)
+
+_registry: dict[str, ToolSpec] | None = None
+_unavailable: dict[str, Exception] = {} # Tools whose module failed to import (e.g. missing optional dependency)
+_registry_lock = threading.Lock()
+
+def _load_spec(yml_file: Path) -> ToolSpec:
+    spec = yaml.safe_load(yml_file.read_text(encoding="utf-8"))
+    name = spec['name']
+    module = importlib.import_module(f"tools.{yml_file.stem}")
+    paths = spec.get('paths') or {}
+    return ToolSpec(
+        name=name,
+        description=spec.get('description', ''),
+        module=module,
+        schema=module.ArgsSchema,
+        adapter=TypeAdapter(module.ArgsSchema),
+        input_keys=tuple(paths.get('inputs', ())),
+        output_keys=tuple(paths.get('outputs', ())),
+        default_output=spec.get('default_output'),
+    )
+
+def get_registry() -> dict[str, ToolSpec]:
+    """Returns the process-wide tool registry, building it on first use."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                registry = {}
+                for yml_file in sorted(TOOLS_DIR.glob("*.yml")):
+                    try:
+                        tool_spec = _load_spec(yml_file)
+                    except ImportError as e:
+                        logger.warning(f"Tool registry: could not import tool module for {yml_file.name}: {e}")
+                        _unavailable[yml_file.stem] = e
+                        continue
+                    registry[tool_spec.name] = tool_spec
+                _registry = registry
+                logger.info(f"Tool registry: loaded {sorted(registry)}")
+    return _registry
+
+def get_tool(name: str) -> ToolSpec:
+    """Returns the spec of a registered tool. Unknown or unavailable tools raise ImportError, as importing them would."""
+    tool_spec = get_registry().get(name)
+    if tool_spec is None:
+        if name in _unavailable:
+            raise ImportError(f"Tool '{name}' is unavailable: {_unavailable[name]}")
+        raise ImportError(f"No tool named '{name}'")
+    return tool_spec
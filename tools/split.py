@@ -1,196 +1,212 @@
-from typing import Optional, Type, Set
+import os
+import re
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, Optional, Type, Tuple
 from pathlib import Path
 # import os # os.makedirs no longer needed directly in tool
 from langchain_core.tools import BaseTool
-from pydantic import BaseModel, Field
-from pypdf import PdfReader, PdfWriter
+from pydantic import BaseModel, Field, model_validator
+from pypdf import PdfWriter
+from core.sink import OutputResult, OutputSinks
+from core.inputs import mapped_reader
+from core.worker import cap_workers, pool_context
+from tools.pagerange import PageRange, all_pages, compile_range
 
-def _parse_ranges(rng: str, total_pages: int) -> Set[int]:
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARALLEL_MIN_OUTPUTS = 16
+BATCHES_PER_WORKER = 4 # Several small batches per worker keep the pool busy when outputs differ in size
+
+GROUP_LABEL_RE = re.compile(r"^[\w-]+$")
+
+def _parse_groups(pages: str) -> List[Tuple[Optional[str], str]]:
     """
-    解析頁碼範圍字串 (例如 "1-3,5,!7,-1", "1--1") 回傳一個包含指定頁碼的集合 (1-based)。
-    "-1" 代表最後一頁。
+    將以 ';' 分隔的多個頁碼群組 (例如 "1-3;4-10;11--1") 拆成 (名稱, 範圍) 清單，每個群組輸出一個檔案。
+    群組可以命名："intro=1-3;body=4--1"，名稱會用於輸出檔名。
     """
-    selected_pages = set()
-    if not rng.strip():
-        raise ValueError("頁碼範圍字串不可為空。")
-
-    tokens = rng.split(',')
-    temp_included_pages = set()
-    
-    for token_idx, raw_token in enumerate(tokens):
-        token = raw_token.strip()
-        is_exclusion = token.startswith('!')
-        effective_token = token[1:] if is_exclusion else token
-
-        if not effective_token: # 例如 "!" 或 "," 後面直接接 ","
-            raise ValueError(f"無效的 token 格式: '{raw_token}'")
-
-        if '-' in effective_token:
-            parts = effective_token.split('-')
-            if len(parts) != 2:
-                raise ValueError(f"頁碼範圍格式錯誤 (無效的 '-' 使用): {effective_token}")
-            
-            start_str, end_str = parts[0].strip(), parts[1].strip()
-
-            try:
-                if start_str == "-1":
-                    start = total_pages
-                else:
-                    start = int(start_str)
-                
-                if end_str == "-1":
-                    end = total_pages
-                else:
-                    end = int(end_str)
-
-                if start <= 0 and start_str != "-1": # 允許 start 是 -1 (total_pages)
-                     raise ValueError(f"起始頁碼必須大於 0 或為 -1: {start_str}")
-                if end <= 0 and end_str != "-1": # 允許 end 是 -1 (total_pages)
-                    raise ValueError(f"結束頁碼必須大於 0 或為 -1: {end_str}")
-                
-                # 處理 start > total_pages (如果 start 不是由 "-1" 轉換而來)
-                if start > total_pages and start_str != "-1":
-                    raise ValueError(f"起始頁碼 {start} 超出總頁數 {total_pages}")
-                # 處理 end > total_pages (如果 end 不是由 "-1" 轉換而來)
-                if end > total_pages and end_str != "-1":
-                     raise ValueError(f"結束頁碼 {end} 超出總頁數 {total_pages}")
-
-                if start > end: # 轉換後的 start 和 end 比較
-                    raise ValueError(f"無效的頁碼範圍 (起始頁碼 {start} 大於結束頁碼 {end}): {effective_token}")
-                
-                current_range_pages = set(range(start, end + 1))
-                if is_exclusion:
-                    # 如果是排除，並且 temp_included_pages 為空（即前面沒有包含規則，或這是第一個規則）
-                    # 則我們需要先假設所有頁面都被選中，然後從中排除。
-                    # 這個邏輯會在後面統一處理，這裡我們先收集所有要排除的頁面。
-                    pass # 稍後處理排除
-                else:
-                    temp_included_pages.update(current_range_pages)
-
-            except ValueError as e: # 捕捉 int() 轉換錯誤或我們自己拋出的 ValueError
-                # 避免重複包裝 ValueError
-                if "頁碼" in str(e) or "page" in str(e).lower(): # 檢查是否是我們自訂的錯誤
-                     raise
-                raise ValueError(f"頁碼範圍格式錯誤: {effective_token} -> {e}")
-        else: # 單個頁碼
-            try:
-                page_num_str = effective_token
-                if page_num_str == "-1":
-                    page_num = total_pages
-                else:
-                    page_num = int(page_num_str)
-
-                if page_num <= 0 and page_num_str != "-1":
-                     raise ValueError(f"頁碼必須大於 0 或為 -1: {page_num_str}")
-                
-                if page_num > total_pages and page_num_str != "-1":
-                    raise ValueError(f"頁碼 {page_num} 超出總頁數 {total_pages}")
-
-                if is_exclusion:
-                    pass # 稍後處理排除
-                else:
-                    temp_included_pages.add(page_num)
-            except ValueError as e:
-                if "頁碼" in str(e) or "page" in str(e).lower():
-                    raise
-                raise ValueError(f"頁碼格式錯誤: {effective_token} -> {e}")
-
-    # 決定基礎選擇集 (如果沒有明確包含，且有排除，則全選)
-    if not temp_included_pages and any(t.strip().startswith("!") for t in tokens):
-        selected_pages.update(range(1, total_pages + 1))
-    else:
-        selected_pages.update(temp_included_pages)
-
-    # 現在處理排除
-    for raw_token in tokens:
-        token = raw_token.strip()
-        if token.startswith('!'):
-            effective_token = token[1:]
-            if not effective_token: continue # 跳過空的排除，例如 "!,1"
-
-            if '-' in effective_token:
-                parts = effective_token.split('-')
-                # 這裡的錯誤檢查已在上面包含部分做過，但為了安全可以再次檢查或簡化
-                # 假設格式在此階段是正確的，因為上面已經檢查過了
-                start_str, end_str = parts[0].strip(), parts[1].strip()
-                
-                start = total_pages if start_str == "-1" else int(start_str)
-                end = total_pages if end_str == "-1" else int(end_str)
-                
-                # 確保 start 和 end 在合理範圍內，並且 start <= end
-                # 這裡的檢查主要是針對轉換後的 start/end
-                if start <= 0 and start_str != "-1": continue # 或拋出錯誤
-                if end <= 0 and end_str != "-1": continue # 或拋出錯誤
-                if start > total_pages and start_str != "-1": continue
-                if end > total_pages and end_str != "-1": continue
-                if start > end: continue
-
-                selected_pages.difference_update(range(start, end + 1))
-            else: # 單個排除頁碼
-                page_num_str = effective_token
-                page_num = total_pages if page_num_str == "-1" else int(page_num_str)
-
-                if page_num <= 0 and page_num_str != "-1": continue
-                if page_num > total_pages and page_num_str != "-1": continue
-                
-                selected_pages.discard(page_num)
-                    
-    # 最後再次確認所有選中的頁碼都在 1 到 total_pages 之間
-    # 這一行實際上可能不需要了，因為我們在解析時已經做了邊界檢查
-    # 但保留它作為最後的防線是安全的
-    final_pages = {p for p in selected_pages if 1 <= p <= total_pages}
-    if not final_pages and rng.strip(): # 如果原始範圍非空但結果為空
-        # 這種情況可能發生在例如 total_pages=5, rng="6-10" 或 rng="!1-5"
-        pass # 允許返回空集合，run 函數會檢查這個
-
-    return final_pages
+    groups = []
+    for raw_group in pages.split(';'):
+        label, rng = (part.strip() for part in raw_group.split('=', 1)) if '=' in raw_group else (None, raw_group.strip())
+        if not rng:
+            raise ValueError(f"頁碼群組不可為空: '{raw_group}'")
+        if label is not None and not GROUP_LABEL_RE.match(label):
+            raise ValueError(f"無效的群組名稱: '{label}' (只能使用字母、數字、'_' 與 '-')")
+        groups.append((label, rng))
+    labels = [label for label, _ in groups if label is not None]
+    if len(labels) != len(set(labels)):
+        raise ValueError("群組名稱不可重複。")
+    return groups
 
 class SplitSchema(BaseModel):
     file: str = Field(description="The FULL PATH to the input PDF file.")
-    pages: str = Field(description="Page ranges to split (e.g., \"1-3,5,!7\").")
+    pages: Optional[str] = Field(default=None, description="Page ranges to split (e.g., \"1-3,5,!7\"). Several groups separated by ';' produce one file each and may be named: \"intro=1-3;body=4-10;11--1\".")
+    burst: Optional[int] = Field(default=None, ge=1, description="Write every N selected pages to their own file (1 = one file per page). Selects all pages when 'pages' is omitted.")
     output_dir: Optional[str] = Field(description="FULL PATH to the directory to save the split PDF files. If not provided, a default name in a standard location will be used by the engine.")
 
-def run(args: dict) -> str:
-    """Splits a PDF file into multiple pages or page ranges.
-    Outputs a new PDF containing only the selected pages.
-    The 'file' and 'output_dir' in args are expected to be full, validated, absolute paths.
+    @model_validator(mode="after")
+    def _pages_or_burst(self):
+        if self.pages is None and self.burst is None:
+            raise ValueError("Either 'pages' or 'burst' is required.")
+        if self.burst is not None and self.pages is not None and ';' in self.pages:
+            raise ValueError("'burst' cannot be combined with several page groups.")
+        return self
+
+def _is_multi_output(args: dict) -> bool:
+    """Several groups, a named group or burst mode: the outputs are named per group and returned as a list."""
+    pages = args.get('pages') or ''
+    return args.get('burst') is not None or ';' in pages or '=' in pages
+
+def transform(args: dict, source: PdfWriter | None = None) -> PdfWriter:
+    """Builds a document containing only the selected pages, in memory.
+    In a pipeline, pages are taken from source (the previous step's document) instead of args['file'].
+    Only single-output splits have a transform; several groups or burst mode write several files.
     """
-    input_file_path_str: str = args['file']
-    pages_str: str = args['pages']
-    output_dir_str: str = args['output_dir'] # 'output_dir' is now always a full path from engine
+    if _is_multi_output(args):
+        raise ValueError("Split with several page groups or 'burst' produces several files and cannot be used as a pipeline step.")
+    if source is not None:
+        return _select_pages(source, args['pages'])
+    with mapped_reader(args['file']) as document:
+        return _select_pages(document, args['pages'])
 
-    try:
-        input_file_path_obj = Path(input_file_path_str)
-        output_dir_obj = Path(output_dir_str) # This is now always a valid, absolute directory path
-        # Engine ensures output_dir_obj exists.
+def _select_pages(document, pages: str | PageRange) -> PdfWriter:
+    selection = compile_range(pages, len(document.pages)) if isinstance(pages, str) else pages
 
-        reader = PdfReader(input_file_path_str)
-        total_pages = len(reader.pages)
-        
-        selected_page_numbers = _parse_ranges(pages_str, total_pages)
-        
-        if not selected_page_numbers:
+    if not selection:
+        raise ValueError("No pages selected for splitting based on the provided range.")
+
+    writer = PdfWriter()
+    for page_index in selection.indices():
+        writer.add_page(document.pages[page_index])
+    return writer
+
+def output_path(args: dict) -> str:
+    """Output filename is based on input file's stem, inside output_dir."""
+    return str(Path(args['output_dir']) / f"{Path(args['file']).stem}_split.pdf")
+
+def _planned_outputs(document, args: dict) -> List[Tuple[str, PageRange]]:
+    """(filename, page selection) for every output of a multi-output split, in output order."""
+    stem = Path(args['file']).stem
+    total_pages = len(document.pages)
+    if args.get('burst') is not None:
+        selection = compile_range(args['pages'], total_pages) if args.get('pages') else all_pages(total_pages)
+        if not selection:
             raise ValueError("No pages selected for splitting based on the provided range.")
+        size = args['burst']
+        return [
+            (f"{stem}_p{chunk.first}.pdf" if size == 1 else f"{stem}_p{chunk.first}-{chunk.last}.pdf", chunk)
+            for chunk in selection.chunks(size)
+        ]
+    # Every group is compiled before anything is written, so a bad group fails the whole call
+    return [(f"{stem}_{label or f'part{i}'}.pdf", compile_range(rng, total_pages)) for i, (label, rng) in enumerate(_parse_groups(args['pages']), start=1)]
 
-        writer = PdfWriter()
-        pages_to_keep_indices = sorted([p - 1 for p in selected_page_numbers])  
+def _setting(name: str, default):
+    # Tools also run in Django-free worker processes; fall back to the default there
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
 
-        for page_index in pages_to_keep_indices:
-            if 0 <= page_index < total_pages:
-                writer.add_page(reader.pages[page_index])
-        
-        if not writer.pages:
-            raise ValueError("No valid pages to write to the new PDF (selected pages might be out of actual page range)." )
+def _write_workers(output_count: int) -> int:
+    """
+    Processes used to write the outputs. Few outputs are written in this process (a pool costs more
+    than it saves); inside a batch worker the pool stays within that worker's CPU share.
+    """
+    if output_count < _setting('PDF_SPLIT_PARALLEL_MIN_OUTPUTS', DEFAULT_PARALLEL_MIN_OUTPUTS):
+        return 1
+    return cap_workers(min(_setting('PDF_SPLIT_WRITE_WORKERS', os.cpu_count() or 1), output_count))
+
+def write_outputs(document, jobs: List[Tuple[str, PageRange]], outputs: OutputSinks) -> List[OutputResult]:
+    """Writes each (path, selection) of jobs from document, one output document in memory at a time."""
+    results = []
+    for path, selection in jobs:
+        writer = _select_pages(document, selection)
+        with outputs.open(path, page_count=len(writer.pages)) as fp:
+            writer.write(fp)
+        results.append(fp.result)
+    return results
+
+def _write_batch(source_path: str, jobs: List[Tuple[str, PageRange]]) -> List[OutputResult]:
+    """Process-pool task: opens the source (mapped read-only, see core.inputs) and writes a run of outputs."""
+    with mapped_reader(source_path) as document:
+        return write_outputs(document, jobs, OutputSinks())
+
+def _batches(jobs: list, count: int) -> List[list]:
+    """jobs cut into count contiguous, near-equal batches (never empty)."""
+    count = max(1, min(count, len(jobs)))
+    size, extra = divmod(len(jobs), count)
+    batches, start = [], 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        batches.append(jobs[start:end])
+        start = end
+    return batches
+
+def run_multi(args: dict, outputs: OutputSinks, progress: Callable[[int, int], None] | None = None) -> List[str]:
+    """
+    Writes one file per page group (or per burst chunk) from a single parse of the input.
+    Many outputs (see PDF_SPLIT_PARALLEL_MIN_OUTPUTS) are written by a process pool: each worker maps
+    the source file and writes a contiguous batch of outputs. The output files, the returned list and
+    the recorded results are the same whatever the number of workers. progress(done, total) is called
+    in this process as outputs are finished.
+    """
+    with mapped_reader(args['file']) as document:
+        return _run_multi(document, args, outputs, progress)
+
+def _run_multi(document, args: dict, outputs: OutputSinks, progress: Callable[[int, int], None] | None) -> List[str]:
+    plan = _planned_outputs(document, args)
+    if len({name for name, _ in plan}) != len(plan):
+        raise ValueError("Several page groups would be written to the same file name; name the groups.")
+    jobs = [(str(Path(args['output_dir']) / filename), selection) for filename, selection in plan]
+
+    def report(done: int):
+        logger.info(f"SPLIT TOOL: {done}/{len(jobs)} outputs written")
+        if progress is not None:
+            progress(done, len(jobs))
+
+    workers = _write_workers(len(jobs))
+    if workers <= 1:
+        for i, job in enumerate(jobs, start=1):
+            write_outputs(document, [job], outputs)
+            report(i)
+        return [path for path, _ in jobs]
+
+    batches = _batches(jobs, workers * BATCHES_PER_WORKER)
+    batch_results: List[List[OutputResult] | None] = [None] * len(batches)
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as executor:
+        futures = {executor.submit(_write_batch, args['file'], batch): index for index, batch in enumerate(batches)}
+        for future in as_completed(futures):
+            batch_results[futures[future]] = future.result()
+            done += len(batches[futures[future]])
+            report(done)
+    for results in batch_results: # Recorded in output order, not completion order
+        for r in results:
+            outputs.record(r.path, r.sha256, r.size, r.page_count, r.bytes_saved)
+    return [path for path, _ in jobs]
+
+def run(args: dict, outputs: OutputSinks | None = None) -> str | List[str]:
+    """Splits a PDF file into multiple pages or page ranges.
+    Outputs a new PDF containing only the selected pages. With several ';'-separated page groups
+    or 'burst', writes one PDF per group/chunk and returns the list of their paths.
+    The 'file' and 'output_dir' in args are expected to be full, validated, absolute paths.
+    """
+    if outputs is None:
+        outputs = OutputSinks()
+
+    try:
+        # output_dir is now always a valid, absolute directory path; engine ensures it exists.
+        if _is_multi_output(args):
+            return run_multi(args, outputs)
 
-        # Output filename is based on input file's stem
-        output_filename = f"{input_file_path_obj.stem}_split.pdf"
-        # The output_dir_obj is already a full, validated path to an existing directory
-        output_file_full_path = output_dir_obj / output_filename
+        writer = transform(args)
+        output_file_full_path = output_path(args)
 
-        with open(output_file_full_path, "wb") as fp:
+        with outputs.open(output_file_full_path, page_count=len(writer.pages)) as fp:
             writer.write(fp)
         
-        return str(output_file_full_path) # Return the full output path
+        return output_file_full_path # Return the full output path
 
     except ValueError as e: # Catch parsing errors or no pages selected
         raise # Re-raise for the engine to catch
@@ -208,7 +224,7 @@ class SplitTool(BaseTool):
 
     # root_dir: Path = Path.cwd() # No longer needed
 
-    def _run(self, file: str, pages: str, output_dir: Optional[str] = None) -> str:
+    def _run(self, file: str, pages: Optional[str] = None, burst: Optional[int] = None, output_dir: Optional[str] = None) -> str | List[str]:
         # Engine calls tools.split.run(args)
         # This _run is for Langchain compatibility if used directly.
         # output_dir handling: if None, it means the tool's yml default (".") was used.
@@ -219,7 +235,7 @@ class SplitTool(BaseTool):
         # However, the main `run` function is stricter as it expects engine-processed paths.
         # This highlights that `output_dir` default handling needs to be robust.
         # Let's assume _run call also means output_dir is a fully resolved path or needs default handling.
-        args_dict = {"file": file, "pages": pages}
+        args_dict = {"file": file, "pages": pages, "burst": burst}
         if output_dir:
             args_dict["output_dir"] = output_dir
         else: